@@ -0,0 +1,64 @@
+"""
+Coordinate generation with GDij2ll versus the NumPy inverse projections.
+
+GDij2ll runs the GCTP inverse transform one pixel at a time.  This times
+longitude and latitude for a full 1 km MODIS sinusoidal tile and for a
+0.05 degree global geographic grid both ways.
+
+Usage:
+
+    python benchmarks/bench_coords.py [NUMBER]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+from pyhdfeos import _gctp
+from pyhdfeos.lib import he4
+
+SINUSOIDAL = np.zeros(13)
+SINUSOIDAL[0] = 6371007.181
+
+# label, projcode, projparms, spherecode, xdimsize, ydimsize, upleft, lowright
+CASES = [('sinusoidal 1200x1200', 16, SINUSOIDAL, -1, 1200, 1200,
+          np.array([-11119505.196667, 4447802.078667]),
+          np.array([-10007554.677, 3335851.559])),
+         ('geographic 7200x3600', 0, np.zeros(13), 0, 7200, 3600,
+          np.array([-180000000.0, 90000000.0]),
+          np.array([180000000.0, -90000000.0]))]
+
+
+def gctp_coords(projcode, projparms, spherecode, xdimsize, ydimsize, upleft,
+                lowright):
+    cols, rows = np.meshgrid(np.arange(xdimsize), np.arange(ydimsize))
+    return he4.gdij2ll(projcode, 0, projparms, spherecode, xdimsize,
+                       ydimsize, upleft, lowright, rows.astype(np.int32),
+                       cols.astype(np.int32), 0, 0)
+
+
+def numpy_coords(projcode, projparms, spherecode, xdimsize, ydimsize, upleft,
+                 lowright):
+    return _gctp.ij2ll(projcode, 0, projparms, spherecode, xdimsize,
+                       ydimsize, upleft, lowright,
+                       np.arange(ydimsize)[:, np.newaxis],
+                       np.arange(xdimsize)[np.newaxis, :], 0, 0)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    fmt = "{0:22s} {1:>14s} {2:>14s}"
+    print(fmt.format('grid', 'GDij2ll', 'NumPy'))
+    fmt = "{0:22s} {1:11.3f} s {2:11.3f} s"
+    for case in CASES:
+        label, args = case[0], case[1:]
+        times = []
+        for func in (gctp_coords, numpy_coords):
+            elapsed = min(timeit.repeat(lambda: func(*args), number=number,
+                                        repeat=3))
+            times.append(elapsed / number)
+        print(fmt.format(label, *times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Open latency per file format.
+
+GridFile picks the backend from the file signature.  Before that, every
+file was first tried with HDF-EOS2 and HDF-EOS5 files were only opened after
+that attempt failed.  This times opening and closing each bundled file both
+ways.
+
+Usage:
+
+    python benchmarks/bench_format.py [NUMBER]
+"""
+import os
+import sys
+import timeit
+
+from pyhdfeos._handles import sniff_format
+from pyhdfeos.lib import he4, he5
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data')
+
+CASES = [('HDF-EOS2', 'Grid219.hdf'),
+         ('HDF-EOS5', 'Grid.h5')]
+
+
+def probe_open(path):
+    """
+    Open the way GridFile used to, trying HDF-EOS2 first.
+    """
+    try:
+        fid = he4.gdopen(path)
+        he4.gdclose(fid)
+    except IOError:
+        fid = he5.gdopen(path)
+        he5.gdclose(fid)
+
+
+def sniffed_open(path):
+    """
+    Open with the backend picked from the file signature.
+    """
+    he_module = {'he4': he4, 'he5': he5}[sniff_format(path)]
+    fid = he_module.gdopen(path)
+    he_module.gdclose(fid)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    fmt = "{0:10s} {1:>20s} {2:>20s}"
+    print(fmt.format('format', 'try HDF4 first', 'sniffed'))
+    fmt = "{0:10s} {1:17.3f} ms {2:17.3f} ms"
+    for label, filename in CASES:
+        path = os.path.join(DATA, filename)
+        times = []
+        for func in (probe_open, sniffed_open):
+            elapsed = min(timeit.repeat(lambda: func(path), number=number,
+                                        repeat=3))
+            times.append(elapsed / number * 1e3)
+        print(fmt.format(label, *times))
+
+
+if __name__ == '__main__':
+    main()
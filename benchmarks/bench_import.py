@@ -0,0 +1,74 @@
+"""
+Import time of pyhdfeos and of its library interfaces.
+
+The cffi interfaces to HDF4, HDF-EOS2 and HDF-EOS5 are only imported when a
+file first needs them.  This runs ``python -X importtime`` in fresh
+interpreters for ``import pyhdfeos`` alone and for opening one file of each
+format, and reports the cumulative import time of the package and of each
+interface that actually got imported.
+
+Usage:
+
+    python benchmarks/bench_import.py [REPEAT]
+"""
+import os
+import subprocess
+import sys
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data')
+
+MODULES = ['pyhdfeos', 'pyhdfeos.lib.he4', 'pyhdfeos.lib.he5',
+           'pyhdfeos.lib.hdf']
+
+OPEN = "import pyhdfeos; pyhdfeos.GridFile({0!r}).close()"
+
+CASES = [('import only', "import pyhdfeos"),
+         ('HDF-EOS2 file', OPEN.format(os.path.join(DATA, 'Grid219.hdf'))),
+         ('HDF-EOS5 file', OPEN.format(os.path.join(DATA, 'Grid.h5')))]
+
+
+def importtime(statement):
+    """
+    Cumulative import time in microseconds of each module of interest.
+    """
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+                             statement],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(stderr)
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        name = fields[2].strip()
+        if name in MODULES:
+            try:
+                times[name] = int(fields[1])
+            except ValueError:
+                pass
+    return times
+
+
+def main():
+    if sys.hexversion < 0x03070000:
+        sys.exit("python -X importtime needs Python 3.7 or later.")
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    fmt = "{0:15s} {1:>12s} {2:>18s} {3:>18s} {4:>18s}"
+    print(fmt.format('case', *MODULES))
+    for label, statement in CASES:
+        best = {}
+        for _ in range(repeat):
+            for name, us in importtime(statement).items():
+                best[name] = min(us, best.get(name, us))
+        cells = ['{0:.1f} ms'.format(best[name] / 1e3) if name in best
+                 else 'not imported' for name in MODULES]
+        print(fmt.format(label, *cells))
+
+
+if __name__ == '__main__':
+    main()
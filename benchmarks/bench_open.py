@@ -0,0 +1,61 @@
+"""
+Latency of opening a grid file in order to read a single field.
+
+Grids, fields and attributes are built on first access, so opening a file
+and reading one field only pays for that grid and that field.  For
+comparison, the full inventory is also timed by touching every grid, field
+and attribute the way printing a file does, both with the grid structure
+parsed from the StructMetadata and with it queried call by call.
+
+The handle pool is disabled so that every iteration really opens the file.
+
+Usage:
+
+    python benchmarks/bench_open.py [NUMBER]
+"""
+import os
+import sys
+import timeit
+
+from pyhdfeos import GridFile, handle_pool
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data')
+
+CASES = [('HDF-EOS2', 'Grid219.hdf', 'UTMGrid', 'Vegetation'),
+         ('HDF-EOS5', 'Grid.h5', 'UTMGrid', 'Vegetation')]
+
+
+def open_read_one(path, gridname, fieldname):
+    gdf = GridFile(path)
+    return gdf.grids[gridname].fields[fieldname][0]
+
+
+def open_inventory(path, structmetadata=True):
+    gdf = GridFile(path, structmetadata=structmetadata)
+    for grid in gdf.grids.values():
+        dict(grid.attrs)
+        for field in grid.fields.values():
+            dict(field.attrs)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    handle_pool.maxsize = 0
+    fmt = "{0:10s} {1:>22s} {2:>22s} {3:>22s}"
+    print(fmt.format('format', 'open + read one field', 'full inventory',
+                     'inventory, per call'))
+    fmt = "{0:10s} {1:19.2f} ms {2:19.2f} ms {3:19.2f} ms"
+    for label, filename, gridname, fieldname in CASES:
+        path = os.path.join(DATA, filename)
+        times = []
+        for func, args in ((open_read_one, (path, gridname, fieldname)),
+                           (open_inventory, (path,)),
+                           (open_inventory, (path, False))):
+            elapsed = min(timeit.repeat(lambda: func(*args), number=number,
+                                        repeat=3))
+            times.append(elapsed / number * 1e3)
+        print(fmt.format(label, *times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Scaling of whole-field reads with the number of worker processes.
+
+Decompressing a large compressed field is CPU bound and HDF4/HDF-EOS only
+ever use one core, so this times reading an entire field serially and with a
+ReaderPool of 1, 2, 4 and 8 workers.  The bundled test files are small, so
+point the benchmark at a large compressed field for meaningful numbers.
+
+Usage:
+
+    python benchmarks/bench_parallel.py [FILE GRID FIELD [NUMBER]]
+"""
+import os
+import sys
+import time
+
+from pyhdfeos import GridFile, ReaderPool
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data')
+
+DEFAULT_CASE = (os.path.join(DATA, 'Grid.h5'), 'UTMGrid', 'Vegetation')
+
+
+def best_of(func, number):
+    """
+    Smallest wall clock time of number calls to func, in milliseconds.
+    """
+    times = []
+    for _ in range(number):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times) * 1e3
+
+
+def main():
+    if len(sys.argv) >= 4:
+        filename, gridname, fieldname = sys.argv[1:4]
+    else:
+        filename, gridname, fieldname = DEFAULT_CASE
+    number = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    gdf = GridFile(filename)
+    field = gdf.grids[gridname].fields[fieldname]
+    print("{0} {1} {2}, shape {3}, tiles {4}, {5}".format(
+        os.path.basename(filename), gridname, fieldname, field.shape,
+        field.chunks, field.compression))
+
+    serial = best_of(lambda: field[:], number)
+    print("{0:>8s} {1:10.1f} ms".format('serial', serial))
+
+    fmt = "{0:>8d} {1:10.1f} ms  speedup {2:5.2f}"
+    for processes in (1, 2, 4, 8):
+        with ReaderPool(processes) as pool:
+            # Warm up, so that workers have their files open.
+            field.read(parallel=pool)
+            elapsed = best_of(lambda: field.read(parallel=pool), number)
+        print(fmt.format(processes, elapsed, serial / elapsed))
+
+
+if __name__ == '__main__':
+    main()
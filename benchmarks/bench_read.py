@@ -0,0 +1,74 @@
+"""
+Per-call overhead of single-row grid field reads.
+
+Compares the low-level read path that looks up the number type with
+GDfieldinfo on every call against reads that use the field descriptor cached
+by the grid.
+
+Usage:
+
+    python benchmarks/bench_read.py [NUMBER]
+"""
+import os
+import sys
+import timeit
+
+from pyhdfeos import GridFile
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data')
+
+CASES = [('HDF-EOS2', 'Grid219.hdf', 'UTMGrid', 'Vegetation'),
+         ('HDF-EOS5', 'Grid.h5', 'UTMGrid', 'Vegetation')]
+
+
+def bench_row_reads(filename, gridname, fieldname, number):
+    """
+    Time 1-row reads through the uncached and cached read paths.
+
+    Returns
+    -------
+    uncached, cached, getitem : float
+        microseconds per read
+    """
+    gdf = GridFile(os.path.join(DATA, filename))
+    field = gdf.grids[gridname].fields[fieldname]
+    he = field._he
+    gridid = field.gridid
+    nrows, ncols = field.shape[0], field.shape[1]
+    stride = (1, 1)
+    edge = (1, ncols)
+
+    def uncached():
+        for row in range(nrows):
+            he.gdreadfield(gridid, fieldname, (row, 0), stride, edge)
+
+    def cached():
+        cname = field._descriptor.cname
+        for row in range(nrows):
+            he.gdreadfield(gridid, cname, (row, 0), stride, edge,
+                           ntype=field.ntype)
+
+    def getitem():
+        for row in range(nrows):
+            field[row]
+
+    results = []
+    for func in (uncached, cached, getitem):
+        elapsed = min(timeit.repeat(func, number=number, repeat=3))
+        results.append(elapsed / (number * nrows) * 1e6)
+    return results
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    fmt = "{0:10s} {1:>18s} {2:>18s} {3:>18s}"
+    print(fmt.format('format', 'fieldinfo+read', 'cached read',
+                     'field[row]'))
+    fmt = "{0:10s} {1:15.2f} us {2:15.2f} us {3:15.2f} us"
+    for label, filename, gridname, fieldname in CASES:
+        times = bench_row_reads(filename, gridname, fieldname, number)
+        print(fmt.format(label, *times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Decompression work of unaligned and tile-aligned reads of a tiled field.
+
+Every hyperslab read decompresses each tile it intersects, so reading a field
+in windows that straddle tile boundaries decompresses the same tiles again
+and again.  This compares the number of tiles decompressed, and the time
+taken, when reading a whole field
+
+    * in row windows of an arbitrary height versus the tile height, and
+    * through a scattered integer-array index planned without and with
+      knowledge of the tile layout.
+
+Usage:
+
+    python benchmarks/bench_tiles.py [NUMBER]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+from pyhdfeos import GridFile
+from pyhdfeos._indexing import chunks_touched, compile_index
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data')
+
+CASES = [('HDF-EOS5', 'Grid.h5', 'UTMGrid', 'Vegetation')]
+
+
+def row_windows(field, height):
+    """
+    Hyperslabs covering the field in windows of the given number of rows.
+    """
+    nrows = field.shape[0]
+    rest = field.shape[1:]
+    for row in range(0, nrows, height):
+        start = (row,) + (0,) * len(rest)
+        stride = (1,) * len(field.shape)
+        edge = (min(height, nrows - row),) + tuple(rest)
+        yield start, stride, edge
+
+
+def bench_windows(field, height, number):
+    """
+    Returns
+    -------
+    tiles : int
+        tiles decompressed for one pass over the field
+    msec : float
+        milliseconds per pass
+    """
+    windows = list(row_windows(field, height))
+    tiles = sum(chunks_touched(start, stride, edge, field.chunks)
+                for start, stride, edge in windows)
+
+    def run():
+        for start, stride, edge in windows:
+            field._read_hyperslab(start, stride, edge,
+                                  np.empty(edge, dtype=field.dtype))
+
+    elapsed = min(timeit.repeat(run, number=number, repeat=3))
+    return tiles, elapsed / number * 1e3
+
+
+def bench_scattered(field, chunks, number):
+    """
+    Read two rows out of every five with max_gap=0, planned with the given
+    chunks.
+    """
+    rows = np.flatnonzero(np.arange(field.shape[0]) % 5 < 2)
+    index = (rows, slice(None))
+    plan = compile_index(index, field.shape, 0, chunks)
+    tiles = sum(chunks_touched(start, stride, edge, field.chunks)
+                for start, stride, edge, _ in plan.hyperslabs())
+
+    def run():
+        field._read_plan(plan)
+
+    elapsed = min(timeit.repeat(run, number=number, repeat=3))
+    return tiles, elapsed / number * 1e3
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    fmt = "{0:10s} {1:28s} {2:>8d} tiles {3:10.2f} ms"
+    for label, filename, gridname, fieldname in CASES:
+        gdf = GridFile(os.path.join(DATA, filename))
+        field = gdf.grids[gridname].fields[fieldname]
+        if field.chunks is None:
+            print("{0}: {1} is not tiled, skipping".format(label, fieldname))
+            continue
+        print("{0} {1} {2}, shape {3}, tiles {4}, {5}".format(
+            label, gridname, fieldname, field.shape, field.chunks,
+            field.compression))
+
+        tile_rows = field.chunks[0]
+        for height in (7, tile_rows // 2 + 1, tile_rows):
+            tiles, msec = bench_windows(field, height, number)
+            desc = "windows of {0} rows".format(height)
+            print(fmt.format(label, desc, tiles, msec))
+
+        for desc, chunks in (('2 of 5 rows, untiled plan', None),
+                             ('2 of 5 rows, tiled plan', field.chunks)):
+            tiles, msec = bench_scattered(field, chunks, number)
+            print(fmt.format(label, desc, tiles, msec))
+
+
+if __name__ == '__main__':
+    main()
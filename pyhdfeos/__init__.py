@@ -1,5 +1,9 @@
 from . import lib
 from .grids import GridFile
+from ._parallel import ReaderPool
+from ._handles import HandlePool, handle_pool
+from ._coordcache import CoordinateCache, coordinate_cache
 from . import command_line, _som
 
-__all__ = [lib, GridFile, command_line, _som]
+__all__ = [lib, GridFile, ReaderPool, HandlePool, handle_pool,
+           CoordinateCache, coordinate_cache, command_line, _som]
@@ -0,0 +1,123 @@
+"""
+Recycling of the buffers that field reads are decoded into.
+"""
+import collections
+import threading
+import weakref
+
+import numpy as np
+
+
+class _Slot(object):
+    """
+    Pooled block of memory and the array it was last handed out as.
+    """
+    __slots__ = ('storage', 'ref')
+
+    def __init__(self, nbytes):
+        self.storage = bytearray(nbytes)
+        self.ref = None
+
+    def checkout(self, shape, dtype):
+        """
+        Hand out the memory as a new array if nothing refers to it any more.
+
+        The array is built directly on top of the storage, so numpy makes
+        every view derived from it refer back to it, and the array stays
+        alive for as long as any of its views does.
+        """
+        if self.ref is not None and self.ref() is not None:
+            return None
+        array = np.ndarray(shape, dtype=dtype, buffer=self.storage)
+        self.ref = weakref.ref(array)
+        return array
+
+
+class BufferPool(object):
+    """
+    Pool of read buffers keyed on shape and datatype.
+
+    A buffer handed out by the pool is only handed out again once nothing
+    outside of the pool refers to it any more (neither the array itself nor
+    any view of it), so callers are free to hold on to results for as long as
+    they like.  Buffers larger than ``maxbytes`` are never pooled.
+
+    Parameters
+    ----------
+    maxbytes : int
+        largest buffer that will be pooled
+    budget : int
+        maximum total number of bytes held by the pool
+    per_key : int
+        maximum number of buffers kept for each shape/datatype combination
+    """
+    def __init__(self, maxbytes=16 * 2**20, budget=64 * 2**20, per_key=4):
+        self.maxbytes = maxbytes
+        self.budget = budget
+        self.per_key = per_key
+        self._buffers = collections.OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, shape, dtype):
+        """
+        Return an uninitialized C-contiguous buffer.
+
+        Parameters
+        ----------
+        shape : tuple
+            shape of the buffer
+        dtype : numpy dtype
+            datatype of the buffer
+
+        Returns
+        -------
+        buffer : ndarray
+            either a recycled or a newly allocated buffer
+        """
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes == 0 or nbytes > self.maxbytes:
+            return np.empty(shape, dtype=dtype)
+
+        key = (shape, dtype.str)
+        with self._lock:
+            lst = self._buffers.get(key)
+            if lst is None:
+                lst = self._buffers[key] = []
+            else:
+                # Re-insert to mark as most recently used (Python 2.7's
+                # OrderedDict has no move_to_end).
+                self._buffers[key] = self._buffers.pop(key)
+                for slot in lst:
+                    buffer = slot.checkout(shape, dtype)
+                    if buffer is not None:
+                        return buffer
+
+            if len(lst) >= self.per_key:
+                return np.empty(shape, dtype=dtype)
+            slot = _Slot(nbytes)
+            lst.append(slot)
+            self._nbytes += nbytes
+            buffer = slot.checkout(shape, dtype)
+            self._trim()
+            return buffer
+
+    def clear(self):
+        """
+        Release every pooled buffer.
+
+        Buffers still in use are unaffected, they are simply not recycled.
+        """
+        with self._lock:
+            self._buffers.clear()
+            self._nbytes = 0
+
+    def _trim(self):
+        """
+        Drop least recently used shapes until the pool fits in its budget.
+        """
+        while self._nbytes > self.budget and len(self._buffers) > 1:
+            _, lst = self._buffers.popitem(last=False)
+            self._nbytes -= sum(len(slot.storage) for slot in lst)
@@ -0,0 +1,197 @@
+"""
+Process-wide cache of computed grid coordinates.
+
+Granules of the same product often share one grid definition (projection,
+parameters, corners and size), so their latitudes and longitudes are the
+same.  Coordinates are cached on a hash of that definition together with the
+pixels asked for, whatever file the grid comes from.
+"""
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+# Counters and sizes of a CoordinateCache, as returned by
+# CoordinateCache.info.
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses',
+                                                 'evictions', 'maxbytes',
+                                                 'currbytes'])
+
+
+def grid_key(projcode, zonecode, spherecode, projparms, xdimsize, ydimsize,
+             upleft, lowright, pixregcode, origincode, offsets=None):
+    """
+    Canonical hash of a grid definition.
+
+    Parameters
+    ----------
+    projcode, zonecode, spherecode : int
+        GCTP projection, zone and spheroid codes
+    projparms : ndarray
+        GCTP projection parameters
+    xdimsize, ydimsize : int
+        size of the grid
+    upleft, lowright : ndarray
+        corners of the grid
+    pixregcode, origincode : int
+        pixel registration and grid origin codes
+    offsets : ndarray, optional
+        block offsets of SOM grids
+
+    Returns
+    -------
+    key : str
+        hex digest identifying grids with the same coordinates
+    """
+    digest = hashlib.sha1()
+    for value in (projcode, zonecode, spherecode, xdimsize, ydimsize,
+                  pixregcode, origincode):
+        digest.update("{0};".format(int(value)).encode('ascii'))
+    arrays = [projparms, upleft, lowright]
+    if offsets is not None:
+        arrays.append(offsets)
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update("{0};".format(array.size).encode('ascii'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class CoordinateCache(object):
+    """
+    Least recently used cache of grid coordinates, bounded in bytes.
+
+    Cached arrays are shared by every caller asking for the same pixels of
+    the same grid definition, so they are made read-only.
+
+    Parameters
+    ----------
+    maxbytes : int
+        total size of the cached arrays beyond which the least recently used
+        ones are evicted, 0 disables caching
+
+    Attributes
+    ----------
+    hits, misses, evictions : int
+        number of lookups found and not found, and of entries evicted
+    """
+    def __init__(self, maxbytes=256 * 1024 * 1024):
+        self._maxbytes = maxbytes
+        self._entries = collections.OrderedDict()
+        self._currbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def maxbytes(self):
+        return self._maxbytes
+
+    @maxbytes.setter
+    def maxbytes(self, value):
+        if value < 0:
+            msg = "The cache size must be non-negative, not {0}."
+            raise ValueError(msg.format(value))
+        with self._lock:
+            self._maxbytes = value
+            self._trim()
+
+    @property
+    def currbytes(self):
+        return self._currbytes
+
+    def get(self, key):
+        """
+        Return the cached arrays for a key, or None.
+
+        Parameters
+        ----------
+        key : hashable
+            grid definition and pixels
+
+        Returns
+        -------
+        arrays : tuple of ndarray or None
+        """
+        with self._lock:
+            arrays = self._entries.get(key)
+            if arrays is None:
+                self.misses += 1
+                return None
+            # Re-insert to mark as most recently used (Python 2.7's
+            # OrderedDict has no move_to_end).
+            self._entries[key] = self._entries.pop(key)
+            self.hits += 1
+            return arrays
+
+    def put(self, key, arrays):
+        """
+        Cache arrays under a key, if they fit.
+
+        Parameters
+        ----------
+        key : hashable
+            grid definition and pixels
+        arrays : tuple of ndarray
+            coordinates computed for the key
+
+        Returns
+        -------
+        arrays : tuple of ndarray
+            the same arrays, read-only if they were cached
+        """
+        nbytes = _nbytes(arrays)
+        if nbytes > self._maxbytes:
+            return arrays
+        for array in arrays:
+            array.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self._currbytes -= _nbytes(self._entries.pop(key))
+            self._entries[key] = arrays
+            self._currbytes += nbytes
+            self._trim()
+        return arrays
+
+    def clear(self):
+        """
+        Drop every cached entry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._currbytes = 0
+
+    def info(self):
+        """
+        Return the cache counters.
+
+        Returns
+        -------
+        info : CacheInfo
+            hits, misses, evictions, maximum and current size in bytes
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self._maxbytes, self._currbytes)
+
+    def _trim(self):
+        """
+        Evict least recently used entries until the cache fits its budget.
+        """
+        while self._currbytes > self._maxbytes:
+            _, arrays = self._entries.popitem(last=False)
+            self._currbytes -= _nbytes(arrays)
+            self.evictions += 1
+
+
+def _nbytes(arrays):
+    return sum(array.nbytes for array in arrays)
+
+
+# Coordinates of every grid of the process.
+coordinate_cache = CoordinateCache()
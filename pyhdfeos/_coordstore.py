@@ -0,0 +1,112 @@
+"""
+On-disk store of computed grid coordinates.
+
+The latitudes and longitudes of every pixel of a grid definition are written
+once to a pair of .npy files and memory-mapped from then on, so that fresh
+processes need not compute them again and processes on the same machine share
+one copy through the page cache.
+"""
+import errno
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Bumped whenever the way coordinates are computed or laid out changes,
+# invalidating older files.
+FORMAT_VERSION = 1
+
+
+class CoordinateStore(object):
+    """
+    Directory of .npy files holding the coordinates of grid definitions.
+
+    Parameters
+    ----------
+    directory : str
+        where the coordinate files are kept, created if necessary
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def paths(self, definition):
+        """
+        Paths of the latitude and longitude files of a grid definition.
+
+        Parameters
+        ----------
+        definition : str
+            hash of the grid definition, as returned by grid_key
+
+        Returns
+        -------
+        latpath, lonpath : str
+        """
+        return tuple(os.path.join(self.directory,
+                                  "{0}-v{1}-{2}.npy".format(definition,
+                                                            FORMAT_VERSION,
+                                                            name))
+                     for name in ('lat', 'lon'))
+
+    def load(self, definition):
+        """
+        Memory-map the stored coordinates of a grid definition.
+
+        Parameters
+        ----------
+        definition : str
+            hash of the grid definition, as returned by grid_key
+
+        Returns
+        -------
+        lat, lon : memmap or None
+            read-only latitude and longitude of every pixel, or None if the
+            definition is not in the store or its files cannot be read
+        """
+        try:
+            return tuple(np.load(path, mmap_mode='r')
+                         for path in self.paths(definition))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def store(self, definition, lat, lon):
+        """
+        Write the coordinates of a grid definition to the store.
+
+        Each file is replaced atomically, so concurrent readers see either a
+        complete file or none at all.
+
+        Parameters
+        ----------
+        definition : str
+            hash of the grid definition, as returned by grid_key
+        lat, lon : ndarray
+            latitude and longitude of every pixel
+
+        Returns
+        -------
+        lat, lon : memmap
+            the stored coordinates, memory-mapped read-only
+        """
+        # Latitude is replaced last, as readers open it first.
+        latpath, lonpath = self.paths(definition)
+        for path, array in ((lonpath, lon), (latpath, lat)):
+            fd, tmpname = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(array))
+                if sys.hexversion < 0x03030000:
+                    os.rename(tmpname, path)
+                else:
+                    os.replace(tmpname, path)
+            except Exception:
+                os.remove(tmpname)
+                raise
+        return tuple(np.load(path, mmap_mode='r')
+                     for path in (latpath, lonpath))
@@ -0,0 +1,148 @@
+"""
+Decoding of packed field data (fill values, scale factors and offsets).
+"""
+import numpy as np
+
+# Elements decoded at a time.  Small enough for the temporaries of a block to
+# stay in cache, large enough to amortize the per-block overhead.
+DECODE_BLOCK = 65536
+
+# How add_offset and scale_factor are applied.  HDF4 (SDsetcal) defines
+#     value = scale_factor * (stored - add_offset)
+# while the CF conventions used by HDF-EOS5 products define
+#     value = stored * scale_factor + add_offset
+CONVENTIONS = ('hdf4', 'cf')
+
+
+def _scalar_attr(attrs, name):
+    """
+    Return a numeric attribute as a scalar, or None if it is not present.
+    """
+    value = attrs.get(name)
+    if value is None:
+        return None
+    value = np.asarray(value).ravel()
+    if value.size == 0 or value.dtype.kind not in 'biuf':
+        return None
+    return value[0]
+
+
+def decode_params(attrs):
+    """
+    Collect the fill value, scale factor and offset of a field.
+
+    Parameters
+    ----------
+    attrs : dict
+        field attributes
+
+    Returns
+    -------
+    fill, scale, offset
+        _FillValue, scale_factor and add_offset, None for those that are not
+        present
+    """
+    return (_scalar_attr(attrs, '_FillValue'),
+            _scalar_attr(attrs, 'scale_factor'),
+            _scalar_attr(attrs, 'add_offset'))
+
+
+def decode(raw, fill=None, scale=None, offset=None, convention='cf',
+           dtype=np.float32, masked=False, block=DECODE_BLOCK):
+    """
+    Apply fill masking and linear scaling to packed data in a single pass.
+
+    The data is processed a block of elements at a time.  Each block is
+    converted straight into the output array and scaled in place, so the only
+    full-size allocation is the output itself (plus the mask for masked
+    output).  If the raw data already has the target datatype, it is decoded
+    in place.
+
+    Parameters
+    ----------
+    raw : ndarray
+        data as stored in the file
+    fill : scalar, optional
+        fill value, compared against the raw data
+    scale, offset : scalar, optional
+        scale factor and offset
+    convention : {'cf', 'hdf4'}
+        how scale and offset are applied, see CONVENTIONS
+    dtype : numpy dtype
+        floating point datatype of the result
+    masked : bool
+        if true, return a masked array with fill values masked, otherwise
+        fill values are replaced by NaN
+    block : int
+        number of elements processed at a time
+
+    Returns
+    -------
+    data : ndarray or MaskedArray
+
+    Raises
+    ------
+    ValueError
+        If the datatype is not floating point or the convention is unknown.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f':
+        msg = "Decoded data must be floating point, not {0}."
+        raise ValueError(msg.format(dtype))
+    if convention not in CONVENTIONS:
+        msg = "Unknown scaling convention {0!r}, expected one of {1}."
+        raise ValueError(msg.format(convention, CONVENTIONS))
+
+    raw = np.asarray(raw)
+    if raw.dtype == dtype and raw.flags.c_contiguous and raw.flags.writeable:
+        out = raw
+    else:
+        raw = np.ascontiguousarray(raw)
+        out = np.empty(raw.shape, dtype=dtype)
+    mask = np.zeros(raw.shape, dtype=np.bool_) if masked else None
+
+    if fill is not None:
+        fill = np.asarray(fill).astype(raw.dtype)
+    if scale is not None and scale == 1:
+        scale = None
+    if offset is not None and offset == 0:
+        offset = None
+    if scale is not None:
+        scale = dtype.type(scale)
+    if offset is not None:
+        offset = dtype.type(offset)
+
+    src_flat = raw.reshape(-1)
+    dst_flat = out.reshape(-1)
+    mask_flat = None if mask is None else mask.reshape(-1)
+    scratch = np.empty(min(block, src_flat.size), dtype=np.bool_)
+    for i in range(0, src_flat.size, block):
+        src = src_flat[i:i + block]
+        dst = dst_flat[i:i + block]
+        if fill is not None:
+            # Compare before the block is overwritten when decoding in place.
+            if mask_flat is None:
+                isfill = scratch[:len(src)]
+            else:
+                isfill = mask_flat[i:i + block]
+            np.equal(src, fill, out=isfill)
+
+        if out is not raw:
+            np.copyto(dst, src, casting='unsafe')
+        if convention == 'cf':
+            if scale is not None:
+                dst *= scale
+            if offset is not None:
+                dst += offset
+        else:
+            if offset is not None:
+                dst -= offset
+            if scale is not None:
+                dst *= scale
+
+        if fill is not None and mask_flat is None:
+            dst[isfill] = np.nan
+
+    if masked:
+        return np.ma.MaskedArray(out, mask=mask)
+    return out
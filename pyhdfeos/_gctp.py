@@ -0,0 +1,549 @@
+"""
+Vectorized inverse projections of common GCTP projections.
+
+GDij2ll sends every pixel through the GCTP inverse transform one point at a
+time.  For the projections handled here, the same equations are evaluated
+with NumPy on whole arrays.  Anything else, or any parameter set whose
+treatment by GCTP is not reproduced exactly, is left to GDij2ll.
+"""
+import numpy as np
+
+PI = np.pi
+HALF_PI = PI / 2
+TWO_PI = PI * 2
+EPSLN = 1.0e-10
+
+# Semi-major and semi-minor axes of the GCTP spheroids, by spheroid code.
+SPHEROIDS = [(6378206.4, 6356583.8),          # Clarke 1866
+             (6378249.145, 6356514.86955),    # Clarke 1880
+             (6377397.155, 6356078.96284),    # Bessel
+             (6378157.5, 6356772.2),          # International 1967
+             (6378388.0, 6356911.94613),      # International 1909
+             (6378135.0, 6356750.519915),     # WGS 72
+             (6377276.3452, 6356075.4133),    # Everest
+             (6378145.0, 6356759.769356),     # WGS 66
+             (6378137.0, 6356752.31414),      # GRS 1980
+             (6377563.396, 6356256.91),       # Airy
+             (6377340.189, 6356034.448),      # Modified Airy
+             (6377304.063, 6356103.039),      # Modified Everest
+             (6378137.0, 6356752.314245),     # WGS 84
+             (6378155.0, 6356773.3205),       # Southeast Asia
+             (6378160.0, 6356774.719),        # Australian National
+             (6378245.0, 6356863.0188),       # Krassovsky
+             (6378270.0, 6356794.343479),     # Hough
+             (6378166.0, 6356784.283666),     # Mercury 1960
+             (6378150.0, 6356768.337303),     # Modified Mercury 1968
+             (6370997.0, 6370997.0),          # Sphere of radius 6370997m
+             (6371228.0, 6371228.0),          # Sphere of radius 6371228m
+             (6371007.181, 6371007.181)]      # Sphere of radius 6371007.181
+
+
+def dms2deg(value):
+    """
+    Convert a packed DMS angle (DDDMMMSSS.SS) to decimal degrees.
+    """
+    value = float(value)
+    degrees = int(value / 1e6)
+    minutes = int((value - degrees * 1e6) / 1e3)
+    seconds = value - degrees * 1e6 - minutes * 1e3
+    return degrees + minutes / 60.0 + seconds / 3600.0
+
+
+def _dms2rad(value):
+    return np.radians(dms2deg(value))
+
+
+def _adjust_lon(x):
+    """
+    Bring longitudes back into [-pi, pi], the way GCTP does.
+    """
+    for _ in range(5):
+        big = np.abs(x) > PI
+        if not big.any():
+            break
+        near = big & (np.abs(x / PI) < 2)
+        far = big & ~near
+        x = np.where(near, x - np.sign(x) * TWO_PI, x)
+        x = np.where(far, x - np.trunc(x / TWO_PI) * TWO_PI, x)
+    return x
+
+
+def _asinz(x):
+    return np.arcsin(np.clip(x, -1.0, 1.0))
+
+
+def _msfnz(e, sinphi, cosphi):
+    con = e * sinphi
+    return cosphi / np.sqrt(1.0 - con * con)
+
+
+def _qsfnz(e, sinphi):
+    if e > 1.0e-7:
+        con = e * sinphi
+        return ((1.0 - e * e) *
+                (sinphi / (1.0 - con * con) -
+                 (0.5 / e) * np.log((1.0 - con) / (1.0 + con))))
+    return 2.0 * sinphi
+
+
+def _tsfnz(e, phi, sinphi):
+    con = ((1.0 - e * sinphi) / (1.0 + e * sinphi)) ** (0.5 * e)
+    return np.tan(0.5 * (HALF_PI - phi)) / con
+
+
+def _phi1z(e, qs):
+    """
+    Latitude from the authalic function q, None if it does not converge.
+    """
+    phi = _asinz(0.5 * qs)
+    if e < EPSLN:
+        return phi
+    es = e * e
+    for _ in range(25):
+        sinphi = np.sin(phi)
+        con = e * sinphi
+        com = 1.0 - con * con
+        dphi = (0.5 * com * com / np.cos(phi) *
+                (qs / (1.0 - es) - sinphi / com +
+                 0.5 / e * np.log((1.0 - con) / (1.0 + con))))
+        phi = phi + dphi
+        if np.all(np.abs(dphi) <= 1e-7):
+            return phi
+    return None
+
+
+def _phi2z(e, ts):
+    """
+    Latitude from the isometric function t, None if it does not converge.
+    """
+    phi = HALF_PI - 2 * np.arctan(ts)
+    for _ in range(16):
+        con = e * np.sin(phi)
+        dphi = (HALF_PI -
+                2 * np.arctan(ts * ((1.0 - con) / (1.0 + con)) ** (0.5 * e)) -
+                phi)
+        phi = phi + dphi
+        if np.all(np.abs(dphi) <= EPSLN):
+            return phi
+    return None
+
+
+def _spheroid(spherecode, projparms):
+    """
+    Semi-major axis, semi-minor axis and sphere radius as GCTP picks them.
+
+    The radius is None where GCTP's choice of it depends on the version of
+    the library.  None is returned for parameter sets not handled here.
+    """
+    if spherecode >= 0:
+        if spherecode >= len(SPHEROIDS):
+            return None
+        major, minor = SPHEROIDS[spherecode]
+        radius = major if spherecode == 19 else None
+        return major, minor, radius
+
+    # User-defined: the semi-major axis, then either the semi-minor axis or
+    # the square of the eccentricity.
+    major = abs(projparms[0])
+    minor = abs(projparms[1])
+    if major == 0:
+        return None
+    if minor > 1.0:
+        return major, minor, major
+    if minor > 0.0:
+        return major, np.sqrt(1.0 - minor) * major, major
+    return major, major, major
+
+
+def _utm(x, y, zonecode, projparms, spheroid):
+    r_major, r_minor, _ = spheroid
+    es = 1.0 - (r_minor / r_major) ** 2
+    if es < 0.00001:
+        # The spherical equations are left to GCTP.
+        return None
+
+    zone = zonecode
+    if zone == 0:
+        lon = dms2deg(projparms[0])
+        zone = int((lon + 180.0) / 6.0 + 1.0)
+        if projparms[1] < 0:
+            zone = -zone
+    scale_factor = 0.9996
+    lon_center = np.radians(6 * abs(zone) - 183)
+    false_easting = 500000.0
+    false_northing = 10000000.0 if zone < 0 else 0.0
+
+    e0 = 1.0 - 0.25 * es * (1.0 + es / 16.0 * (3.0 + 1.25 * es))
+    e1 = 0.375 * es * (1.0 + 0.25 * es * (1.0 + 0.46875 * es))
+    e2 = 0.05859375 * es * es * (1.0 + 0.75 * es)
+    e3 = es * es * es * (35.0 / 3072.0)
+    esp = es / (1.0 - es)
+
+    x = x - false_easting
+    y = y - false_northing
+    con = (y / scale_factor) / r_major
+    phi = con
+    for _ in range(7):
+        delta_phi = ((con + e1 * np.sin(2.0 * phi) - e2 * np.sin(4.0 * phi) +
+                      e3 * np.sin(6.0 * phi)) / e0) - phi
+        phi = phi + delta_phi
+        if np.all(np.abs(delta_phi) <= EPSLN):
+            break
+    else:
+        return None
+
+    inside = np.abs(phi) < HALF_PI
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    tan_phi = np.tan(phi)
+    c = esp * cos_phi ** 2
+    cs = c * c
+    t = tan_phi ** 2
+    ts = t * t
+    con = 1.0 - es * sin_phi ** 2
+    n = r_major / np.sqrt(con)
+    r = n * (1.0 - es) / con
+    d = x / (n * scale_factor)
+    ds = d * d
+    lat = phi - (n * tan_phi * ds / r) * (
+        0.5 - ds / 24.0 * (5.0 + 3.0 * t + 10.0 * c - 4.0 * cs - 9.0 * esp -
+                           ds / 30.0 * (61.0 + 90.0 * t + 298.0 * c +
+                                        45.0 * ts - 252.0 * esp - 3.0 * cs)))
+    lon = _adjust_lon(lon_center + (d * (1.0 - ds / 6.0 * (
+        1.0 + 2.0 * t + c - ds / 20.0 * (5.0 - 2.0 * c + 28.0 * t - 3.0 * cs +
+                                         8.0 * esp + 24.0 * ts))) / cos_phi))
+    lat = np.where(inside, lat, HALF_PI * np.sign(y))
+    lon = np.where(inside, lon, lon_center)
+    return lon, lat
+
+
+def _albers(x, y, zonecode, projparms, spheroid):
+    r_major, r_minor, _ = spheroid
+    lat1 = _dms2rad(projparms[2])
+    lat2 = _dms2rad(projparms[3])
+    lon_center = _dms2rad(projparms[4])
+    lat0 = _dms2rad(projparms[5])
+    false_easting = projparms[6]
+    false_northing = projparms[7]
+    if abs(lat1 + lat2) < EPSLN:
+        return None
+
+    es = 1.0 - (r_minor / r_major) ** 2
+    e3 = np.sqrt(es)
+    ms1 = _msfnz(e3, np.sin(lat1), np.cos(lat1))
+    qs1 = _qsfnz(e3, np.sin(lat1))
+    ms2 = _msfnz(e3, np.sin(lat2), np.cos(lat2))
+    qs2 = _qsfnz(e3, np.sin(lat2))
+    qs0 = _qsfnz(e3, np.sin(lat0))
+    if abs(lat1 - lat2) > EPSLN:
+        ns0 = (ms1 * ms1 - ms2 * ms2) / (qs2 - qs1)
+    else:
+        ns0 = np.sin(lat1)
+    c = ms1 * ms1 + ns0 * qs1
+    rh = r_major * np.sqrt(c - ns0 * qs0) / ns0
+
+    x = x - false_easting
+    y = rh - y + false_northing
+    sign = 1.0 if ns0 >= 0 else -1.0
+    rh1 = sign * np.sqrt(x * x + y * y)
+    theta = np.where(rh1 != 0.0, np.arctan2(sign * x, sign * y), 0.0)
+    con = rh1 * ns0 / r_major
+    qs = (c - con * con) / ns0
+    if e3 >= 1e-10:
+        con = 1 - 0.5 * (1.0 - es) * np.log((1.0 - e3) / (1.0 + e3)) / e3
+        pole = np.abs(np.abs(con) - np.abs(qs)) <= 0.0000000001
+        lat = _phi1z(e3, np.where(pole, 0.0, qs))
+        if lat is None:
+            return None
+        lat = np.where(pole, np.where(qs >= 0, HALF_PI, -HALF_PI), lat)
+    else:
+        lat = _phi1z(e3, qs)
+        if lat is None:
+            return None
+    lon = _adjust_lon(theta / ns0 + lon_center)
+    return lon, lat
+
+
+def _polar_stereographic(x, y, zonecode, projparms, spheroid):
+    r_major, r_minor, _ = spheroid
+    center_lon = _dms2rad(projparms[4])
+    center_lat = _dms2rad(projparms[5])
+    false_easting = projparms[6]
+    false_northing = projparms[7]
+
+    es = 1.0 - (r_minor / r_major) ** 2
+    e = np.sqrt(es)
+    fac = -1.0 if center_lat < 0 else 1.0
+
+    x = (x - false_easting) * fac
+    y = (y - false_northing) * fac
+    rh = np.sqrt(x * x + y * y)
+    if abs(abs(center_lat) - HALF_PI) > EPSLN:
+        con1 = fac * center_lat
+        mcs = _msfnz(e, np.sin(con1), np.cos(con1))
+        tcs = _tsfnz(e, con1, np.sin(con1))
+        ts = rh * tcs / (r_major * mcs)
+    else:
+        e4 = np.sqrt((1.0 + e) ** (1.0 + e) * (1.0 - e) ** (1.0 - e))
+        ts = rh * e4 / (r_major * 2.0)
+    lat = _phi2z(e, ts)
+    if lat is None:
+        return None
+    lat = fac * lat
+    lon = np.where(rh == 0, fac * center_lon,
+                   _adjust_lon(fac * np.arctan2(x, -y) + center_lon))
+    return lon, lat
+
+
+def _lambert_azimuthal(x, y, zonecode, projparms, spheroid):
+    radius = spheroid[2]
+    if radius is None:
+        return None
+    lon_center = _dms2rad(projparms[4])
+    lat_center = _dms2rad(projparms[5])
+    false_easting = projparms[6]
+    false_northing = projparms[7]
+    sin_lat_o = np.sin(lat_center)
+    cos_lat_o = np.cos(lat_center)
+
+    x = x - false_easting
+    y = y - false_northing
+    rh = np.sqrt(x * x + y * y)
+    temp = rh / (2.0 * radius)
+    if np.any(temp > 1):
+        # GCTP reports an error for these points.
+        return None
+    z = 2.0 * _asinz(temp)
+    sin_z = np.sin(z)
+    cos_z = np.cos(z)
+    center = np.abs(rh) <= EPSLN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lat = _asinz(sin_lat_o * cos_z + cos_lat_o * sin_z * y / rh)
+    lat = np.where(center, lat_center, lat)
+
+    if abs(abs(lat_center) - HALF_PI) > EPSLN:
+        temp = cos_z - sin_lat_o * np.sin(lat)
+        lon = np.where(temp != 0.0,
+                       _adjust_lon(lon_center +
+                                   np.arctan2(x * sin_z * cos_lat_o,
+                                              temp * rh)),
+                       lon_center)
+    elif lat_center < 0.0:
+        lon = _adjust_lon(lon_center - np.arctan2(-x, y))
+    else:
+        lon = _adjust_lon(lon_center + np.arctan2(x, -y))
+    lon = np.where(center, lon_center, lon)
+    return lon, lat
+
+
+def _sinusoidal(x, y, zonecode, projparms, spheroid):
+    radius = spheroid[2]
+    if radius is None:
+        return None
+    lon_center = _dms2rad(projparms[4])
+    false_easting = projparms[6]
+    false_northing = projparms[7]
+
+    x = x - false_easting
+    y = y - false_northing
+    lat = y / radius
+    if np.any(np.abs(lat) > HALF_PI):
+        # GCTP reports an error for these points.
+        return None
+    pole = np.abs(np.abs(lat) - HALF_PI) <= EPSLN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lon = _adjust_lon(lon_center + x / (radius * np.cos(lat)))
+    lon = np.where(pole, lon_center, lon)
+    return lon, lat
+
+
+def _cea(x, y, zonecode, projparms, spheroid):
+    r_major, r_minor, _ = spheroid
+    lon_center = _dms2rad(projparms[4])
+    lat_truesc = _dms2rad(projparms[5])
+    false_easting = projparms[6]
+    false_northing = projparms[7]
+
+    es = 1.0 - (r_minor / r_major) ** 2
+    e = np.sqrt(es)
+    kz = _msfnz(e, np.sin(lat_truesc), np.cos(lat_truesc))
+
+    x = x - false_easting
+    y = y - false_northing
+    lon = _adjust_lon(lon_center + x / (r_major * kz))
+    lat = _phi1z(e, 2.0 * y * kz / r_major)
+    if lat is None:
+        return None
+    return lon, lat
+
+
+# Inverse transforms by GCTP projection code.  Each takes projected x and y
+# in meters and returns longitude and latitude in radians, or None.
+_INVERSES = {1: _utm,
+             3: _albers,
+             6: _polar_stereographic,
+             11: _lambert_azimuthal,
+             16: _sinusoidal,
+             97: _cea}
+
+# Projection codes handled here, including Geographic.
+PROJECTIONS = frozenset([0]) | frozenset(_INVERSES)
+
+
+def pixel_adjustment(pixregcode, origincode):
+    """
+    Position within a pixel of the coordinates of that pixel.
+
+    Parameters
+    ----------
+    pixregcode : int
+        pixel registration, 0 (center) or 1 (corner)
+    origincode : int
+        grid origin, 0 (upper left) to 3 (lower right), which selects the
+        corner when pixels are registered at a corner
+
+    Returns
+    -------
+    adjx, adjy : float
+        fraction of a pixel along columns and rows
+    """
+    if pixregcode == 0:
+        return 0.5, 0.5
+    return {0: (0.0, 0.0),
+            1: (1.0, 0.0),
+            2: (0.0, 1.0),
+            3: (1.0, 1.0)}[origincode]
+
+
+def corners(projcode, upleft, lowright):
+    """
+    Corners of a grid in the units of its projected coordinates.
+
+    Parameters
+    ----------
+    projcode : int
+        GCTP projection code
+    upleft, lowright : ndarray
+        corners of the grid as stored, in packed DMS for Geographic grids
+
+    Returns
+    -------
+    upleft, lowright : tuple
+        corners in meters, or in decimal degrees for Geographic grids
+    """
+    if projcode == 0:
+        return ((dms2deg(upleft[0]), dms2deg(upleft[1])),
+                (dms2deg(lowright[0]), dms2deg(lowright[1])))
+    return ((float(upleft[0]), float(upleft[1])),
+            (float(lowright[0]), float(lowright[1])))
+
+
+def ij2xy(projcode, xdimsize, ydimsize, upleft, lowright, row, col,
+          pixregcode, origincode):
+    """
+    Convert row and column numbers to projected coordinates.
+
+    Parameters
+    ----------
+    projcode : int
+        GCTP projection code
+    xdimsize, ydimsize : int
+        size of the grid
+    upleft, lowright : ndarray
+        corners of the grid, in meters or in packed DMS for Geographic grids
+    row, col : array_like
+        zero-based row and column numbers
+    pixregcode, origincode : int
+        pixel registration and grid origin codes
+
+    Returns
+    -------
+    x, y : ndarray
+        x of each column and y of each row, at the position within the pixel
+        used by GDij2ll.  In meters, or in decimal degrees for Geographic
+        grids.
+    """
+    (x0, y0), (x1, y1) = corners(projcode, upleft, lowright)
+    adjx, adjy = pixel_adjustment(pixregcode, origincode)
+    col = np.asarray(col, dtype=np.float64) + adjx
+    row = np.asarray(row, dtype=np.float64) + adjy
+    x = col * ((x1 - x0) / xdimsize) + x0
+    y = row * ((y1 - y0) / ydimsize) + y0
+    return x, y
+
+
+def supports(projcode, spherecode, projparms):
+    """
+    Whether ij2ll can handle a projection and its parameters.
+
+    Even then ij2ll returns None if an iterative inverse does not converge.
+
+    Parameters
+    ----------
+    projcode, spherecode : int
+        GCTP projection and spheroid codes
+    projparms : ndarray
+        GCTP projection parameters
+
+    Returns
+    -------
+    supported : bool
+    """
+    if projcode not in PROJECTIONS:
+        return False
+    return projcode == 0 or _spheroid(spherecode, projparms) is not None
+
+
+def ij2ll(projcode, zonecode, projparms, spherecode, xdimsize, ydimsize,
+          upleft, lowright, row, col, pixregcode, origincode):
+    """
+    Convert row and column numbers to longitude and latitude.
+
+    This is a vectorized counterpart of GDij2ll, taking the same arguments.
+
+    Parameters
+    ----------
+    projcode, zonecode, spherecode : int
+        GCTP projection, zone and spheroid codes
+    projparms : ndarray
+        GCTP projection parameters
+    xdimsize, ydimsize : int
+        size of the grid
+    upleft, lowright : ndarray
+        corners of the grid, in meters or in packed DMS for Geographic grids
+    row, col : array_like
+        zero-based row and column numbers, broadcast against each other
+    pixregcode, origincode : int
+        pixel registration and grid origin codes
+
+    Returns
+    -------
+    longitude, latitude : ndarray or None
+        in decimal degrees, with the broadcast shape of row and col.  None
+        if the projection or its parameters are not handled here, in which
+        case GDij2ll has to be used.
+    """
+    if projcode not in PROJECTIONS:
+        return None
+    if projcode == 0:
+        lon, lat = ij2xy(projcode, xdimsize, ydimsize, upleft, lowright,
+                         row, col, pixregcode, origincode)
+    else:
+        spheroid = _spheroid(spherecode, projparms)
+        if spheroid is None:
+            return None
+        x, y = ij2xy(projcode, xdimsize, ydimsize, upleft, lowright, row,
+                     col, pixregcode, origincode)
+        x, y = np.broadcast_arrays(x, y)
+        result = _INVERSES[projcode](x, y, zonecode, projparms, spheroid)
+        if result is None:
+            return None
+        lon, lat = np.degrees(result[0]), np.degrees(result[1])
+
+    # Geographic coordinates are separable, so broadcast them in full.
+    shape = np.broadcast(np.asarray(row), np.asarray(col)).shape
+    if lon.shape != shape:
+        lon = lon + np.zeros(shape)
+    if lat.shape != shape:
+        lat = lat + np.zeros(shape)
+    return lon, lat
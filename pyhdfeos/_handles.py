@@ -0,0 +1,293 @@
+"""
+Reference-counted HDF-EOS file handles and a process-wide pool of them.
+"""
+import collections
+import os
+import threading
+
+# File signatures.  HDF5 allows a user block in front of the superblock, so
+# its signature may also be found at 512, 1024, 2048, ... bytes.
+HDF4_MAGIC = b'\x0e\x03\x13\x01'
+HDF5_MAGIC = b'\x89HDF\r\n\x1a\n'
+
+# Counters and size of a HandlePool, as returned by HandlePool.info.
+PoolInfo = collections.namedtuple('PoolInfo', ['hits', 'misses', 'evictions',
+                                               'maxsize', 'currsize'])
+
+
+def sniff_format(filename):
+    """
+    Tell HDF4 and HDF5 files apart by their signature.
+
+    Parameters
+    ----------
+    filename : str
+        file to look at
+
+    Returns
+    -------
+    backend : str or None
+        'he4' for HDF4 (HDF-EOS2), 'he5' for HDF5 (HDF-EOS5) or None if
+        neither signature is found
+    """
+    with open(filename, 'rb') as f:
+        head = f.read(len(HDF5_MAGIC))
+        if head.startswith(HDF4_MAGIC):
+            return 'he4'
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        offset = 0
+        while offset + len(HDF5_MAGIC) <= size:
+            f.seek(offset)
+            if f.read(len(HDF5_MAGIC)) == HDF5_MAGIC:
+                return 'he5'
+            offset = 512 if offset == 0 else offset * 2
+    return None
+
+
+class FileHandle(object):
+    """
+    Reference-counted HDF-EOS file handle, shared by the grids of a file.
+
+    The file is closed when the last reference is released.
+
+    Parameters
+    ----------
+    filename : str
+        HDF-EOS2 or HDF-EOS5 file
+    he_module : module
+        backend to open the file with
+    lazy : bool
+        if true, the file is not opened until its identifier is first asked
+        for
+
+    Attributes
+    ----------
+    cache : dict
+        information derived from the file (list of grids, attribute index)
+        that is only valid for as long as the file is open
+    """
+    def __init__(self, filename, he_module, lazy=False):
+        self.filename = filename
+        self._he = he_module
+        self._gdfid = None if lazy else he_module.gdopen(filename)
+        self.cache = {}
+        self._refcount = 1
+        self._lock = threading.Lock()
+
+    @property
+    def gdfid(self):
+        """
+        Grid file identifier, opening the file if necessary.
+        """
+        with self._lock:
+            if self._refcount == 0:
+                msg = "File {0} has already been closed."
+                raise RuntimeError(msg.format(self.filename))
+            if self._gdfid is None:
+                self._gdfid = self._he.gdopen(self.filename)
+            return self._gdfid
+
+    @property
+    def closed(self):
+        return self._refcount == 0
+
+    @property
+    def opened(self):
+        """
+        Whether the library has actually opened the file.
+        """
+        return self._gdfid is not None
+
+    @property
+    def refcount(self):
+        return self._refcount
+
+    def acquire(self):
+        """
+        Take another reference to the open file.
+
+        Raises
+        ------
+        RuntimeError
+            If the file has already been closed.
+        """
+        with self._lock:
+            if self._refcount == 0:
+                msg = "File {0} has already been closed."
+                raise RuntimeError(msg.format(self.filename))
+            self._refcount += 1
+        return self
+
+    def release(self):
+        """
+        Drop a reference, closing the file when none remain.
+        """
+        with self._lock:
+            if self._refcount == 0:
+                return
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+        self.cache.clear()
+        if self._gdfid is not None:
+            self._he.gdclose(self._gdfid)
+
+
+class HandlePool(object):
+    """
+    Pool of open file handles, shared by every GridFile of the process.
+
+    Handles are keyed on the absolute path, modification time and size of
+    the file, so a file that is rewritten is opened afresh, and on the
+    backend that opened it.  The pool keeps
+    a reference to up to ``maxsize`` handles, evicting the least recently
+    used one beyond that.  An evicted handle is closed as soon as the last
+    GridFile or grid using it lets go of it.
+
+    Parameters
+    ----------
+    maxsize : int
+        maximum number of files kept open by the pool, 0 disables pooling
+
+    Attributes
+    ----------
+    hits, misses, evictions : int
+        number of handles reused, opened and evicted
+    """
+    def __init__(self, maxsize=64):
+        self._maxsize = maxsize
+        self._handles = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._handles)
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if value < 0:
+            msg = "The pool size must be non-negative, not {0}."
+            raise ValueError(msg.format(value))
+        with self._lock:
+            self._maxsize = value
+            evicted = self._trim()
+        self._release(evicted)
+
+    def open(self, filename, opener, backend=None):
+        """
+        Return a reference to an open handle for a file.
+
+        The caller owns the reference and must release it when done.
+
+        Parameters
+        ----------
+        filename : str
+            HDF-EOS2 or HDF-EOS5 file
+        opener : callable
+            function of the filename that opens a new FileHandle
+        backend : str, optional
+            module name of the backend the handle has to use, if a pooled
+            handle opened by any backend will not do
+
+        Returns
+        -------
+        handle : FileHandle
+
+        Raises
+        ------
+        IOError
+            If the file cannot be opened.
+        """
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        version = (path, st.st_mtime, st.st_size)
+
+        with self._lock:
+            key = self._find(version, backend)
+            if key is not None:
+                handle = self._handles[key]
+                # Re-insert to mark as most recently used (Python 2.7's
+                # OrderedDict has no move_to_end).
+                self._handles[key] = self._handles.pop(key)
+                self.hits += 1
+                return handle.acquire()
+            self.misses += 1
+
+        handle = opener(filename)
+        if self._maxsize == 0:
+            return handle
+
+        key = version + (handle._he.__name__,)
+        with self._lock:
+            # Drop handles on earlier versions of the file, and one that
+            # another thread may have opened in the meantime.
+            evicted = [self._handles.pop(k) for k in list(self._handles)
+                       if k[0] == path and (k[:3] != version or k == key)]
+            self.evictions += len(evicted)
+            self._handles[key] = handle.acquire()
+            evicted.extend(self._trim())
+        self._release(evicted)
+        return handle
+
+    def clear(self):
+        """
+        Drop every pooled handle, closing those that are not in use.
+        """
+        with self._lock:
+            evicted = list(self._handles.values())
+            self._handles.clear()
+        self._release(evicted)
+
+    def info(self):
+        """
+        Return the pool counters.
+
+        Returns
+        -------
+        info : PoolInfo
+            hits, misses, evictions, maxsize and current number of handles
+        """
+        with self._lock:
+            return PoolInfo(self.hits, self.misses, self.evictions,
+                            self._maxsize, len(self._handles))
+
+    def _find(self, version, backend):
+        """
+        Key of a pooled handle on a version of a file, or None.
+        """
+        if backend is not None:
+            key = version + (backend,)
+            return key if key in self._handles else None
+        for key in self._handles:
+            if key[:3] == version:
+                return key
+        return None
+
+    def _trim(self):
+        """
+        Remove least recently used handles beyond maxsize, returning them.
+        """
+        evicted = []
+        while len(self._handles) > self._maxsize:
+            _, handle = self._handles.popitem(last=False)
+            evicted.append(handle)
+            self.evictions += 1
+        return evicted
+
+    def _release(self, handles):
+        """
+        Release the pool's references, outside of the pool lock.
+        """
+        for handle in handles:
+            handle.release()
+
+
+# Handles behind every GridFile of the process.
+handle_pool = HandlePool()
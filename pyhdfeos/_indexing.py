@@ -0,0 +1,660 @@
+"""
+Translation of array-style indices into HDF-EOS hyperslab reads.
+"""
+import collections
+import itertools
+import operator
+import threading
+
+import numpy as np
+
+# Unwanted elements tolerated between two requested indices of an integer
+# array or boolean index before they are read with separate hyperslabs.
+DEFAULT_MAX_GAP = 16
+
+# Approximate size of the blocks that untiled fields are iterated over in.
+DEFAULT_BLOCK_BYTES = 4 * 2**20
+
+
+class IndexPlan(object):
+    """
+    Compiled form of a basic-indexing expression applied to a field.
+
+    Attributes
+    ----------
+    start, stride, edge : tuple
+        hyperslab arguments for GDreadfield/HE5_GDreadfield.  The stride is
+        always positive, negative steps are handled by the view.
+    shape : tuple
+        shape of the final result, as numpy would return it
+    layout : tuple
+        shape of the result before the array dimensions are moved to the
+        front, the same as shape unless front is nonzero
+    view : tuple or None
+        index applied to the edge-shaped buffer in order to produce the final
+        result.  It only ever drops scalar dimensions, inserts new axes, or
+        reverses axes, so it never copies.  None if the buffer is already the
+        final result.
+    reshape_only : bool
+        True if the view does not reverse any axis, i.e. the final result of
+        a C-contiguous buffer is also C-contiguous.
+    axis : int or None
+        dimension indexed by an integer array or boolean mask, if any.  The
+        buffer then holds the sorted, unique requested indices along that
+        dimension, and the start/stride/edge entries for it are placeholders.
+    segments : list of Segment
+        hyperslab reads that together fill the buffer along axis
+    inverse : ndarray or None
+        positions within the buffer of the requested indices, in request
+        order, or None if the buffer already is in request order
+    front : int
+        number of leading result dimensions that numpy semantics move to the
+        front of the result
+    """
+    __slots__ = ('start', 'stride', 'edge', 'shape', 'layout', 'view',
+                 'reshape_only', 'size', 'axis', 'segments', 'inverse',
+                 'front', 'position')
+
+    def __init__(self, start, stride, edge, shape, view, reshape_only,
+                 axis=None, segments=None, inverse=None, position=0,
+                 front=0):
+        self.start = start
+        self.stride = stride
+        self.edge = edge
+        self.layout = shape
+        if front:
+            moved = shape[position:position + front]
+            shape = moved + shape[:position] + shape[position + front:]
+        self.shape = shape
+        self.view = view
+        self.reshape_only = reshape_only and axis is None
+        self.size = int(np.prod(edge))
+        self.axis = axis
+        self.segments = segments
+        self.inverse = inverse
+        self.position = position
+        self.front = front
+
+    def finish(self, buffer, move=True):
+        """
+        Produce the final result from an edge-shaped buffer.
+
+        Only integer array indices that are unsorted or repeated require a
+        copy, everything else is a view of the buffer.  With move false the
+        result is left in the layout shape.
+        """
+        if self.inverse is not None:
+            buffer = np.take(buffer, self.inverse, axis=self.axis)
+        if self.view is not None:
+            buffer = buffer[self.view]
+        if move and self.front:
+            # numpy moves the dimensions of the advanced index to the front
+            # when advanced indices are not adjacent.
+            src = range(self.position, self.position + self.front)
+            buffer = np.moveaxis(buffer, list(src), list(range(self.front)))
+        return buffer
+
+    def layout_view(self, out):
+        """
+        View of a result-shaped array in the layout shape.
+        """
+        if not self.front:
+            return out
+        dst = range(self.position, self.position + self.front)
+        return np.moveaxis(out, list(range(self.front)), list(dst))
+
+    def hyperslabs(self):
+        """
+        Generate the hyperslab reads required by the plan.
+
+        Yields
+        ------
+        start, stride, edge : tuple
+            hyperslab arguments
+        segment : Segment or None
+            the segment along the array-indexed dimension, if any
+        """
+        if self.axis is None:
+            yield self.start, self.stride, self.edge, None
+            return
+
+        for segment in self.segments:
+            start = list(self.start)
+            stride = list(self.stride)
+            edge = list(self.edge)
+            start[self.axis] = segment.start
+            stride[self.axis] = segment.stride
+            edge[self.axis] = segment.count
+            yield tuple(start), tuple(stride), tuple(edge), segment
+
+
+class Segment(object):
+    """
+    One hyperslab read along the array-indexed dimension of a plan.
+
+    Attributes
+    ----------
+    start, stride, count : int
+        hyperslab along the array-indexed dimension
+    dest : int
+        offset along that dimension in the plan buffer
+    picks : ndarray or None
+        positions of the wanted elements within the segment, or None if
+        every element that is read is wanted
+    """
+    __slots__ = ('start', 'stride', 'count', 'dest', 'picks')
+
+    def __init__(self, start, stride, count, dest, picks=None):
+        self.start = start
+        self.stride = stride
+        self.count = count
+        self.dest = dest
+        self.picks = picks
+
+    def __repr__(self):
+        msg = "Segment(start={0}, stride={1}, count={2}, dest={3})"
+        return msg.format(self.start, self.stride, self.count, self.dest)
+
+
+def coalesce(indices, max_gap=DEFAULT_MAX_GAP, chunk=None):
+    """
+    Group sorted, unique indices into as few hyperslab reads as possible.
+
+    Neighbouring indices are read together when no more than max_gap
+    unwanted elements lie between them, or when they fall into the same
+    chunk (tile) at most an eighth of a chunk apart, so that the chunk is
+    decompressed only once without copying most of it out for nothing.
+    Evenly spaced runs are read with a stride so that no unwanted elements
+    are read at all.
+
+    Parameters
+    ----------
+    indices : ndarray
+        sorted, unique, non-negative indices
+    max_gap : int
+        largest number of unwanted elements to read in order to avoid an
+        additional hyperslab read
+    chunk : int, optional
+        chunk size along the dimension, if the field is tiled
+
+    Returns
+    -------
+    segments : list of Segment
+    """
+    segments = []
+    if len(indices) == 0:
+        return segments
+
+    gaps = np.diff(indices) - 1
+    split = gaps > max_gap
+    if chunk:
+        # Reading across a gap within a decompressed tile is cheaper than
+        # another library call, but only up to a fraction of the tile.
+        tiles = indices // chunk
+        split &= (tiles[1:] != tiles[:-1]) | (gaps > chunk // 8)
+    breaks = np.flatnonzero(split) + 1
+    bounds = [0] + breaks.tolist() + [len(indices)]
+    for k0, k1 in zip(bounds[:-1], bounds[1:]):
+        members = indices[k0:k1]
+        first = int(members[0])
+        if len(members) == 1:
+            segments.append(Segment(first, 1, 1, k0))
+            continue
+
+        steps = np.diff(members)
+        if (steps == steps[0]).all():
+            segments.append(Segment(first, int(steps[0]), len(members), k0))
+        else:
+            count = int(members[-1]) - first + 1
+            segments.append(Segment(first, 1, count, k0, members - first))
+    return segments
+
+
+def chunks_touched(start, stride, edge, chunks):
+    """
+    Number of chunks (tiles) that a hyperslab read has to decompress.
+
+    Parameters
+    ----------
+    start, stride, edge : tuple
+        hyperslab arguments
+    chunks : tuple or None
+        chunk shape of the field, None if the field is not tiled
+
+    Returns
+    -------
+    count : int
+        number of chunks intersected by the hyperslab, 1 for untiled fields
+        unless nothing is read at all
+    """
+    if any(n == 0 for n in edge):
+        return 0
+    if not chunks:
+        return 1
+    count = 1
+    for first, step, n, chunk in zip(start, stride, edge, chunks):
+        positions = first + step * np.arange(n)
+        count *= len(np.unique(positions // chunk))
+    return count
+
+
+def block_shape_for(shape, itemsize, block_shape=None, chunks=None,
+                    nbytes=DEFAULT_BLOCK_BYTES):
+    """
+    Resolve the shape of the blocks to iterate over a field in.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of the field
+    itemsize : int
+        size in bytes of one element of the field
+    block_shape : tuple, optional
+        requested block shape.  None entries span the whole dimension.  If
+        not given, the chunk shape is used, or blocks of whole trailing
+        dimensions of about nbytes for untiled fields.
+    chunks : tuple, optional
+        chunk (tile) shape of the field.  Requested block dimensions are
+        rounded up to a multiple of it.
+    nbytes : int
+        approximate block size for untiled fields
+
+    Returns
+    -------
+    block_shape : tuple
+
+    Raises
+    ------
+    ValueError
+        If the requested block shape does not suit the field.
+    """
+    if block_shape is None:
+        if chunks:
+            return tuple(min(c, n) for c, n in zip(chunks, shape))
+        block = list(shape)
+        for j in range(len(shape)):
+            trailing = itemsize * int(np.prod(shape[j + 1:]))
+            if trailing * shape[j] <= nbytes:
+                break
+            block[j] = max(1, nbytes // trailing)
+            if trailing <= nbytes:
+                break
+        return tuple(max(1, b) for b in block)
+
+    if len(block_shape) != len(shape):
+        msg = "Block shape {0} does not match the field rank {1}."
+        raise ValueError(msg.format(block_shape, len(shape)))
+    block = []
+    for j, (b, n) in enumerate(zip(block_shape, shape)):
+        if b is None:
+            b = n
+        elif b < 1:
+            msg = "Block dimension {0} must be positive, not {1}."
+            raise ValueError(msg.format(j, b))
+        if chunks:
+            b = -(-b // chunks[j]) * chunks[j]
+        block.append(max(1, min(int(b), n)))
+    return tuple(block)
+
+
+def block_windows(shape, block_shape, order='C'):
+    """
+    Generate the windows that cover a field block by block.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of the field
+    block_shape : tuple
+        shape of a (full) block.  Blocks along the upper edges of the field
+        are truncated.
+    order : {'C', 'F'}
+        whether the last ('C') or the first ('F') dimension varies fastest
+
+    Yields
+    ------
+    window : tuple of slice
+    """
+    if order not in ('C', 'F'):
+        raise ValueError("order must be 'C' or 'F', not {0!r}.".format(order))
+    counts = [-(-n // b) for n, b in zip(shape, block_shape)]
+    dims = list(range(len(shape)))
+    if order == 'F':
+        dims.reverse()
+    for ks in itertools.product(*[range(counts[j]) for j in dims]):
+        if order == 'F':
+            ks = ks[::-1]
+        yield tuple(slice(k * b, min((k + 1) * b, n))
+                    for k, b, n in zip(ks, block_shape, shape))
+
+
+def split_hyperslab(start, stride, edge, nparts, chunks=None):
+    """
+    Split a hyperslab into contiguous parts along its outermost dimension.
+
+    The hyperslab is split along the first dimension with more than one
+    element, so that each part fills a contiguous region of the C-ordered
+    edge-shaped output buffer.  For tiled fields read without a stride the
+    parts are made of whole tiles wherever possible.
+
+    Parameters
+    ----------
+    start, stride, edge : tuple
+        hyperslab arguments
+    nparts : int
+        maximum number of parts
+    chunks : tuple, optional
+        chunk (tile) shape of the field
+
+    Returns
+    -------
+    axis : int
+        dimension along which the hyperslab is split
+    parts : list of tuple
+        (start, stride, edge, offset) of each part, where offset is its
+        position along axis within the output buffer
+    """
+    if not edge:
+        return 0, [(start, stride, edge, 0)]
+    axis = 0
+    for j, n in enumerate(edge):
+        if n > 1:
+            axis = j
+            break
+
+    n = edge[axis]
+    step = max(1, -(-n // max(1, nparts)))
+    lead = 0
+    if chunks and stride[axis] == 1:
+        chunk = chunks[axis]
+        step = -(-step // chunk) * chunk
+        lead = start[axis] % chunk
+
+    bounds = [0]
+    k = step - lead
+    while k < n:
+        if k > 0:
+            bounds.append(k)
+        k += step
+    bounds.append(n)
+
+    parts = []
+    for k0, k1 in zip(bounds[:-1], bounds[1:]):
+        part_start = list(start)
+        part_edge = list(edge)
+        part_start[axis] = start[axis] + stride[axis] * k0
+        part_edge[axis] = k1 - k0
+        parts.append((tuple(part_start), tuple(stride), tuple(part_edge), k0))
+    return axis, parts
+
+
+def _is_integer(idx):
+    return (isinstance(idx, (int, np.integer)) and
+            not isinstance(idx, (bool, np.bool_)))
+
+
+def _index_key(index):
+    """
+    Hashable representation of an index, or None if it cannot be cached.
+    """
+    if not isinstance(index, tuple):
+        index = (index,)
+    key = []
+    for idx in index:
+        if isinstance(idx, slice):
+            try:
+                key.append((None if idx.start is None
+                            else operator.index(idx.start),
+                            None if idx.stop is None
+                            else operator.index(idx.stop),
+                            None if idx.step is None
+                            else operator.index(idx.step)))
+            except TypeError:
+                return None
+        elif _is_integer(idx):
+            key.append(int(idx))
+        elif idx is None or idx is Ellipsis:
+            key.append(idx)
+        else:
+            return None
+    return tuple(key)
+
+
+def _array_index(idx, n, dim):
+    """
+    Normalize an integer array or boolean mask index for a dimension.
+
+    Returns
+    -------
+    indices : ndarray
+        non-negative integer indices
+    """
+    arr = np.asarray(idx)
+    if arr.dtype == np.bool_:
+        if arr.ndim != 1 or arr.shape[0] != n:
+            msg = "Boolean index for dimension {0} must be 1D with {1} "
+            msg += "elements."
+            raise IndexError(msg.format(dim, n))
+        return np.flatnonzero(arr)
+
+    if arr.size == 0:
+        arr = arr.astype(np.intp)
+    if not np.issubdtype(arr.dtype, np.integer):
+        msg = "Arrays used as indices must be of integer or boolean type."
+        raise IndexError(msg)
+    if arr.size > 0 and (arr.min() < -n or arr.max() >= n):
+        msg = "Index array is out of bounds for dimension {0} with size {1}."
+        raise IndexError(msg.format(dim, n))
+    return np.where(arr < 0, arr + n, arr).astype(np.intp)
+
+
+def _is_array_index(idx):
+    return isinstance(idx, (list, np.ndarray))
+
+
+def _expand_ellipsis(index, ndims):
+    """
+    Replace the (single) ellipsis with as many full slices as required.
+    """
+    nreal = sum(1 for idx in index if idx is not None and idx is not Ellipsis)
+    if nreal > ndims:
+        msg = "Too many indices ({0}) for a field with {1} dimensions."
+        raise IndexError(msg.format(nreal, ndims))
+
+    positions = [j for j, idx in enumerate(index) if idx is Ellipsis]
+    if len(positions) > 1:
+        raise IndexError("An index can only have a single ellipsis.")
+
+    fill = [slice(None, None, None)] * (ndims - nreal)
+    if positions:
+        j = positions[0]
+        return list(index[:j]) + fill + list(index[j + 1:])
+    return list(index) + fill
+
+
+def _compile(index, shape, max_gap=DEFAULT_MAX_GAP, chunks=None):
+    """
+    Build the IndexPlan for an index without consulting the cache.
+    """
+    ndims = len(shape)
+    if not isinstance(index, tuple):
+        index = (index,)
+    # Zero-dimensional integer arrays behave like plain integers.
+    index = [idx[()] if isinstance(idx, np.ndarray) and idx.ndim == 0 and
+             idx.dtype != np.bool_ else idx for idx in index]
+
+    # Positions of the advanced indices, needed to lay out the result the
+    # way numpy does.  An ellipsis separates them even if it is empty.
+    advanced = [j for j, idx in enumerate(index)
+                if _is_array_index(idx) or _is_integer(idx)]
+
+    index = _expand_ellipsis(index, ndims)
+
+    nfancy = sum(1 for idx in index if _is_array_index(idx))
+    if nfancy > 1:
+        msg = "Only one integer array or boolean index is supported."
+        raise IndexError(msg)
+
+    start = []
+    stride = []
+    edge = []
+    final_shape = []
+    view = []
+    trivial = True
+    reshape_only = True
+
+    axis = None
+    segments = None
+    inverse = None
+    position = 0
+    fancy_ndim = 0
+
+    dim = 0
+    for idx in index:
+        if idx is None:
+            view.append(None)
+            final_shape.append(1)
+            trivial = False
+            continue
+
+        n = shape[dim]
+        if _is_array_index(idx):
+            requested = _array_index(idx, n, dim)
+            unique, inv = np.unique(requested, return_inverse=True)
+            inv = inv.reshape(requested.shape)
+            if requested.ndim != 1 or len(unique) != len(requested):
+                inverse = inv
+            elif (np.diff(requested) <= 0).any():
+                inverse = inv
+            if callable(chunks):
+                chunks = chunks()
+            segments = coalesce(unique, max_gap,
+                                chunks[dim] if chunks else None)
+            axis = dim
+            fancy_ndim = requested.ndim
+            position = len(final_shape)
+
+            start.append(0)
+            stride.append(1)
+            edge.append(len(unique))
+            view.extend([slice(None, None, None)] * requested.ndim)
+            final_shape.extend(requested.shape)
+            dim += 1
+            continue
+
+        if isinstance(idx, slice):
+            first, stop, step = idx.indices(n)
+            count = len(range(first, stop, step))
+            if step < 0 and count > 0:
+                # Read the same elements in increasing order, then reverse.
+                first = first + (count - 1) * step
+                view.append(slice(None, None, -1))
+                trivial = False
+                reshape_only = False
+            else:
+                view.append(slice(None, None, None))
+            start.append(first if count > 0 else 0)
+            stride.append(abs(step))
+            edge.append(count)
+            final_shape.append(count)
+        elif _is_integer(idx):
+            idx = int(idx)
+            if idx < -n or idx >= n:
+                msg = "Index {0} is out of bounds for dimension {1} "
+                msg += "with size {2}."
+                raise IndexError(msg.format(idx, dim, n))
+            start.append(idx % n)
+            stride.append(1)
+            edge.append(1)
+            view.append(0)
+            trivial = False
+        else:
+            msg = "Unsupported index type {0}.".format(type(idx).__name__)
+            raise IndexError(msg)
+        dim += 1
+
+    front = 0
+    if axis is not None and advanced[-1] - advanced[0] + 1 != len(advanced):
+        # Integer indices count as advanced indices too once an array index
+        # is present.  Unless they are all adjacent, the array dimensions go
+        # first.
+        front = fancy_ndim
+
+    return IndexPlan(tuple(start), tuple(stride), tuple(edge),
+                     tuple(final_shape),
+                     None if trivial else tuple(view),
+                     reshape_only, axis=axis, segments=segments,
+                     inverse=inverse, position=position, front=front)
+
+
+class _PlanCache(object):
+    """
+    Bounded LRU cache of compiled index plans keyed by field shape and index.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._plans = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, index, shape, max_gap=DEFAULT_MAX_GAP, chunks=None):
+        key = _index_key(index)
+        if key is None:
+            # Array indices are neither hashable nor likely to repeat.  They
+            # are also the only plans that depend on max_gap and chunks.
+            return _compile(index, shape, max_gap, chunks)
+
+        key = (tuple(shape), key)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                # Re-insert to mark as most recently used (Python 2.7's
+                # OrderedDict has no move_to_end).
+                self._plans[key] = self._plans.pop(key)
+                return plan
+
+        plan = _compile(index, shape)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+_plan_cache = _PlanCache()
+
+
+def compile_index(index, shape, max_gap=DEFAULT_MAX_GAP, chunks=None):
+    """
+    Compile an array-style index into a hyperslab read plan.
+
+    Parameters
+    ----------
+    index : int, slice, Ellipsis, None, array, or tuple thereof
+        indexing expression, with the same semantics as for numpy.  At most
+        one integer array or 1D boolean mask is allowed.
+    shape : tuple
+        shape of the field being indexed
+    max_gap : int
+        largest number of unwanted elements read along an array-indexed
+        dimension in order to save a hyperslab read
+    chunks : tuple or callable, optional
+        chunk (tile) shape of the field, or a function returning it that is
+        only called if the index contains an integer array or boolean mask,
+        the only plans the chunk shape matters to.  Nearby indices of an
+        array-indexed dimension that share a chunk are read together.
+
+    Returns
+    -------
+    plan : IndexPlan
+        possibly shared with previous calls using the same index and shape
+
+    Raises
+    ------
+    IndexError
+        If the index is not valid for the shape.
+    """
+    return _plan_cache.get(index, shape, max_gap, chunks)
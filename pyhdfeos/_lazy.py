@@ -0,0 +1,76 @@
+"""
+Mappings whose values are only built when first accessed.
+"""
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2.7
+    from collections import MutableMapping
+
+
+class LazyMapping(MutableMapping):
+    """
+    Ordered mapping that builds and memoizes its values on first access.
+
+    The keys are known up front (typically from a single inquiry call), but
+    building a value may require several more library calls, so that is put
+    off until the value is actually asked for.
+
+    Parameters
+    ----------
+    keys : sequence or callable
+        keys of the mapping in order, or a function returning them that is
+        only called when the keys are first needed
+    factory : callable
+        function of a key that builds the corresponding value
+    """
+    def __init__(self, keys, factory):
+        self._keys = keys if callable(keys) else list(keys)
+        self._factory = factory
+        self._values = {}
+
+    def _key_list(self):
+        if callable(self._keys):
+            self._keys = list(self._keys())
+        return self._keys
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key not in self._key_list():
+            raise KeyError(key)
+        value = self._values[key] = self._factory(key)
+        return value
+
+    def __setitem__(self, key, value):
+        keys = self._key_list()
+        if key not in keys:
+            keys.append(key)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        try:
+            self._key_list().remove(key)
+        except ValueError:
+            raise KeyError(key)
+        self._values.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._key_list()
+
+    def __iter__(self):
+        return iter(list(self._key_list()))
+
+    def __len__(self):
+        return len(self._key_list())
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, self._key_list())
+
+    def is_loaded(self, key):
+        """
+        Whether the value for a key has already been built.
+        """
+        return key in self._values
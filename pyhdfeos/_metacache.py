@@ -0,0 +1,169 @@
+"""
+On-disk cache of the metadata of grid files.
+
+The inventory of a file (grids, projections, fields and attributes) is kept
+in a JSON sidecar file, so that reopening the file in a new process does not
+have to ask the HDF libraries for any of it.
+"""
+import errno
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Bumped whenever the layout of the inventory changes, invalidating older
+# sidecar files.
+FORMAT_VERSION = 1
+
+# Bytes hashed at the start, middle and end of a file to detect changes that
+# do not affect its modification time or size.
+SAMPLE_BYTES = 64 * 1024
+
+
+def _content_hash(path, size):
+    """
+    Hash a sample of the contents of a file.
+    """
+    digest = hashlib.sha1()
+    offsets = sorted(set([0, max(0, size // 2 - SAMPLE_BYTES // 2),
+                          max(0, size - SAMPLE_BYTES)]))
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def _encode(value):
+    """
+    JSON representation of the numpy values found in an inventory.
+    """
+    if isinstance(value, (np.ndarray, np.generic)):
+        array = np.asarray(value)
+        if array.dtype.kind == 'S':
+            data = np.char.decode(array, 'latin-1').tolist()
+        else:
+            data = array.tolist()
+        return {'__ndarray__': data, 'dtype': array.dtype.str,
+                'scalar': isinstance(value, np.generic)}
+    if isinstance(value, bytes):
+        return {'__bytes__': value.decode('latin-1')}
+    msg = "Cannot store {0!r} in the metadata cache."
+    raise TypeError(msg.format(value))
+
+
+def _decode(obj):
+    """
+    Restore the numpy values of an inventory read from JSON.
+    """
+    if '__ndarray__' in obj:
+        dtype = np.dtype(obj['dtype'])
+        data = obj['__ndarray__']
+        if dtype.kind == 'S':
+            array = np.char.encode(np.array(data, dtype=np.str_),
+                                   'latin-1').astype(dtype)
+        else:
+            array = np.array(data, dtype=dtype)
+        return array[()] if obj['scalar'] else array
+    if '__bytes__' in obj:
+        return obj['__bytes__'].encode('latin-1')
+    return obj
+
+
+class MetadataCache(object):
+    """
+    Directory of sidecar files holding the inventories of grid files.
+
+    Each inventory is keyed on the absolute path, modification time and size
+    of the file, together with a hash of a sample of its contents, so a file
+    that has changed is never described by a stale inventory.
+
+    Parameters
+    ----------
+    directory : str
+        where the sidecar files are kept, created if necessary
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def path(self, filename):
+        """
+        Path of the sidecar file for the current state of a file.
+
+        Parameters
+        ----------
+        filename : str
+            HDF-EOS2 or HDF-EOS5 file
+
+        Returns
+        -------
+        path : str
+        """
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        key = "{0}\0{1!r}\0{2}\0{3}".format(path, st.st_mtime, st.st_size,
+                                            _content_hash(path, st.st_size))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        name = "{0}-{1}.json".format(os.path.basename(path), digest)
+        return os.path.join(self.directory, name)
+
+    def load(self, filename):
+        """
+        Return the cached inventory of a file.
+
+        Parameters
+        ----------
+        filename : str
+            HDF-EOS2 or HDF-EOS5 file
+
+        Returns
+        -------
+        inventory : dict or None
+            None if the file is not in the cache, or its sidecar file cannot
+            be read
+        """
+        try:
+            with open(self.path(filename), 'r') as f:
+                inventory = json.load(f, object_hook=_decode)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        if inventory.get('version') != FORMAT_VERSION:
+            return None
+        return inventory
+
+    def store(self, filename, inventory):
+        """
+        Write the inventory of a file to the cache.
+
+        The sidecar file is replaced atomically, so concurrent readers see
+        either the old or the new inventory.
+
+        Parameters
+        ----------
+        filename : str
+            HDF-EOS2 or HDF-EOS5 file
+        inventory : dict
+            as returned by GridFile._inventory
+        """
+        path = self.path(filename)
+        inventory = dict(inventory, version=FORMAT_VERSION)
+        fd, tmpname = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(inventory, f, default=_encode,
+                          separators=(',', ':'))
+            if sys.hexversion < 0x03030000:
+                os.rename(tmpname, path)
+            else:
+                os.replace(tmpname, path)
+        except Exception:
+            os.remove(tmpname)
+            raise
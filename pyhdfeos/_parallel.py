@@ -0,0 +1,206 @@
+"""
+Parallel reads of grid field hyperslabs in worker processes.
+
+HDF4 and HDF-EOS are not thread-safe, so reads are spread across processes
+instead.  Each worker keeps its own file and grid handles open between reads
+and writes its part of the hyperslab straight into a shared memory segment
+that becomes the result in the parent.
+"""
+import importlib
+import multiprocessing
+import os
+import weakref
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+from ._indexing import compile_index, split_hyperslab
+
+# Grids opened by a worker process, keyed on (backend, filename, gridname).
+_worker_grids = {}
+
+
+def _worker_grid(backend, filename, gridname):
+    """
+    Return a grid opened and attached by this worker, reusing it if possible.
+    """
+    key = (backend, filename, gridname)
+    grid = _worker_grids.get(key)
+    if grid is None:
+        from .grids import _Grid
+        grid = _Grid(filename, gridname, importlib.import_module(backend))
+        _worker_grids[key] = grid
+    return grid
+
+
+def _read_part(task):
+    """
+    Worker side of ReaderPool.read, fill one part of the shared buffer.
+    """
+    (backend, filename, gridname, fieldname, shm_name, shape, dtype, axis,
+     start, stride, edge, offset) = task
+    field = _worker_grid(backend, filename, gridname).fields[fieldname]
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buffer = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        dest = [slice(None, None, None)] * len(shape)
+        dest[axis] = slice(offset, offset + edge[axis])
+        field._read_hyperslab(start, stride, edge, buffer[tuple(dest)])
+        del buffer
+    finally:
+        shm.close()
+
+
+def _segment_array(shm, shape, dtype):
+    """
+    Array on top of a shared memory segment that keeps the segment open.
+
+    The array is built directly on the segment's buffer, so numpy makes every
+    view derived from it refer back to it.  The segment is closed once the
+    array and all of its views are gone.
+    """
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    finalizer = weakref.finalize(array, shm.close)
+    # Still-exported buffers cannot be closed at interpreter exit.
+    finalizer.atexit = False
+    return array
+
+
+class ReaderPool(object):
+    """
+    Pool of worker processes that read large hyperslabs of grid fields.
+
+    A read is split along its outermost dimension (on tile boundaries where
+    possible) and the parts are read concurrently.  Workers open each grid
+    once and keep it attached for subsequent reads, so a pool should be
+    reused across reads rather than created for each one.
+
+    Parameters
+    ----------
+    processes : int, optional
+        number of worker processes, defaults to the number of CPUs
+
+    Raises
+    ------
+    RuntimeError
+        If shared memory is not available (Python < 3.8).
+    """
+    def __init__(self, processes=None):
+        if shared_memory is None:
+            msg = "Parallel reads require multiprocessing.shared_memory "
+            msg += "(Python 3.8 or later)."
+            raise RuntimeError(msg)
+        self.processes = processes or os.cpu_count() or 1
+        context = multiprocessing.get_context('spawn')
+        self._pool = context.Pool(self.processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the worker processes, closing their files.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def read(self, field, index=Ellipsis):
+        """
+        Read field data using the worker processes.
+
+        Parameters
+        ----------
+        field : _GridVariable
+            field to read from
+        index : int, slice, Ellipsis, None, array, or tuple
+            same as for array-style indexing.  Integer array and boolean
+            indices are read in this process.
+
+        Returns
+        -------
+        data : ndarray
+            result, backed by the shared memory the workers wrote into
+
+        Raises
+        ------
+        RuntimeError
+            If the pool has been closed or the file of the field is unknown.
+        """
+        return self.read_fields([field], index)[0]
+
+    def read_fields(self, fields, index=Ellipsis):
+        """
+        Read the same window of several fields using the worker processes.
+
+        The parts of all fields are read concurrently.
+
+        Parameters
+        ----------
+        fields : list of _GridVariable
+            fields of the same shape
+        index : int, slice, Ellipsis, None, array, or tuple
+            same as for array-style indexing
+
+        Returns
+        -------
+        data : list of ndarray
+            one result per field, backed by shared memory
+
+        Raises
+        ------
+        RuntimeError
+            If the pool has been closed or the file of a field is unknown.
+        """
+        if self._pool is None:
+            raise RuntimeError("The reader pool has been closed.")
+        for field in fields:
+            if field.filename is None:
+                msg = "Field {0} is not associated with a file."
+                raise RuntimeError(msg.format(field.fieldname))
+        if not fields:
+            return []
+
+        first = fields[0]
+        plan = compile_index(index, first.shape, first.max_gap,
+                             lambda: first.chunks)
+        if plan.axis is not None or plan.size == 0:
+            return [field._read_plan(plan) for field in fields]
+
+        segments = []
+        tasks = []
+        try:
+            for field in fields:
+                axis, parts = split_hyperslab(plan.start, plan.stride,
+                                              plan.edge, self.processes,
+                                              field.chunks)
+                nbytes = plan.size * field.dtype.itemsize
+                shm = shared_memory.SharedMemory(create=True, size=nbytes)
+                segments.append(shm)
+                common = (field._he.__name__,
+                          os.path.abspath(field.filename), field.gridname,
+                          field.fieldname, shm.name, plan.edge,
+                          field.dtype.str, axis)
+                tasks.extend(common + part for part in parts)
+            self._pool.map(_read_part, tasks, chunksize=1)
+        except Exception:
+            for shm in segments:
+                shm.close()
+            raise
+        finally:
+            for shm in segments:
+                shm.unlink()
+
+        buffers = [_segment_array(shm, plan.edge, field.dtype)
+                   for field, shm in zip(fields, segments)]
+        return [plan.finish(buffer) for buffer in buffers]
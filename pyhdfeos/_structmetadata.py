@@ -0,0 +1,350 @@
+"""
+Grid structure from the StructMetadata ODL text of a file.
+
+Everything _Grid asks the library for one call at a time (dimensions, corner
+points, projection, origin, pixel registration, fields and their dimension
+lists) is written once in the StructMetadata attribute.  Reading and parsing
+that attribute describes every grid of a file in a single library call.
+"""
+import collections
+import re
+
+import numpy as np
+
+from . import lib
+
+_TOKEN = re.compile(r'\s*(?:"(?P<string>[^"]*)"|(?P<punct>[=(),])'
+                    r'|(?P<word>[^\s=(),"]+))')
+
+# GCTP projection codes by name, without any GCTP_ or HE5_GCTP_ prefix.
+PROJECTIONS = {'GEO': 0, 'UTM': 1, 'SPCS': 2, 'ALBERS': 3, 'LAMCC': 4,
+               'MERCAT': 5, 'PS': 6, 'POLYC': 7, 'EQUIDC': 8, 'TM': 9,
+               'STEREO': 10, 'LAMAZ': 11, 'AZMEQD': 12, 'GNOMON': 13,
+               'ORTHO': 14, 'GVNSP': 15, 'SNSOID': 16, 'EQRECT': 17,
+               'MILLER': 18, 'VGRINT': 19, 'HOM': 20, 'ROBIN': 21, 'SOM': 22,
+               'ALASKA': 23, 'GOOD': 24, 'MOLL': 25, 'IMOLL': 26,
+               'HAMMER': 27, 'WAGIV': 28, 'WAGVII': 29, 'OBLEQA': 30,
+               'ISINUS1': 31, 'CEA': 97, 'BCEA': 98, 'ISINUS': 99}
+
+ORIGINS = {'HDFE_GD_UL': 0, 'HDFE_GD_UR': 1, 'HDFE_GD_LL': 2,
+           'HDFE_GD_LR': 3}
+
+PIXREGS = {'HDFE_CENTER': 0, 'HDFE_CORNER': 1}
+
+# Number types as reported by GDfieldinfo, by the name written for them.
+# H5T_NATIVE_LONG and H5T_NATIVE_ULONG are left out as the width of a C long
+# varies between platforms, so such fields are described by GDfieldinfo.
+NUMBER_TYPES = {'DFNT_UCHAR8': 3, 'DFNT_CHAR8': 4, 'DFNT_FLOAT32': 5,
+                'DFNT_FLOAT64': 6, 'DFNT_INT8': 20, 'DFNT_UINT8': 21,
+                'DFNT_INT16': 22, 'DFNT_UINT16': 23, 'DFNT_INT32': 24,
+                'DFNT_UINT32': 25,
+                'H5T_NATIVE_INT': 0, 'H5T_NATIVE_UINT': 1,
+                'H5T_NATIVE_SHORT': 2, 'H5T_NATIVE_USHORT': 3,
+                'H5T_NATIVE_SCHAR': 4, 'H5T_NATIVE_UCHAR': 5,
+                'H5T_NATIVE_LLONG': 8, 'H5T_NATIVE_ULLONG': 9,
+                'H5T_NATIVE_FLOAT': 10, 'H5T_NATIVE_DOUBLE': 11}
+
+
+def _strip(name, *prefixes):
+    """
+    Remove the HDF-EOS5 prefix and any of the given prefixes from a name.
+    """
+    if name.startswith('HE5_'):
+        name = name[4:]
+    for prefix in prefixes:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+def _tokens(text):
+    pos = 0
+    text = text.rstrip('\0 \t\r\n')
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            msg = "Cannot parse StructMetadata at {0!r}."
+            raise ValueError(msg.format(text[pos:pos + 20]))
+        pos = m.end()
+        if m.group('string') is not None:
+            yield 'string', m.group('string')
+        elif m.group('punct') is not None:
+            yield m.group('punct'), m.group('punct')
+        elif m.group('word') is not None:
+            yield 'word', m.group('word')
+
+
+def _scalar(word):
+    """
+    Convert a bare word into a number if it is one.
+    """
+    for convert in (int, float):
+        try:
+            return convert(word)
+        except ValueError:
+            pass
+    return word
+
+
+def parse(text):
+    """
+    Parse ODL text into nested mappings.
+
+    GROUP and OBJECT blocks become OrderedDicts keyed by their name,
+    parenthesized lists become tuples, quoted strings lose their quotes and
+    numbers are converted.
+
+    Parameters
+    ----------
+    text : str
+        ODL text, as found in the StructMetadata attribute
+
+    Returns
+    -------
+    tree : OrderedDict
+
+    Raises
+    ------
+    ValueError
+        If the text is not valid ODL.
+    """
+    tokens = list(_tokens(text))
+    tree = collections.OrderedDict()
+    stack = [tree]
+    pos = 0
+
+    def value(pos):
+        kind, token = tokens[pos]
+        if kind == 'string':
+            return token, pos + 1
+        if kind == 'word':
+            return _scalar(token), pos + 1
+        if kind != '(':
+            msg = "Unexpected {0!r} in StructMetadata."
+            raise ValueError(msg.format(token))
+        items = []
+        pos += 1
+        while True:
+            item, pos = value(pos)
+            items.append(item)
+            kind, token = tokens[pos]
+            pos += 1
+            if kind == ')':
+                return tuple(items), pos
+            if kind != ',':
+                msg = "Expected ',' or ')' in StructMetadata, not {0!r}."
+                raise ValueError(msg.format(token))
+
+    try:
+        while pos < len(tokens):
+            kind, key = tokens[pos]
+            if kind == 'word' and key == 'END':
+                break
+            if kind != 'word' or tokens[pos + 1][0] != '=':
+                msg = "Expected an assignment in StructMetadata, not {0!r}."
+                raise ValueError(msg.format(key))
+            item, pos = value(pos + 2)
+            if key in ('GROUP', 'OBJECT'):
+                block = collections.OrderedDict()
+                stack[-1][item] = block
+                stack.append(block)
+            elif key in ('END_GROUP', 'END_OBJECT'):
+                if len(stack) == 1:
+                    msg = "Unbalanced {0}={1} in StructMetadata."
+                    raise ValueError(msg.format(key, item))
+                stack.pop()
+            else:
+                stack[-1][key] = item
+    except IndexError:
+        raise ValueError("StructMetadata ends unexpectedly.")
+    if len(stack) > 1:
+        raise ValueError("StructMetadata ends inside a group.")
+    return tree
+
+
+def _as_tuple(value):
+    return value if isinstance(value, tuple) else (value,)
+
+
+def _field_entry(obj, dims, he_module):
+    """
+    Describe a data field, leaving out what the metadata cannot tell.
+    """
+    name = obj['DataFieldName']
+    dimlist = list(_as_tuple(obj['DimList']))
+    ntype = NUMBER_TYPES.get(obj['DataType'].replace('HE5T_', 'H5T_'))
+
+    # Fields with unlimited dimensions may have grown beyond their nominal
+    # size, so their shape has to come from the library.  Whatever their
+    # name, unlimited dimensions have a size of -1 in HDF-EOS5 and 0 (the
+    # SD interface's SD_UNLIMITED) in HDF-EOS2.
+    shape = None
+    maxdimlist = list(_as_tuple(obj.get('MaxdimList', ())))
+    if not any(dims.get(dim) is None or int(dims[dim]) <= 0
+               for dim in dimlist + maxdimlist):
+        shape = tuple(int(dims[dim]) for dim in dimlist)
+
+    entry = {'name': name, 'shape': shape, 'ntype': ntype,
+             'dimlist': dimlist}
+
+    if 'TilingDimensions' in obj:
+        entry['chunks'] = tuple(int(x)
+                                for x in _as_tuple(obj['TilingDimensions']))
+    else:
+        entry['chunks'] = ()
+
+    # Only the parameters of deflate compression are written out in a form
+    # that matches GDcompinfo.
+    method = _strip(obj.get('CompressionType', 'HDFE_COMP_NONE'),
+                    'HDFE_COMP_')
+    codes = dict((v, k) for k, v in he_module.compression_dict.items())
+    if method == 'NONE':
+        entry['compinfo'] = (0, (0, 0, 0, 0, 0))
+    elif method == 'DEFLATE' and 'DeflateLevel' in obj:
+        entry['compinfo'] = (codes['deflate'],
+                             (int(obj['DeflateLevel']), 0, 0, 0, 0))
+    return entry
+
+
+def grid_inventory(group, he_module):
+    """
+    Describe a grid from its GRID_n group of the StructMetadata.
+
+    Parameters
+    ----------
+    group : OrderedDict
+        parsed GRID_n group
+    he_module : module
+        backend of the file, for the compression codes
+
+    Returns
+    -------
+    inventory : dict
+        as used by _Grid.  Field entries carry no attributes, and their
+        shape and number type are None where the metadata cannot tell them.
+
+    Raises
+    ------
+    KeyError, ValueError
+        If the group is missing or has unexpected entries.
+    """
+    inventory = collections.OrderedDict()
+    inventory['name'] = group['GridName']
+
+    dims = []
+    for obj in group.get('Dimension', {}).values():
+        dims.append((obj['DimensionName'], obj['Size']))
+    inventory['dims'] = dims
+
+    inventory['xdimsize'] = int(group['XDim'])
+    inventory['ydimsize'] = int(group['YDim'])
+    inventory['upleft'] = np.array(group['UpperLeftPointMtrs'],
+                                   dtype=np.float64)
+    inventory['lowright'] = np.array(group['LowerRightMtrs'],
+                                     dtype=np.float64)
+    for key in ('upleft', 'lowright'):
+        if inventory[key].shape != (2,):
+            raise ValueError("Grid corners are not points.")
+
+    projcode = PROJECTIONS[_strip(group['Projection'], 'GCTP_')]
+    inventory['projcode'] = projcode
+    inventory['zonecode'] = int(group.get('ZoneCode', 0))
+    inventory['spherecode'] = int(group.get('SphereCode', 0))
+    projparms = np.zeros(13, dtype=np.float64)
+    if 'ProjParams' in group:
+        values = _as_tuple(group['ProjParams'])
+        projparms[:len(values)] = values
+    inventory['projparms'] = projparms
+
+    inventory['origincode'] = ORIGINS[_strip(group.get('GridOrigin',
+                                                       'HDFE_GD_UL'))]
+    inventory['pixregcode'] = PIXREGS[_strip(group.get('PixelRegistration',
+                                                       'HDFE_CENTER'))]
+
+    # The SOM block offsets are kept elsewhere.
+    inventory['offsets'] = None
+
+    sizes = dict(dims)
+    sizes['XDim'] = inventory['xdimsize']
+    sizes['YDim'] = inventory['ydimsize']
+    fields = [_field_entry(obj, sizes, he_module)
+              for obj in group.get('DataField', {}).values()]
+    inventory['fieldnames'] = [entry['name'] for entry in fields]
+    inventory['fields'] = fields
+    return inventory
+
+
+def inventories(text, he_module):
+    """
+    Describe every grid of a file from its StructMetadata.
+
+    Parameters
+    ----------
+    text : str
+        StructMetadata ODL text
+    he_module : module
+        backend of the file
+
+    Returns
+    -------
+    grids : OrderedDict
+        inventory of each grid keyed by grid name, or None for grids whose
+        metadata could not be understood
+
+    Raises
+    ------
+    ValueError
+        If the text cannot be parsed at all.
+    """
+    tree = parse(text)
+    grids = collections.OrderedDict()
+    for key, group in tree.get('GridStructure', {}).items():
+        try:
+            inventory = grid_inventory(group, he_module)
+        except (KeyError, ValueError, TypeError):
+            if 'GridName' not in group:
+                msg = "Grid group {0} has no GridName."
+                raise ValueError(msg.format(key))
+            inventory = None
+        grids[group['GridName']] = inventory
+    return grids
+
+
+def read(he_module, gdfid):
+    """
+    Read the StructMetadata text of an open file.
+
+    Parameters
+    ----------
+    he_module : module
+        backend the file was opened with
+    gdfid : int
+        grid file identifier
+
+    Returns
+    -------
+    text : str
+        concatenation of the StructMetadata.0, StructMetadata.1, ...
+        attributes
+
+    Raises
+    ------
+    IOError
+        If there is no StructMetadata.
+    """
+    if hasattr(he_module, 'ehreadstructmetadata'):
+        return he_module.ehreadstructmetadata(gdfid)
+
+    # HDF-EOS2 keeps it in global SD attributes.
+    _, sd_id = lib.he4.ehidinfo(gdfid)
+    parts = []
+    while True:
+        name = "StructMetadata.{0}".format(len(parts))
+        try:
+            idx = lib.hdf.sdfindattr(sd_id, name)
+        except IOError:
+            if not parts:
+                raise
+            break
+        parts.append(lib.hdf.sdreadattr(sd_id, idx))
+    return ''.join(parts)
@@ -8,7 +8,9 @@ def dump_metadata():
     description = 'Print HDF-EOS grid metadata.'
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('filename')
+    parser.add_argument('--cache-dir',
+                        help='directory of the metadata cache')
 
     args = parser.parse_args()
-    gdf = GridFile(args.filename)
+    gdf = GridFile(args.filename, cache_dir=args.cache_dir)
     print(gdf)
@@ -3,41 +3,116 @@ Support for HDF-EOS and HDF-EOS5 grid files
 """
 
 import collections
+import functools
+import importlib
 import os
 import sys
 import textwrap
+import threading
+import weakref
 
 if sys.hexversion < 0x03000000:
     from itertools import ifilterfalse as filterfalse
+    import Queue as queue
 else:
     from itertools import filterfalse
+    import queue
 
 import numpy as np
 
-from .lib import he4, he5, hdf
-from . import _som
+from . import lib
+from .lib._util import output_buffer
+from . import _gctp, _som, _structmetadata
+from ._buffers import BufferPool
+from ._indexing import (compile_index, block_shape_for, block_windows,
+                        DEFAULT_MAX_GAP)
+from ._parallel import ReaderPool
+from ._decode import decode as _decode, decode_params
+from ._lazy import LazyMapping
+from ._handles import FileHandle, handle_pool, sniff_format
+from ._coordcache import coordinate_cache, grid_key
+from ._coordstore import CoordinateStore
+from ._metacache import MetadataCache
+
+# Buffers backing array-style reads of grid fields.
+_buffer_pool = BufferPool()
+
+# Neither HDF4 nor HDF-EOS is thread-safe.  Field reads that may run on a
+# background thread hold this lock for the duration of each library call.
+# Nothing else takes it, so no other library calls may be made while such a
+# thread is running (see _GridVariable.iter_blocks).
+_library_lock = threading.RLock()
+
+
+# Everything the read path needs to know about a field, queried once per grid.
+_FieldDescriptor = collections.namedtuple('_FieldDescriptor',
+                                          ['name', 'cname', 'shape', 'ntype',
+                                           'dtype', 'dimlist'])
 
 
 class _GridVariable(object):
     """
     Grid field object (data, dimensions, attributes)
     """
-    def __init__(self, gridid, fieldname, he_module):
-        self.gridid = gridid
-        self.fieldname = fieldname
+    def __init__(self, gridid, descriptor, he_module, filename=None,
+                 gridname=None, attrs=None):
+        # The grid identifier, or a function returning it that is only
+        # called once the field is read.
+        self._gridid = gridid
+        self._descriptor = descriptor
+        self.fieldname = descriptor.name
         self._he = he_module
 
-        x = self._he.gdfieldinfo(self.gridid, fieldname)
-        self.shape, self.ntype, self.dimlist = x[0:3]
+        # Where the field lives, so that it can be reopened elsewhere.
+        self.filename = filename
+        self.gridname = gridname
 
-        # HDFEOS5 only.
-        self.attrs = collections.OrderedDict()
-        if hasattr(self._he, 'gdinqlocattrs'):
-            attr_names = self._he.gdinqlocattrs(self.gridid, self.fieldname)
-            for attrname in attr_names:
-                self.attrs[attrname] = self._he.gdreadlocattr(self.gridid,
-                                                              self.fieldname,
-                                                              attrname)
+        self.shape = descriptor.shape
+        self.ntype = descriptor.ntype
+        self.dtype = descriptor.dtype
+        self.dimlist = descriptor.dimlist
+
+        # Largest number of unwanted elements read between two indices of an
+        # integer array or boolean index in order to save a library call.
+        self.max_gap = DEFAULT_MAX_GAP
+
+        # Tiling and compression are only queried when first asked for.
+        self._tiledims = None
+        self._compinfo = None
+
+        # Attributes are a mapping, or a function returning one that is only
+        # called on first access.
+        if attrs is None:
+            if hasattr(self._he, 'gdinqlocattrs'):
+                # HDFEOS5 only.
+                he, fieldname = self._he, self.fieldname
+                field = weakref.proxy(self)
+                attrs = LazyMapping(
+                    lambda: he.gdinqlocattrs(field.gridid, fieldname),
+                    lambda name: he.gdreadlocattr(field.gridid, fieldname,
+                                                  name))
+            else:
+                attrs = collections.OrderedDict()
+        self._attrs = attrs
+
+    @property
+    def gridid(self):
+        if callable(self._gridid):
+            self._gridid = self._gridid()
+        return self._gridid
+
+    @property
+    def attrs(self):
+        """
+        Field attributes, read when first accessed.
+        """
+        if callable(self._attrs):
+            self._attrs = self._attrs()
+        return self._attrs
+
+    @attrs.setter
+    def attrs(self, value):
+        self._attrs = value
 
     def __str__(self):
         dimstr = ", ".join(self.dimlist)
@@ -47,96 +122,395 @@ class _GridVariable(object):
             lst.append("    {0}:  {1}".format(name, value))
         return '\n'.join(lst)
 
-    def __getitem__(self, index):
-        ndims = len(self.shape)
+    @property
+    def chunks(self):
+        """
+        Tile (chunk) shape of the field, or None if the field is not tiled.
+        """
+        if self._tiledims is None:
+            _, self._tiledims = self._he.gdtileinfo(self.gridid,
+                                                    self.fieldname)
+        return self._tiledims if self._tiledims else None
 
-        # Set up defaults.
-        start = np.zeros(ndims)
-        stride = np.ones(ndims)
-        edge = list(self.shape)
+    @property
+    def compression(self):
+        """
+        Name of the compression method, or None if uncompressed.
+        """
+        code = self._get_compinfo()[0]
+        return self._he.compression_dict.get(code, code)
 
-        if isinstance(index, int):
-            # Retrieve a row.
-            start[0] = index
-            stride[0] = 1
-            edge[0] = 1
-            for j in range(1, ndims):
-                start[j] = 0
-                stride[j] = 1
-                edge[j] = self.shape[j]
-            data = self._he.gdreadfield(self.gridid, self.fieldname,
-                                        start, stride, edge)
-
-            # Reduce dimensionality in the row dimension.
-            data = np.squeeze(data, axis=0)
+    @property
+    def compression_opts(self):
+        """
+        Compression parameters, as reported by the library.
+        """
+        return self._get_compinfo()[1]
+
+    def _get_compinfo(self):
+        if self._compinfo is None:
+            self._compinfo = self._he.gdcompinfo(self.gridid, self.fieldname)
+        return self._compinfo
+
+    def __getitem__(self, index):
+        plan = compile_index(index, self.shape, self.max_gap,
+                             lambda: self.chunks)
+        return self._read_plan(plan)
+
+    def read(self, index=Ellipsis, parallel=None, decode=False,
+             dtype=np.float32, masked=False, convention=None):
+        """
+        Read field data, optionally in parallel and decoded.
+
+        Parameters
+        ----------
+        index : int, slice, Ellipsis, None, array, or tuple
+            same as for array-style indexing
+        parallel : int or ReaderPool, optional
+            number of worker processes to read with, or an existing pool of
+            them.  A pool created for a single read is shut down afterwards,
+            so pass a ReaderPool when reading repeatedly.
+        decode : bool
+            if true, mask fill values and apply the scale_factor and
+            add_offset attributes of the field in a single pass
+        dtype : numpy dtype
+            floating point datatype of decoded data
+        masked : bool
+            return decoded data as a masked array rather than with fill
+            values replaced by NaN
+        convention : {'hdf4', 'cf'}, optional
+            how scale_factor and add_offset are applied to decoded data, see
+            pyhdfeos._decode.  Defaults to 'hdf4' for HDF-EOS2 files and to
+            'cf' for HDF-EOS5 files.
+
+        Returns
+        -------
+        data : ndarray or MaskedArray
+        """
+        if parallel is None:
+            data = self[index]
+        elif isinstance(parallel, ReaderPool):
+            data = parallel.read(self, index)
+        else:
+            with ReaderPool(parallel) as pool:
+                data = pool.read(self, index)
+        if not decode:
             return data
 
-        if index is Ellipsis:
-            # Case of [...]
-            # Handle it below.
-            return self.__getitem__(slice(None, None, None))
+        if convention is None:
+            # Tell the backend apart without importing the other one.
+            if hasattr(self._he, 'gdinqlocattrs'):
+                convention = 'cf'
+            else:
+                convention = 'hdf4'
+        fill, scale, offset = decode_params(self.attrs)
+        return _decode(data, fill, scale, offset, convention=convention,
+                       dtype=dtype, masked=masked)
 
-        if isinstance(index, slice):
-            if (((index.start is None) and
-                 (index.stop is None) and
-                 (index.step is None))):
-                # Case of [:].  Read all of the data.
-                return self._he.gdreadfield(self.gridid, self.fieldname,
-                                            start, stride, edge)
+    def read_into(self, out, index=Ellipsis):
+        """
+        Read field data directly into a caller-supplied buffer.
+
+        Parameters
+        ----------
+        out : ndarray or memoryview
+            writable, C-contiguous buffer with the datatype of the field and
+            the shape of the data selected by index
+        index : int, slice, Ellipsis, None, array, or tuple
+            same as for array-style indexing
+
+        Returns
+        -------
+        out : ndarray or memoryview
+            the same object that was passed in, now filled with data
+
+        Raises
+        ------
+        ValueError
+            If the output buffer is not compatible with the requested data.
+        """
+        plan = compile_index(index, self.shape, self.max_gap,
+                             lambda: self.chunks)
+        buffer = output_buffer(out, plan.shape, self.dtype)
+        self._fill(plan, buffer)
+        return out
 
-            msg = "Single slice argument integer is only legal if ':'"
-            raise RuntimeError(msg)
+    def _fill(self, plan, buffer):
+        """
+        Execute a compiled read plan into a validated output array.
+        """
+        if plan.reshape_only:
+            self._read_hyperslab(plan.start, plan.stride, plan.edge,
+                                 buffer.reshape(plan.edge))
+        else:
+            # Reversed dimensions and array indices cannot be read in place.
+            # Array dimensions that numpy moves to the front are written
+            # through a view of the buffer in the layout of the plan.
+            np.copyto(plan.layout_view(buffer),
+                      self._read_plan(plan, move=False))
 
-        if isinstance(index, tuple) and any(x is Ellipsis for x in index):
-            # Remove the first ellipsis we find.
-            newindex = []
-            first_ellipsis = True
-            for j, idx in enumerate(index):
-                if idx is Ellipsis and first_ellipsis:
-                    newindex.append(slice(0, self.shape[j]))
-                    first_ellipsis = False
-                else:
-                    newindex.append(idx)
+    def iter_blocks(self, block_shape=None, order='C', readahead=0):
+        """
+        Iterate over the field one block at a time.
+
+        Parameters
+        ----------
+        block_shape : tuple, optional
+            shape of the blocks, None entries span the whole dimension.  For
+            tiled fields each dimension is rounded up to a multiple of the
+            tile size so that no tile is decompressed more than once.  By
+            default the native tiles are used, or blocks of whole rows of
+            about 4 MiB if the field is not tiled.
+        order : {'C', 'F'}
+            whether the last ('C') or the first ('F') dimension varies
+            fastest from one block to the next
+        readahead : int
+            number of blocks to read ahead on a background thread while the
+            caller works on the current block.  HDF4 and HDF-EOS are not
+            thread-safe, and only the block reads of that thread are
+            serialized, so the caller must not use pyhdfeos for anything
+            else (other fields, attributes, coordinates, other files) until
+            the iterator is exhausted or closed.
+
+        Yields
+        ------
+        window : tuple of slice
+            location of the block within the field
+        block : ndarray
+            data of the block.  Its memory is reused for subsequent blocks,
+            so it is only valid until the next block is requested.  Copy it
+            to keep it.
+
+        Raises
+        ------
+        ValueError
+            If the block shape or order is not valid for the field.
+        """
+        block_shape = block_shape_for(self.shape, self.dtype.itemsize,
+                                      block_shape, self.chunks)
+        windows = block_windows(self.shape, block_shape, order)
+        size = int(np.prod(block_shape))
+
+        if readahead <= 0:
+            flat = np.empty(size, dtype=self.dtype)
+            for window in windows:
+                yield window, self._read_window(window, flat)
+            return
+
+        # The background thread fills free buffers and hands them over in
+        # order.  The buffer of a yielded block is returned once the caller
+        # asks for the next one.
+        free = queue.Queue()
+        for _ in range(readahead + 1):
+            free.put(np.empty(size, dtype=self.dtype))
+        ready = queue.Queue()
+        stop = threading.Event()
+
+        # Attach the grid now, so that the reads are the only library calls
+        # made by the background thread.
+        with _library_lock:
+            self.gridid
+
+        thread = threading.Thread(target=self._prefetch_blocks,
+                                  args=(windows, free, ready, stop))
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                window, flat = item
+                yield window, self._window_view(window, flat)
+                free.put(flat)
+        finally:
+            stop.set()
+            free.put(None)
+            thread.join()
+
+    def _prefetch_blocks(self, windows, free, ready, stop):
+        """
+        Background half of iter_blocks with read-ahead.
+        """
+        try:
+            for window in windows:
+                flat = free.get()
+                if flat is None or stop.is_set():
+                    return
+                self._read_window(window, flat)
+                ready.put((window, flat))
+        except Exception as e:
+            ready.put(e)
+            return
+        ready.put(None)
+
+    def _read_window(self, window, flat):
+        """
+        Read a window of the field into the start of a flat buffer.
+        """
+        start = tuple(w.start for w in window)
+        edge = tuple(w.stop - w.start for w in window)
+        block = self._window_view(window, flat)
+        self._read_hyperslab(start, (1,) * len(edge), edge, block)
+        return block
 
-            # Run once again because it is possible that there's another
-            # Ellipsis object.
-            newindex = tuple(newindex)
-            return self.__getitem__(newindex)
+    def _window_view(self, window, flat):
+        edge = tuple(w.stop - w.start for w in window)
+        return flat[:int(np.prod(edge))].reshape(edge)
 
-        if isinstance(index, tuple) and any(isinstance(x, int) for x in index):
-            # Find the first such integer argument, replace it with a slice.
-            lst = list(index)
-            predicate = lambda x: not isinstance(x[1], int)
-            g = filterfalse(predicate, enumerate(index))
-            idx = next(g)[0]
-            lst[idx] = slice(index[idx], index[idx] + 1)
-            newindex = tuple(lst)
+    def to_dask(self, chunks='auto'):
+        """
+        Return a lazy dask array view of the field.
+
+        Each chunk task reopens the file by name, so the task graph can be
+        shipped to process-based and distributed schedulers.
+
+        Parameters
+        ----------
+        chunks : str, int, or tuple
+            any chunk specification understood by dask.  With 'auto', chunk
+            sizes are multiples of the native tiles of the field.
+
+        Returns
+        -------
+        array : dask.array.Array
+
+        Raises
+        ------
+        ImportError
+            If dask is not installed.
+        RuntimeError
+            If the file the field belongs to is not known.
+        """
+        try:
+            import dask.array as da
+            from dask.base import tokenize
+        except ImportError:
+            raise ImportError("to_dask requires dask to be installed.")
+
+        if self.filename is None:
+            msg = "Field {0} is not associated with a file."
+            raise RuntimeError(msg.format(self.fieldname))
+
+        source = _FieldSource(os.path.abspath(self.filename), self.gridname,
+                              self.fieldname, self._he.__name__, self.shape,
+                              self.dtype)
+        chunks = da.core.normalize_chunks(chunks, self.shape,
+                                          dtype=self.dtype,
+                                          previous_chunks=self.chunks)
+        name = 'pyhdfeos-' + tokenize(source.filename,
+                                      os.path.getmtime(source.filename),
+                                      self.gridname, self.fieldname, chunks)
+        meta = np.empty((0,) * len(self.shape), dtype=self.dtype)
+        return da.from_array(source, chunks=chunks, name=name, lock=True,
+                             fancy=False, meta=meta)
+
+    def _read_plan(self, plan, move=True):
+        """
+        Execute a compiled read plan and return the final result, or the
+        result in the layout of the plan if move is false.
+        """
+        buffer = _buffer_pool.get(plan.edge, self.dtype)
+        if plan.axis is None:
+            self._read_hyperslab(plan.start, plan.stride, plan.edge, buffer)
+            return plan.finish(buffer, move)
+
+        # Integer array or boolean index.  Each segment fills a run of the
+        # buffer along the indexed dimension.  That run is contiguous when
+        # all preceding dimensions are singletons.
+        contiguous = all(n == 1 for n in plan.edge[:plan.axis])
+        for start, stride, edge, segment in plan.hyperslabs():
+            if segment.picks is None:
+                count = segment.count
+            else:
+                count = len(segment.picks)
+            dest = [slice(None, None, None)] * len(edge)
+            dest[plan.axis] = slice(segment.dest, segment.dest + count)
+            dest = tuple(dest)
 
-            # Invoke array-based slicing again, as there may be additional
-            # integer argument remaining.
-            data = self.__getitem__(newindex)
+            if segment.picks is None and contiguous:
+                self._read_hyperslab(start, stride, edge, buffer[dest])
+                continue
 
-            # Reduce dimensionality in the scalar dimension.
-            data = np.squeeze(data, axis=idx)
-            return data
+            scratch = _buffer_pool.get(edge, self.dtype)
+            self._read_hyperslab(start, stride, edge, scratch)
+            if segment.picks is not None:
+                scratch = np.take(scratch, segment.picks, axis=plan.axis)
+            buffer[dest] = scratch
 
-        # Assuming pargs is a tuple of slices from now on.
-        # This is the workhorse section for the general case.
-        for j in range(len(index)):
+        return plan.finish(buffer, move)
 
-            if index[j].start is not None:
-                start[j] = index[j].start
+    def _read_hyperslab(self, start, stride, edge, buffer):
+        """
+        Read a single hyperslab into an edge-shaped buffer.
+        """
+        if buffer.size == 0:
+            return buffer
+        with _library_lock:
+            return self._he.gdreadfield(self.gridid, self._descriptor.cname,
+                                        start, stride, edge, out=buffer,
+                                        ntype=self.ntype)
 
-            if index[j].step is not None:
-                stride[j] = index[j].step
 
-            if index[j].stop is None:
-                edge[j] = np.floor((self.shape[j] - start[j]) / stride[j])
-            else:
-                edge[j] = np.floor((index[j].stop - start[j]) / stride[j])
+def _coords_out(out, shapes):
+    """
+    Validate caller-supplied latitude and longitude output arrays.
+    """
+    if len(out) != 2:
+        msg = "Expected latitude and longitude output arrays, got {0}."
+        raise ValueError(msg.format(len(out)))
+    buffers = []
+    for k, buffer in enumerate(out):
+        if not isinstance(buffer, np.ndarray):
+            raise ValueError("Output arrays must be ndarrays.")
+        if buffer.dtype.kind != 'f':
+            msg = "Output array has datatype {0}, but coordinates are "
+            msg += "floating point."
+            raise ValueError(msg.format(buffer.dtype))
+        if not buffer.flags.writeable:
+            raise ValueError("Output array must be writable.")
+        if shapes is not None and buffer.shape != shapes[k]:
+            msg = "Output array has shape {0}, but {1} is required."
+            raise ValueError(msg.format(buffer.shape, shapes[k]))
+        buffers.append(buffer)
+    return buffers
+
+
+class _FieldSource(object):
+    """
+    Picklable stand-in for a field that reattaches its grid on every read.
 
-        return self._he.gdreadfield(self.gridid, self.fieldname,
-                                    start, stride, edge)
+    The file itself is taken from the handle pool, so it is only opened
+    again if it has been evicted in the meantime.
+
+    This is what the chunk tasks of _GridVariable.to_dask index into.
+    """
+    def __init__(self, filename, gridname, fieldname, backend, shape, dtype):
+        self.filename = filename
+        self.gridname = gridname
+        self.fieldname = fieldname
+        self.backend = backend
+        self.shape = shape
+        self.dtype = dtype
+        self.ndim = len(shape)
+
+    def __getitem__(self, index):
+        he_module = importlib.import_module(self.backend)
+        handle = handle_pool.open(self.filename,
+                                  functools.partial(FileHandle,
+                                                    he_module=he_module),
+                                  backend=self.backend)
+        try:
+            grid = _Grid(self.filename, self.gridname, he_module,
+                         handle=handle)
+        finally:
+            handle.release()
+        try:
+            return grid.fields[self.fieldname][index]
+        finally:
+            grid.close()
 
 
 class _Grid(object):
@@ -147,55 +521,332 @@ class _Grid(object):
     ----------
     projcode : scalar
     """
-    def __init__(self, filename, gridname, he_module):
+    def __init__(self, filename, gridname, he_module, field_attrs=None,
+                 handle=None, inventory=None, coord_store=None):
         self.filename = filename
         self._he = he_module
-        self.gdfid = self._he.gdopen(filename)
-        self.gridid = self._he.gdattach(self.gdfid, gridname)
-        self.gridname = gridname
+        self._coord_store = coord_store
 
-        dimnames, dimlens = self._he.gdinqdims(self.gridid)
-        dims = [(k, v) for (k, v) in zip(dimnames, dimlens)]
-        self.dims = collections.OrderedDict(dims)
+        # Attach through the file handle of the owning GridFile if there is
+        # one, otherwise open the file just for this grid.
+        if handle is None:
+            self._handle = FileHandle(filename, he_module)
+        else:
+            self._handle = handle.acquire()
+        self.gridname = gridname
 
-        _tuple = self._he.gdgridinfo(self.gridid)
-        self.xdimsize, self.ydimsize, self.upleft, self.lowright = _tuple
+        # With an inventory (from the metadata cache or the StructMetadata),
+        # the grid is only attached once the library is actually needed.
+        self._gridid = None
+        self._from_inventory = inventory is not None
+        if inventory is None:
+            inventory = self._inquire()
+        self._inventory = inventory
+
+        self.dims = collections.OrderedDict(inventory['dims'])
+        self.xdimsize = inventory['xdimsize']
+        self.ydimsize = inventory['ydimsize']
+        self.upleft = inventory['upleft']
+        self.lowright = inventory['lowright']
         if 'XDim' not in self.dims:
             self.dims['XDim'] = self.xdimsize
         if 'YDim' not in self.dims:
             self.dims['YDim'] = self.ydimsize
 
-        _tuple = self._he.gdprojinfo(self.gridid)
-        projcode, zonecode, spherecode, projparms = _tuple
-        self.projcode = projcode
-        self.zonecode = zonecode
-        self.spherecode = spherecode
-        self._sphere = _SPHERE[spherecode]
-        self.projparms = projparms
+        self.projcode = inventory['projcode']
+        self.zonecode = inventory['zonecode']
+        self.spherecode = inventory['spherecode']
+        self._sphere = _SPHERE[self.spherecode]
+        self.projparms = inventory['projparms']
 
-        self.origincode = self._he.gdorigininfo(self.gridid)
-        self.pixregcode = self._he.gdpixreginfo(self.gridid)
+        self.origincode = inventory['origincode']
+        self.pixregcode = inventory['pixregcode']
 
         if self.projcode == 22:
-            self.offsets = self._he.gdblksomoffset(self.gridid)
+            self.offsets = inventory['offsets']
+            if self.offsets is None:
+                self.offsets = self._he.gdblksomoffset(self.gridid)
             self.num_offsets = len(self.offsets) + 1
 
-        # collect the fieldnames
-        self._fields, _, _ = self._he.gdinqfields(self.gridid)
-        self.fields = collections.OrderedDict()
-        for fieldname in self._fields:
-            self.fields[fieldname] = _GridVariable(self.gridid,
-                                                   fieldname,
-                                                   self._he)
+        # Fields and attributes are only built when first accessed.  The
+        # field factory holds a weak reference so that the grid, which closes
+        # the file in __del__, does not end up in a reference cycle.
+        self._field_attrs = field_attrs
+        self._fields = list(inventory['fieldnames'])
+        self._descriptors = {}
+        grid = weakref.proxy(self)
+        self.fields = LazyMapping(self._fields,
+                                  lambda name: grid._make_field(name))
+
+        if 'attrs' in inventory:
+            self.attrs = collections.OrderedDict(inventory['attrs'])
+        else:
+            he = self._he
+            self.attrs = LazyMapping(lambda: he.gdinqattrs(grid.gridid),
+                                     lambda name: he.gdreadattr(grid.gridid,
+                                                                name))
+
+    @property
+    def gdfid(self):
+        return self._handle.gdfid
+
+    @property
+    def gridid(self):
+        """
+        Grid identifier, attaching the grid if necessary.
+        """
+        if self._gridid is None:
+            if self._handle is None:
+                msg = "Grid {0} has already been closed."
+                raise RuntimeError(msg.format(self.gridname))
+            self._gridid = self._he.gdattach(self._handle.gdfid,
+                                             self.gridname)
+        return self._gridid
+
+    def _inquire(self):
+        """
+        Ask the library for the dimensions, projection and field names.
+        """
+        gridid = self.gridid
+        inventory = collections.OrderedDict()
+
+        dimnames, dimlens = self._he.gdinqdims(gridid)
+        inventory['dims'] = [(k, v) for (k, v) in zip(dimnames, dimlens)]
+
+        _tuple = self._he.gdgridinfo(gridid)
+        for key, value in zip(['xdimsize', 'ydimsize', 'upleft', 'lowright'],
+                              _tuple):
+            inventory[key] = value
+
+        _tuple = self._he.gdprojinfo(gridid)
+        for key, value in zip(['projcode', 'zonecode', 'spherecode',
+                               'projparms'], _tuple):
+            inventory[key] = value
+
+        inventory['origincode'] = self._he.gdorigininfo(gridid)
+        inventory['pixregcode'] = self._he.gdpixreginfo(gridid)
+
+        inventory['offsets'] = None
+        if inventory['projcode'] == 22:
+            inventory['offsets'] = self._he.gdblksomoffset(gridid)
+
+        inventory['fieldnames'] = self._he.gdinqfields(gridid)[0]
+        return inventory
+
+    def _full_inventory(self):
+        """
+        Describe the grid, its fields and all of their attributes.
 
-        attr_list = self._he.gdinqattrs(self.gridid)
-        self.attrs = collections.OrderedDict()
-        for attr in attr_list:
-            self.attrs[attr] = self._he.gdreadattr(self.gridid, attr)
+        This is what the metadata cache stores for each grid.
+        """
+        inventory = collections.OrderedDict(self._inventory)
+        inventory['name'] = self.gridname
+        inventory['offsets'] = getattr(self, 'offsets', None)
+        inventory['attrs'] = list(self.attrs.items())
+        fields = []
+        for name in self.fields:
+            field = self.fields[name]
+            fields.append({'name': name,
+                           'shape': field.shape,
+                           'ntype': field.ntype,
+                           'dimlist': field.dimlist,
+                           'attrs': list(field.attrs.items()),
+                           'chunks': field.chunks,
+                           'compinfo': field._get_compinfo()})
+        inventory['fields'] = fields
+        return inventory
 
     def __del__(self):
-        self._he.gddetach(self.gridid)
-        self._he.gdclose(self.gdfid)
+        self.close()
+
+    def close(self):
+        """
+        Detach the grid and release the file, if not already done.
+        """
+        if self._handle is None:
+            return
+        handle, self._handle = self._handle, None
+        try:
+            if self._gridid is not None:
+                self._he.gddetach(self._gridid)
+        finally:
+            handle.release()
+
+    def read_fields(self, names, index=Ellipsis, out=None, stack=False,
+                    parallel=None):
+        """
+        Read the same window of several fields in one pass.
+
+        The index is compiled once and shared by all of the fields, which
+        must therefore have the same dimensions and shape.
+
+        Parameters
+        ----------
+        names : list of str
+            names of the fields to read
+        index : int, slice, Ellipsis, None, array, or tuple
+            same as for array-style indexing
+        out : dict or ndarray, optional
+            buffers to read into.  Either a mapping from field name to a
+            buffer as for _GridVariable.read_into (fields without an entry
+            are read into new arrays) or, if stack is true, a C-contiguous
+            array with one more leading dimension than the result.
+        stack : bool
+            return a single array with the fields stacked along a new first
+            dimension.  The fields must all have the same datatype.
+        parallel : int or ReaderPool, optional
+            read the fields concurrently in worker processes, as for
+            _GridVariable.read.  Reads within this process are sequential
+            because HDF4 and HDF-EOS are not thread-safe.
+
+        Returns
+        -------
+        data : OrderedDict or ndarray
+            results keyed by field name, or the stacked results
+
+        Raises
+        ------
+        KeyError
+            If a name is not that of a field of the grid.
+        ValueError
+            If the fields differ in dimensions or shape, fields of different
+            datatypes are to be stacked, or an output buffer is not
+            compatible.
+        """
+        fields = [self.fields[name] for name in names]
+        if len(fields) == 0:
+            if stack:
+                raise ValueError("At least one field is required to stack.")
+            return collections.OrderedDict()
+
+        first = fields[0]
+        for field in fields[1:]:
+            if field.shape != first.shape:
+                msg = "Field {0} has shape {1}, but field {2} has {3}."
+                raise ValueError(msg.format(field.fieldname, field.shape,
+                                            first.fieldname, first.shape))
+            if list(field.dimlist) != list(first.dimlist):
+                msg = "Field {0} has dimensions {1}, but field {2} has {3}."
+                raise ValueError(msg.format(field.fieldname,
+                                            list(field.dimlist),
+                                            first.fieldname,
+                                            list(first.dimlist)))
+        if stack and any(field.dtype != first.dtype for field in fields):
+            msg = "Only fields of the same datatype can be stacked."
+            raise ValueError(msg)
+
+        plan = compile_index(index, first.shape, first.max_gap,
+                             lambda: first.chunks)
+        shape = (len(fields),) + plan.shape
+        if stack:
+            if out is None:
+                out = np.empty(shape, dtype=first.dtype)
+            buffers = [output_buffer(out, shape, first.dtype)[k]
+                       for k in range(len(fields))]
+        elif out is not None:
+            buffers = [None if name not in out
+                       else output_buffer(out[name], plan.shape, field.dtype)
+                       for name, field in zip(names, fields)]
+        else:
+            buffers = [None] * len(fields)
+
+        if parallel is None:
+            results = []
+            for field, buffer in zip(fields, buffers):
+                if buffer is None:
+                    results.append(field._read_plan(plan))
+                else:
+                    field._fill(plan, buffer)
+                    results.append(buffer)
+        else:
+            if isinstance(parallel, ReaderPool):
+                results = parallel.read_fields(fields, index)
+            else:
+                with ReaderPool(parallel) as pool:
+                    results = pool.read_fields(fields, index)
+            for k, buffer in enumerate(buffers):
+                if buffer is not None:
+                    np.copyto(buffer, results[k])
+                    results[k] = buffer
+
+        if stack:
+            return out
+        data = collections.OrderedDict()
+        for name, result in zip(names, results):
+            if out is not None and name in out:
+                result = out[name]
+            data[name] = result
+        return data
+
+    def _make_field(self, fieldname):
+        """
+        Build the field object for a field of the grid.
+        """
+        if self._from_inventory:
+            return self._inventory_field(fieldname)
+
+        attrs = None
+        if self._field_attrs is not None:
+            attrs = functools.partial(self._field_attrs, self.gridname,
+                                      fieldname)
+        return _GridVariable(self.gridid, self._describe(fieldname),
+                             self._he, filename=self.filename,
+                             gridname=self.gridname, attrs=attrs)
+
+    def _inventory_field(self, fieldname):
+        """
+        Build a field object from the inventory of the grid.
+
+        The grid is attached only once the field is read, or once something
+        the inventory does not tell is asked for.
+        """
+        entry = [item for item in self._inventory['fields']
+                 if item['name'] == fieldname][0]
+        ntype = entry['ntype']
+        if entry['shape'] is None or ntype is None:
+            descriptor = self._describe(fieldname)
+        else:
+            dtype = np.dtype(self._he.number_type_dict[ntype])
+            descriptor = _FieldDescriptor(fieldname, fieldname.encode(),
+                                          tuple(entry['shape']), ntype,
+                                          dtype, entry['dimlist'])
+            self._descriptors[fieldname] = descriptor
+
+        attrs = None
+        if 'attrs' in entry:
+            attrs = collections.OrderedDict(entry['attrs'])
+        elif self._field_attrs is not None:
+            attrs = functools.partial(self._field_attrs, self.gridname,
+                                      fieldname)
+
+        grid = weakref.proxy(self)
+        field = _GridVariable(lambda: grid.gridid, descriptor, self._he,
+                              filename=self.filename, gridname=self.gridname,
+                              attrs=attrs)
+        if 'chunks' in entry:
+            field._tiledims = tuple(entry['chunks'] or ())
+        if entry.get('compinfo') is not None:
+            code, params = entry['compinfo']
+            field._compinfo = (code, tuple(params))
+        return field
+
+    def _describe(self, fieldname):
+        """
+        Return the cached descriptor of a field, querying it if necessary.
+        """
+        try:
+            return self._descriptors[fieldname]
+        except KeyError:
+            pass
+
+        x = self._he.gdfieldinfo(self.gridid, fieldname)
+        shape, ntype, dimlist = x[0:3]
+        dtype = np.dtype(self._he.number_type_dict[ntype])
+        descriptor = _FieldDescriptor(fieldname, fieldname.encode(),
+                                      tuple(int(dim) for dim in shape),
+                                      ntype, dtype, dimlist)
+        self._descriptors[fieldname] = descriptor
+        return descriptor
 
     def __str__(self):
         lst = ["Grid:  {0}".format(self.gridname)]
@@ -412,6 +1063,43 @@ class _Grid(object):
         """
         Retrieve grid coordinates.
         """
+        return self.coords(index)
+
+    def coords(self, index=Ellipsis, sparse=False, out=None):
+        """
+        Retrieve grid coordinates.
+
+        Parameters
+        ----------
+        index : slice, Ellipsis or tuple
+            same as for array-style indexing of the grid
+        sparse : bool
+            if true, return latitude as a column and longitude as a row
+            that broadcast against each other to the selected pixels.  Only
+            Geographic and CEA grids, whose latitude depends on the row
+            alone and longitude on the column alone, can do this.
+        out : tuple of ndarray, optional
+            latitude and longitude arrays to write into, of the shape of the
+            result and of any floating point datatype.  They are filled a
+            strip of rows (or a SOM block) at a time, bypassing the
+            coordinate cache and store.
+
+        Returns
+        -------
+        lat, lon : ndarray
+            latitude and longitude in decimal degrees
+
+        Raises
+        ------
+        ValueError
+            If sparse coordinates are asked for another projection, or the
+            output arrays are not compatible.
+        """
+        if sparse and self.projcode not in _SEPARABLE:
+            msg = "Sparse coordinates are only available for Geographic "
+            msg += "and CEA grids, not projection code {0}."
+            raise ValueError(msg.format(self.projcode))
+
         if self.projcode == 22:
             # The grid consists of the NBlocks, XDimSize, YDimSize
             shape = (self.dims['SOMBlockDim'],
@@ -430,11 +1118,11 @@ class _Grid(object):
             if self.projcode == 22:
                 # SOM projection, inherently 3D.
                 bands = rows = cols = slice(None, None, None)
-                return self.__getitem__((bands, rows, cols))
+                return self.coords((bands, rows, cols), sparse, out)
             else:
                 # Other projections are 2D.
                 rows = cols = slice(None, None, None)
-                return self.__getitem__((rows, cols))
+                return self.coords((rows, cols), sparse, out)
 
         if isinstance(index, slice):
             if (((index.start is None) and
@@ -443,10 +1131,10 @@ class _Grid(object):
                 # Case of grid[:]
                 if self.projcode == 22:
                     # SOM projection, inherently 3D.
-                    return self.__getitem__((index, index, index))
+                    return self.coords((index, index, index), sparse, out)
                 else:
                     # Other projections are 2D.
-                    return self.__getitem__((index, index))
+                    return self.coords((index, index), sparse, out)
 
             msg = "Single slice argument integer is only legal "
             msg += "if providing ':'"
@@ -481,7 +1169,7 @@ class _Grid(object):
                     newindex = (index[0], cols)
 
             # Easiest to just run it again.
-            return self.__getitem__(newindex)
+            return self.coords(newindex, sparse, out)
 
         if isinstance(index, tuple) and any(isinstance(x, int) for x in index):
             # Replace the first such integer argument, replace it with a slice.
@@ -492,23 +1180,39 @@ class _Grid(object):
             lst[idx] = slice(index[idx], index[idx] + 1)
             newindex = tuple(lst)
 
+            if out is not None:
+                # Write through views with the scalar dimension restored.
+                _coords_out(out, None)
+                self.coords(newindex, sparse,
+                            tuple(np.expand_dims(x, idx) for x in out))
+                return tuple(out)
+
             # Invoke array-based slicing again, as there may be additional
             # integer argument remaining.
-            lat, lon = self.__getitem__(newindex)
+            lat, lon = self.coords(newindex, sparse)
 
-            # Reduce dimensionality in the scalar dimension.
-            lat = np.squeeze(lat, axis=idx)
-            lon = np.squeeze(lon, axis=idx)
-            return lat, lon
+            # Reduce dimensionality in the scalar dimension.  Indexing
+            # rather than squeezing keeps memmaps from the coordinate store.
+            scalar = (slice(None, None, None),) * idx + (0,)
+            return lat[scalar], lon[scalar]
 
         # Assuming pargs is a tuple of slices from now on.
         # This is the workhorse section for the general case.
         if self.projcode == 22:
             # SOM grids are inherently 3D.  Must handle differently.
-            return _som._get_som_grid(index, shape, self.offsets,
-                                      self.upleft, self.lowright,
-                                      self.projcode, self.projparms,
-                                      self.spherecode)
+            if out is not None:
+                return self._fill_som_coords(index, shape, out)
+            if self._coord_store is not None:
+                lat, lon = self._stored_coords(shape)
+                return lat[index], lon[index]
+            pixels = tuple((x.start, x.stop, x.step) for x in index)
+            return self._cached_coords(
+                pixels,
+                lambda: tuple(_som._get_som_grid(index, shape, self.offsets,
+                                                 self.upleft, self.lowright,
+                                                 self.projcode,
+                                                 self.projparms,
+                                                 self.spherecode)))
 
         rows = index[0]
         cols = index[1]
@@ -530,23 +1234,471 @@ class _Grid(object):
 
         col = np.arange(cols_start, cols_stop, cols_step)
         row = np.arange(rows_start, rows_stop, rows_step)
-        cols, rows = np.meshgrid(col, row)
-        cols = cols.astype(np.int32)
-        rows = rows.astype(np.int32)
-        lon, lat = self._he.gdij2ll(self.projcode,
-                                    self.zonecode, self.projparms,
-                                    self.spherecode,
-                                    self.xdimsize, self.ydimsize,
-                                    self.upleft, self.lowright,
-                                    rows, cols,
-                                    self.pixregcode, self.origincode)
+
+        if out is not None:
+            nrows, ncols = len(row), len(col)
+            if sparse:
+                lat, lon = _coords_out(out, ((nrows, 1), (1, ncols)))
+                lat[...], lon[...] = self._latlon(row, col, sparse)
+            else:
+                lat, lon = _coords_out(out, ((nrows, ncols), (nrows, ncols)))
+                self._fill_coords(row, col, lat, lon)
+            return tuple(out)
+
+        if self._coord_store is not None:
+            lat, lon = self._stored_coords(shape)
+            rows = slice(rows_start, rows_stop, rows_step)
+            cols = slice(cols_start, cols_stop, cols_step)
+            if sparse:
+                return lat[rows, :1], lon[:1, cols]
+            return lat[rows, cols], lon[rows, cols]
+
+        pixels = ((rows_start, rows_stop, rows_step),
+                  (cols_start, cols_stop, cols_step), sparse)
+        return self._cached_coords(pixels,
+                                   lambda: self._latlon(row, col, sparse))
+
+    def _latlon(self, row, col, sparse):
+        """
+        Latitude and longitude of pixels given by row and column numbers.
+        """
+        if sparse:
+            # Latitude from the rows alone, longitude from the columns alone.
+            _, lat = self._ij2ll(row[:, np.newaxis], np.zeros((1, 1)))
+            lon, _ = self._ij2ll(np.zeros((1, 1)), col[np.newaxis, :])
+            return lat, lon
+
+        lat = np.empty((len(row), len(col)))
+        lon = np.empty((len(row), len(col)))
+        self._fill_coords(row, col, lat, lon)
         return lat, lon
 
+    def _fill_coords(self, row, col, lat, lon, strip_rows=None):
+        """
+        Write the latitude and longitude of the pixels given by row and
+        column numbers into lat and lon, a strip of rows at a time.
+        """
+        if strip_rows is None:
+            strip_rows = block_shape_for(lat.shape, 8)[0]
+        for start, stop, slat, slon in self._coord_strips(row, col,
+                                                          strip_rows):
+            lat[start:stop] = slat
+            lon[start:stop] = slon
+
+    def _coord_strips(self, row, col, strip_rows):
+        """
+        Compute the latitude and longitude of the pixels given by row and
+        column numbers, strip_rows rows at a time.
+
+        Whether the projection can be inverted with NumPy is decided once,
+        not for every strip.  Only one strip of temporaries is alive at once.
+        No grid of row and column numbers is built unless GCTP is needed, in
+        which case they go into scratch buffers allocated once and reused for
+        every strip.
+
+        Yields
+        ------
+        start, stop : int
+            positions in row of the rows of the strip
+        lat, lon : ndarray
+            latitude and longitude of the strip
+        """
+        col = col[np.newaxis, :]
+        rows = cols = None
+        use_numpy = _gctp.supports(self.projcode, self.spherecode,
+                                   self.projparms)
+        for start in range(0, len(row), strip_rows):
+            stop = min(start + strip_rows, len(row))
+            strip = row[start:stop, np.newaxis]
+            coords = None
+            if use_numpy:
+                coords = _gctp.ij2ll(self.projcode, self.zonecode,
+                                     self.projparms, self.spherecode,
+                                     self.xdimsize, self.ydimsize,
+                                     self.upleft, self.lowright, strip, col,
+                                     self.pixregcode, self.origincode)
+                # An inverse that failed to converge is not retried.
+                use_numpy = coords is not None
+            if coords is None:
+                if rows is None:
+                    shape = (min(strip_rows, len(row)), col.size)
+                    rows = np.empty(shape, dtype=np.int32)
+                    cols = np.empty(shape, dtype=np.int32)
+                    cols[...] = col
+                n = stop - start
+                rows[:n] = strip
+                coords = self._he.gdij2ll(self.projcode, self.zonecode,
+                                          self.projparms, self.spherecode,
+                                          self.xdimsize, self.ydimsize,
+                                          self.upleft, self.lowright,
+                                          rows[:n], cols[:n],
+                                          self.pixregcode, self.origincode)
+            lon, lat = coords
+            yield start, stop, lat, lon
+
+    def _fill_som_coords(self, index, shape, out):
+        """
+        Write the coordinates of SOM grid pixels into out, a block at a time.
+        """
+        bands, rows, cols = index
+        bands = range(*bands.indices(self.dims['SOMBlockDim']))
+        nrows = len(range(*rows.indices(shape[1])))
+        ncols = len(range(*cols.indices(shape[2])))
+        result = (len(bands), nrows, ncols)
+        lat, lon = _coords_out(out, (result, result))
+        for k, band in enumerate(bands):
+            block = (slice(band, band + 1), rows, cols)
+            blat, blon = _som._get_som_grid(block, shape, self.offsets,
+                                            self.upleft, self.lowright,
+                                            self.projcode, self.projparms,
+                                            self.spherecode)
+            lat[k] = blat[0]
+            lon[k] = blon[0]
+        return tuple(out)
+
+    def iter_coords(self, strip_rows=None, dtype=np.float64):
+        """
+        Iterate over the coordinates of the grid a strip of rows at a time.
+
+        Parameters
+        ----------
+        strip_rows : int, optional
+            number of rows in each strip, by default as many as make about
+            4 MiB of latitudes.  SOM grids are iterated over one block at a
+            time instead.
+        dtype : numpy dtype
+            floating point datatype of the coordinates
+
+        Yields
+        ------
+        window : tuple of slice
+            location of the strip within the grid
+        lat, lon : ndarray
+            latitude and longitude of the strip.  Their memory is reused for
+            subsequent strips, so they are only valid until the next strip
+            is requested.  Copy them to keep them.
+
+        Raises
+        ------
+        ValueError
+            If the strip size or datatype is not valid.
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            msg = "Coordinates must be floating point, not {0}."
+            raise ValueError(msg.format(dtype))
+        if strip_rows is not None and strip_rows < 1:
+            msg = "Strips must have at least one row, not {0}."
+            raise ValueError(msg.format(strip_rows))
+
+        if self.projcode == 22:
+            shape = (1, self.dims['XDim'], self.dims['YDim'])
+            lat = np.empty(shape, dtype=dtype)
+            lon = np.empty(shape, dtype=dtype)
+            for band in range(self.dims['SOMBlockDim']):
+                window = (slice(band, band + 1), slice(0, shape[1]),
+                          slice(0, shape[2]))
+                self.coords(window, out=(lat, lon))
+                yield window, lat, lon
+            return
+
+        nrows, ncols = self.dims['YDim'], self.dims['XDim']
+        if strip_rows is None:
+            strip_rows = block_shape_for((nrows, ncols), dtype.itemsize)[0]
+        shape = (min(strip_rows, nrows), ncols)
+        lat = np.empty(shape, dtype=dtype)
+        lon = np.empty(shape, dtype=dtype)
+        for start, stop, slat, slon in self._coord_strips(np.arange(nrows),
+                                                          np.arange(ncols),
+                                                          strip_rows):
+            n = stop - start
+            lat[:n] = slat
+            lon[:n] = slon
+            yield (slice(start, stop), slice(0, ncols)), lat[:n], lon[:n]
+
+    def _definition(self):
+        """
+        Hash of everything the coordinates of the grid depend on.
+        """
+        offsets = self.offsets if self.projcode == 22 else None
+        return grid_key(self.projcode, self.zonecode, self.spherecode,
+                        self.projparms, self.xdimsize, self.ydimsize,
+                        self.upleft, self.lowright, self.pixregcode,
+                        self.origincode, offsets)
+
+    def _cached_coords(self, pixels, compute):
+        """
+        Look up coordinates in the process-wide coordinate cache, computing
+        and caching them on a miss.  Grids with the same definition share
+        entries, whichever file they come from.
+        """
+        key = (self._definition(), pixels)
+        coords = coordinate_cache.get(key)
+        if coords is None:
+            coords = coordinate_cache.put(key, compute())
+        return coords
+
+    def _stored_coords(self, shape):
+        """
+        Memory-map the coordinates of every pixel of the grid from the
+        coordinate store, computing and storing them the first time.
+        """
+        definition = self._definition()
+        coords = self._coord_store.load(definition)
+        if coords is None:
+            if self.projcode == 22:
+                index = (slice(None, None, None),) * 3
+                lat, lon = _som._get_som_grid(index, shape, self.offsets,
+                                              self.upleft, self.lowright,
+                                              self.projcode, self.projparms,
+                                              self.spherecode)
+            else:
+                lat, lon = self._latlon(np.arange(shape[0]),
+                                        np.arange(shape[1]), False)
+            coords = self._coord_store.store(definition, lat, lon)
+        return coords
+
+    def _ij2ll(self, row, col):
+        """
+        Longitude and latitude of pixels given by broadcast row and column
+        numbers.
+        """
+        # Common projections are inverted with NumPy, falling back to GCTP
+        # one point at a time for everything else.
+        coords = _gctp.ij2ll(self.projcode, self.zonecode, self.projparms,
+                             self.spherecode, self.xdimsize, self.ydimsize,
+                             self.upleft, self.lowright, row, col,
+                             self.pixregcode, self.origincode)
+        if coords is not None:
+            return coords
+
+        rows, cols = np.broadcast_arrays(row, col)
+        return self._he.gdij2ll(self.projcode,
+                                self.zonecode, self.projparms,
+                                self.spherecode,
+                                self.xdimsize, self.ydimsize,
+                                self.upleft, self.lowright,
+                                rows.astype(np.int32), cols.astype(np.int32),
+                                self.pixregcode, self.origincode)
+
+    @property
+    def transform(self):
+        """
+        Affine transform from pixel to projected coordinates.
+
+        The coefficients (a, b, c, d, e, f) give
+
+            x = a * col + b * row + c
+            y = d * col + e * row + f
+
+        for zero-based column and row numbers, at the position within each
+        pixel used for its latitude and longitude: the center, or the corner
+        given by the grid origin.  x and y are in meters, or in decimal
+        degrees for Geographic grids.
+
+        Raises
+        ------
+        ValueError
+            If the grid is a SOM grid, whose blocks are offset from each
+            other.
+        """
+        if self.projcode == 22:
+            raise ValueError("SOM grids have no affine transform.")
+        (x0, y0), (x1, y1) = _gctp.corners(self.projcode, self.upleft,
+                                           self.lowright)
+        adjx, adjy = _gctp.pixel_adjustment(self.pixregcode, self.origincode)
+        a = (x1 - x0) / self.xdimsize
+        e = (y1 - y0) / self.ydimsize
+        return (a, 0.0, x0 + adjx * a, 0.0, e, y0 + adjy * e)
+
+    def xy(self, index=Ellipsis):
+        """
+        Projected coordinates of pixels, without inverting the projection.
+
+        Parameters
+        ----------
+        index : int, slice, Ellipsis, array or tuple
+            rows and columns, as for array-style indexing of a 2D array
+
+        Returns
+        -------
+        x, y : ndarray
+            1D x coordinates of the selected columns and y coordinates of
+            the selected rows, in meters or in decimal degrees for
+            Geographic grids
+
+        Raises
+        ------
+        ValueError
+            If the grid is a SOM grid.
+        """
+        if self.projcode == 22:
+            raise ValueError("SOM grids have no affine transform.")
+        if not isinstance(index, tuple):
+            index = (index,)
+        if any(item is Ellipsis for item in index):
+            pos = [item is Ellipsis for item in index].index(True)
+            fill = (slice(None),) * (3 - len(index))
+            index = index[:pos] + fill + index[pos + 1:]
+        if len(index) == 1:
+            index = index + (slice(None),)
+        if len(index) != 2:
+            msg = "Grid index must have two dimensions, not {0}."
+            raise RuntimeError(msg.format(len(index)))
+
+        row = np.atleast_1d(np.arange(self.ydimsize)[index[0]])
+        col = np.atleast_1d(np.arange(self.xdimsize)[index[1]])
+        return _gctp.ij2xy(self.projcode, self.xdimsize, self.ydimsize,
+                           self.upleft, self.lowright, row, col,
+                           self.pixregcode, self.origincode)
+
+
+class _HDF4Attributes(object):
+    """
+    Index of the SD attributes of the fields of an HDF-EOS2 file.
+
+    HDF-EOS2 has no interface to field attributes, so they are read with the
+    HDF4 SD interface, using the HDF4 file and SD identifiers underlying the
+    HDF-EOS file handle.  On first use, the "Data Fields" vgroups of all
+    grids are traversed once to map each field onto its SDS and attribute
+    names.  Attribute values are read when they are first accessed.
+
+    Parameters
+    ----------
+    handle : FileHandle
+        HDF-EOS2 file handle.  The index is kept in the cache of the handle
+        and only used by grids holding the handle open.  Attribute values
+        not yet read when the file is closed can no longer be read.
+    gridnames : list of str
+        grids of the file
+    """
+    def __init__(self, handle, gridnames):
+        self._handle = handle
+        self.gridnames = list(gridnames)
+        self._index = None
+
+    def __call__(self, gridname, fieldname):
+        """
+        Return the attributes of a field, with values read on first access.
+        """
+        if self._index is None:
+            self._build_index()
+        try:
+            sds_index, attr_indices = self._index[(gridname, fieldname)]
+        except KeyError:
+            # No attributes.
+            return collections.OrderedDict()
+        return LazyMapping(list(attr_indices.keys()),
+                           functools.partial(self._read, sds_index,
+                                             attr_indices))
+
+    def _build_index(self):
+        """
+        Map (grid name, field name) onto SDS index and attribute indices.
+        """
+        # Vstart and Vend only adjust the HDF-EOS access count of the V
+        # interface.
+        fid, sd_id = self._identifiers()
+        lib.hdf.vstart(fid)
+
+        index = {}
+        try:
+            for gridname in self.gridnames:
+                grid_ref = lib.hdf.vfind(fid, gridname)
+                grid_vg = lib.hdf.vattach(fid, grid_ref)
+                for tag_i, ref_i in lib.hdf.vgettagrefs(grid_vg):
+                    if tag_i != lib.hdf.DFTAG_VG:
+                        continue
+                    # Descend into a vgroup if we find it.
+                    vg0 = lib.hdf.vattach(fid, ref_i)
+                    if lib.hdf.vgetname(vg0) == 'Data Fields':
+                        self._index_sds(sd_id, vg0, gridname, index)
+                    lib.hdf.vdetach(vg0)
+                lib.hdf.vdetach(grid_vg)
+        finally:
+            lib.hdf.vend(fid)
+        self._index = index
+
+    def _identifiers(self):
+        """
+        HDF4 file and SD identifiers underlying the open HDF-EOS file.
+
+        These belong to HDF-EOS, which also ends them, so they are asked for
+        anew each time rather than kept beyond the life of the file.
+
+        Raises
+        ------
+        RuntimeError
+            If the file has been closed.
+        """
+        if self._handle.closed:
+            msg = "File {0} has been closed, its field attributes can no "
+            msg += "longer be read."
+            raise RuntimeError(msg.format(self._handle.filename))
+        return lib.he4.ehidinfo(self._handle.gdfid)
+
+    def _index_sds(self, sd_id, vgroup, gridname, index):
+        """
+        Add the SDS datasets of a "Data Fields" vgroup to the index.
+        """
+        for tag, ref in lib.hdf.vgettagrefs(vgroup):
+            if tag != lib.hdf.DFTAG_NDG:
+                continue
+            idx = lib.hdf.sdreftoindex(sd_id, ref)
+            sds_id = lib.hdf.sdselect(sd_id, idx)
+            try:
+                name, _, _, nattrs = lib.hdf.sdgetinfo(sds_id)
+                attr_indices = collections.OrderedDict()
+                for k in range(nattrs):
+                    attr_indices[lib.hdf.sdattrinfo(sds_id, k)[0]] = k
+            finally:
+                lib.hdf.sdendaccess(sds_id)
+            index[(gridname, name)] = (idx, attr_indices)
+
+    def _read(self, sds_index, attr_indices, attrname):
+        """
+        Read the value of a single SDS attribute.
+        """
+        _, sd_id = self._identifiers()
+        sds_id = lib.hdf.sdselect(sd_id, sds_index)
+        try:
+            return lib.hdf.sdreadattr(sds_id, attr_indices[attrname])
+        finally:
+            lib.hdf.sdendaccess(sds_id)
+
 
 class GridFile(object):
     """
     Access to HDF-EOS grid files.
 
+    Parameters
+    ----------
+    filename : str
+        HDF-EOS2 or HDF-EOS5 grid file
+    cache_dir : str, optional
+        directory of the metadata cache.  If the file is in the cache, the
+        grids, fields and attributes are built from it and the file is only
+        opened once data is read.  Otherwise the full inventory of the file
+        is read and added to the cache.
+    coords_dir : str, optional
+        directory of the coordinate store.  The latitude and longitude of
+        every pixel of a grid are computed once per grid definition, written
+        there as .npy files, and indexing the grid returns read-only memmap
+        views of them, shared with every other process using the directory.
+    structmetadata : bool
+        describe the grids and fields by parsing the StructMetadata of the
+        file, read in one library call, instead of asking the library about
+        each of them.  Grids the parser does not understand are still
+        described through the library.
+    backend : {'he4', 'he5'}, optional
+        library to open the file with, HDF-EOS2 or HDF-EOS5.  By default it
+        is picked from the file signature.
+
+    Raises
+    ------
+    ValueError
+        If the backend is not known.
+
     Attributes
     ----------
     filename : str
@@ -554,76 +1706,126 @@ class GridFile(object):
     grids : dictionary
         collection of grids
     """
-    def __init__(self, filename):
+    def __init__(self, filename, cache_dir=None, structmetadata=True,
+                 backend=None, coords_dir=None):
+        if backend is not None and backend not in _BACKENDS:
+            msg = "Unknown backend {0!r}, expected one of {1}."
+            raise ValueError(msg.format(backend, sorted(_BACKENDS)))
         self.filename = filename
-        try:
-            self.gdfid = he4.gdopen(filename)
-            self._he = he4
-        except IOError:
-            # try hdf5
-            self.gdfid = he5.gdopen(filename)
-            self._he = he5
-
-        gridlist = self._he.gdinqgrid(filename)
-        self.grids = collections.OrderedDict()
-        for gridname in gridlist:
-            self.grids[gridname] = _Grid(self.filename, gridname, self._he)
+
+        self._coord_store = None
+        if coords_dir is not None:
+            self._coord_store = CoordinateStore(coords_dir)
+
+        metadata_cache = inventory = None
+        if cache_dir is not None:
+            metadata_cache = MetadataCache(cache_dir)
+            inventory = metadata_cache.load(filename)
+
+        if inventory is not None:
+            he_module = importlib.import_module(inventory['backend'])
+            opener = functools.partial(FileHandle, he_module=he_module,
+                                       lazy=True)
+            self._handle = handle_pool.open(filename, opener,
+                                            backend=he_module.__name__)
+            self._he = self._handle._he
+            self._build_from_inventory(inventory)
+            return
+
+        opener = functools.partial(_open_file, backend=backend)
+        if backend is not None:
+            backend = getattr(lib, backend).__name__
+        self._handle = handle_pool.open(filename, opener, backend=backend)
+        self._he = self._handle._he
+
+        # The list of grids, their structure and the HDF4 attribute index are
+        # kept with the handle, so that files reused from the pool need not
+        # be inquired about again.
+        cache = self._handle.cache
+        structure = {}
+        if structmetadata:
+            if 'structure' not in cache:
+                cache['structure'] = self._read_structmetadata()
+            structure = cache['structure'] or {}
+
+        if 'gridlist' not in cache:
+            if structure:
+                cache['gridlist'] = list(structure.keys())
+            else:
+                cache['gridlist'] = self._he.gdinqgrid(filename)
+        gridlist = cache['gridlist']
+
+        if 'field_attrs' not in cache:
+            cache['field_attrs'] = None
             if not hasattr(self._he, 'gdinqlocattrs'):
                 # Inquire about hdf4 attributes using SD interface
-                for fieldname in self.grids[gridname].fields.keys():
-                    attrs = self._hdf4_attrs(filename, gridname, fieldname)
-                    self.grids[gridname].fields[fieldname].attrs = attrs
+                cache['field_attrs'] = _HDF4Attributes(self._handle,
+                                                       gridlist)
+        field_attrs = cache['field_attrs']
+
+        # Grids are only attached when first accessed, all through the one
+        # file handle, which stays open for as long as any grid uses it.
+        he_module = self._he
+        handle = self._handle
+        coord_store = self._coord_store
 
-    def _hdf4_attrs(self, filename, gridname, fieldname):
+        def make_grid(gridname):
+            return _Grid(filename, gridname, he_module, field_attrs, handle,
+                         inventory=structure.get(gridname),
+                         coord_store=coord_store)
+
+        self.grids = LazyMapping(gridlist, make_grid)
+
+        if metadata_cache is not None:
+            metadata_cache.store(filename, self._inventory())
+
+    def _read_structmetadata(self):
         """
-        Retrieve field attributes using HDF4 interface.
+        Describe the grids from the StructMetadata of the file.
+
+        Returns
+        -------
+        structure : OrderedDict or None
+            inventory of each grid (None for grids that could not be
+            parsed), or None if the StructMetadata cannot be read or parsed
         """
+        try:
+            text = _structmetadata.read(self._he, self._handle.gdfid)
+            return _structmetadata.inventories(text, self._he)
+        except (IOError, ValueError):
+            return None
 
-        attrs = None
+    def _build_from_inventory(self, inventory):
+        """
+        Build the grids from a cached inventory, without any library calls.
+        """
+        filename, he_module, handle = self.filename, self._he, self._handle
+        coord_store = self._coord_store
+        entries = collections.OrderedDict((entry['name'], entry)
+                                          for entry in inventory['grids'])
 
-        fid = hdf.hopen(filename)
-        sd_id = hdf.sdstart(filename)
-        hdf.vstart(fid)
-
-        grid_ref = hdf.vfind(fid, gridname)
-        grid_vg = hdf.vattach(fid, grid_ref)
-
-        members = hdf.vgettagrefs(grid_vg)
-        for tag_i, ref_i in members:
-            if tag_i == hdf.DFTAG_VG:
-                # Descend into a vgroup if we find it.
-                vg0 = hdf.vattach(fid, ref_i)
-                name = hdf.vgetname(vg0)
-                if name == 'Data Fields':
-                    # We want this Vgroup
-                    df_members = hdf.vgettagrefs(vg0)
-                    for tag_j, ref_j in df_members:
-                        if tag_j == hdf.DFTAG_NDG:
-                            # SDS dataset.
-                            idx = hdf.sdreftoindex(sd_id, ref_j)
-                            sds_id = hdf.sdselect(sd_id, idx)
-                            name, dims, dtype, nattrs = hdf.sdgetinfo(sds_id)
-                            if name == fieldname:
-                                alst = []
-                                for k in range(nattrs):
-                                    info = hdf.sdattrinfo(sds_id, k)
-                                    name = info[0]
-                                    value = hdf.sdreadattr(sds_id, k)
-                                    alst.append((name, value))
-                                attrs = collections.OrderedDict(alst)
-                            hdf.sdendaccess(sds_id)
-                hdf.vdetach(vg0)
-
-        hdf.vdetach(grid_vg)
-
-        hdf.vend(fid)
-        hdf.sdend(sd_id)
-        hdf.hclose(fid)
+        def make_grid(gridname):
+            return _Grid(filename, gridname, he_module, handle=handle,
+                         inventory=entries[gridname], coord_store=coord_store)
 
-        if attrs is None:
-            # No attributes.
-            attrs = collections.OrderedDict()
-        return attrs
+        self.grids = LazyMapping(list(entries.keys()), make_grid)
+
+    def _inventory(self):
+        """
+        Describe every grid, field and attribute of the file.
+
+        Returns
+        -------
+        inventory : dict
+            what the metadata cache stores for the file
+        """
+        grids = [self.grids[gridname]._full_inventory()
+                 for gridname in self.grids]
+        return {'backend': self._he.__name__, 'grids': grids}
+
+    @property
+    def gdfid(self):
+        return self._handle.gdfid
 
     def __repr__(self):
         return "GridFile('{0}')".format(self.filename)
@@ -641,11 +1843,59 @@ class GridFile(object):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        self.close()
 
     def __del__(self):
-        self._he.gdclose(self.gdfid)
+        # Grids still referenced elsewhere keep the file open.
+        handle = getattr(self, '_handle', None)
+        if handle is not None:
+            self._handle = None
+            handle.release()
 
+    @property
+    def closed(self):
+        return self._handle is None
+
+    def close(self):
+        """
+        Detach every grid and release the file.
+
+        The file goes back to the handle pool, so reopening it is cheap.
+        Grids and fields of a closed GridFile can no longer be read.
+        """
+        if self._handle is None:
+            return
+        for gridname in self.grids:
+            if self.grids.is_loaded(gridname):
+                self.grids[gridname].close()
+        handle, self._handle = self._handle, None
+        handle.release()
+
+
+_BACKENDS = ('he4', 'he5')
+
+
+def _open_file(filename, backend=None):
+    """
+    Open a file with the backend that can read it.
+
+    Unless given, the backend is picked from the file signature.  Files with
+    neither an HDF4 nor an HDF5 signature are tried with both.
+    """
+    if backend is None:
+        backend = sniff_format(filename)
+    if backend is not None:
+        return FileHandle(filename, getattr(lib, backend))
+    try:
+        return FileHandle(filename, lib.he4)
+    except IOError:
+        # try hdf5
+        return FileHandle(filename, lib.he5)
+
+
+# Projections whose latitude depends only on the row and longitude only on
+# the column: Geographic and CEA.
+_SEPARABLE = (0, 97)
 
 _SPHERE = {-1: 'Unspecified',
            0: 'Clarke 1866',
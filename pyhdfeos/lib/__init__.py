@@ -1,4 +1,26 @@
+"""
+cffi interfaces to the HDF4, HDF-EOS2 and HDF-EOS5 libraries.
+
+Building or loading an interface links its shared libraries, so each one is
+only imported when first used, e.g. HDF-EOS2 and HDF4 are never loaded by a
+process that only reads HDF-EOS5 files.
+"""
+import importlib
+import sys
+
 from . import config
-from . import he4
-from . import he5
-from . import hdf
+
+# Interfaces, imported on first access.
+BACKENDS = ('he4', 'he5', 'hdf')
+
+if sys.hexversion < 0x03070000:
+    # Module __getattr__ (PEP 562) is not available, so import them all.
+    from . import he4
+    from . import he5
+    from . import hdf
+else:
+    def __getattr__(name):
+        if name in BACKENDS:
+            return importlib.import_module('.' + name, __name__)
+        msg = "module {0!r} has no attribute {1!r}"
+        raise AttributeError(msg.format(__name__, name))
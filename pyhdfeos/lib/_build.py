@@ -0,0 +1,211 @@
+"""
+Builders of the cffi extension modules for the HDF4, HDF-EOS2 and HDF-EOS5
+libraries.
+
+setup.py compiles them at install time through ``cffi_modules`` into
+pyhdfeos.lib._he4, pyhdfeos.lib._he5 and pyhdfeos.lib._hdf, which he4.py,
+he5.py and hdf.py import directly.  Nothing is compiled when pyhdfeos is
+imported.  To build the extension modules in place, run
+
+    python pyhdfeos/lib/_build.py
+"""
+import os
+import sys
+
+from cffi import FFI
+
+# cffi executes this file as a script instead of importing it from the
+# package, so config is imported from the same directory.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config
+
+HE4_CDEF = """
+    typedef float float32;
+    typedef int int32;
+    typedef int intn;
+    typedef double float64;
+
+    intn  EHidinfo(int32 fid, int32 *hdfid, int32 *sdid);
+    int32 GDattach(int32 gdfid, char *grid);
+    intn  GDattrinfo(int32 gdfid, char *attrname, int32 *nbyte, int32
+                     *count);
+    intn  GDblkSOMoffset(int32 fid, float32 [], int32 count, char *code);
+    intn  GDdetach(int32 gid);
+    intn  GDclose(int32 fid);
+    intn  GDcompinfo(int32 gridid, char *fieldname, int32 *compcode,
+                     intn compparm[]);
+    intn  GDfieldinfo(int32 gridid, char *fieldname, int32 *rank,
+                      int32 dims[], int32 *numbertype, char *dimlist);
+    int32 GDij2ll(int32 projcode, int32 zonecode,
+                  float64 projparm[], int32 spherecode, int32 xdimsize,
+                  int32 ydimsize, float64 upleft[], float64 lowright[],
+                  int32 npts, int32 row[], int32 col[], float64
+                  longititude[], float64 latitude[], int32 pixcen,
+                  int32 pixcnr);
+    int32 GDinqattrs(int32 gridid, char *attrlist, int32 *strbufsize);
+    int32 GDinqdims(int32 gridid, char *dimname, int32 *dims);
+    int32 GDinqfields(int32 gridid, char *fieldlist, int32 rank[],
+                      int32 numbertype[]);
+    int32 GDinqgrid(char *filename, char *gridlist, int32 *strbufsize);
+    int32 GDnentries(int32 gridid, int32 entrycode, int32 *strbufsize);
+    intn  GDgridinfo(int32 gridid, int32 *xdimsize, int32 *ydimsize,
+                     float64 upleft[2], float64 lowright[2]);
+    int32 GDopen(char *name, intn access);
+    intn  GDorigininfo(int32 gridid, int32 *origincode);
+    intn  GDpixreginfo(int32 gridid, int32 *pixregcode);
+    intn  GDprojinfo(int32 gridid, int32 *projcode, int32 *zonecode,
+                     int32 *spherecode, float64 projparm[]);
+    intn  GDreadattr(int32 gridid, char* attrname, void *buffer);
+    intn  GDreadfield(int32 gridid, char* fieldname, int32 start[],
+                      int32 stride[], int32 edge[], void *buffer);
+    intn  GDtileinfo(int32 gridid, char *fieldname, int32 *tilecode,
+                     int32 *tilerank, int32 tiledims[]);
+"""
+
+HE4_SOURCE = """
+    #include "mfhdf.h"
+    #include "HdfEosDef.h"
+"""
+
+HE5_CDEF = """
+    typedef unsigned uintn;
+    typedef unsigned long long hsize_t;
+    typedef int hid_t;
+    typedef int herr_t;
+    typedef int htri_t;
+
+    hid_t  HE5_GDattach(hid_t fid, char *gridname);
+    long   HE5_GDattrinfo(hid_t gridID, const char *attrname,
+                             hid_t *ntype, hsize_t *count);
+    herr_t HE5_GDclose(hid_t fid);
+    herr_t HE5_GDcompinfo(hid_t gridID, char *fieldname, int *compcode,
+                          int compparm[]);
+    herr_t HE5_GDdetach(hid_t gridid);
+    herr_t HE5_GDfieldinfo(hid_t gridID, const char *fieldname, int *rank,
+                           hsize_t dims[], hid_t *ntype, char *dimlist,
+                           char *maxdimlist);
+    herr_t HE5_GDgridinfo(hid_t gridID, long *xdimsize, long *ydimsize,
+                          double upleftpt[], double lowrightpt[]);
+    herr_t HE5_GDij2ll(int projcode, int zonecode,
+                       double projparm[], int spherecode, long xdimsize,
+                       long ydimsize, double upleft[], double lowright[],
+                       long npts, long row[], long col[],
+                       double longititude[], double latitude[],
+                       int pixcen, int pixcnr);
+    long   HE5_GDinqattrs(hid_t gridID, char *attrnames, long *strbufsize);
+    int    HE5_GDinqdims(hid_t gridid, char *dims, hsize_t *dims);
+    int    HE5_GDinqfields(hid_t gridID, char *fieldlist, int rank[],
+                           hid_t ntype[]);
+    long   HE5_GDinqgrid(const char *filename, char *gridlist,
+                         long *strbufsize);
+    long   HE5_GDinqlocattrs(hid_t gridID, char *fieldname, char *attrnames,
+                             long *strbufsize);
+    long   HE5_GDlocattrinfo(hid_t gridID, char *fieldname, char *attrname,
+                             hid_t *ntype, hsize_t *count);
+    long   HE5_GDnentries(hid_t gridID, int entrycode, long *strbufsize);
+    hid_t  HE5_GDopen(const char *filename, uintn access);
+    herr_t HE5_GDorigininfo(hid_t gridID, int *origincode);
+    herr_t HE5_GDpixreginfo(hid_t gridID, int *pixregcode);
+    herr_t HE5_GDprojinfo(hid_t gridID, int *projcode, int *zonecode,
+                          int *spherecode, double projparm[]);
+    herr_t HE5_GDreadattr(hid_t gridID, const char* attrname, void *buffer);
+    herr_t HE5_GDreadfield(hid_t gridid, const char* fieldname,
+                           const hsize_t start[],
+                           const hsize_t stride[],
+                           const hsize_t edge[],
+                           void *buffer);
+    herr_t HE5_GDreadlocattr(hid_t gridID, const char *fieldname,
+                             const char *attrname, void *databuf);
+    herr_t HE5_GDtileinfo(hid_t gridID, char *fieldname, int *tilecode,
+                          int *tilerank, hsize_t tiledims[]);
+    herr_t HE5_EHidinfo(hid_t fid, hid_t *HDFfid, hid_t *gid);
+    /*int HE5_EHHEisHE5(char *filename);*/
+
+    hid_t  H5Dopen2(hid_t loc_id, const char *name, hid_t dapl_id);
+    hid_t  H5Dget_type(hid_t dset_id);
+    herr_t H5Dread(hid_t dset_id, hid_t mem_type_id, hid_t mem_space_id,
+                   hid_t file_space_id, hid_t plist_id, void *buf);
+    herr_t H5Dclose(hid_t dset_id);
+    htri_t H5Lexists(hid_t loc_id, const char *name, hid_t lapl_id);
+    size_t H5Tget_size(hid_t type_id);
+    herr_t H5Tclose(hid_t type_id);
+"""
+
+HE5_SOURCE = """
+    #include "HE5_HdfEosDef.h"
+"""
+
+HDF_CDEF = """
+    typedef short int int16;
+    typedef unsigned short int uint16;
+    typedef int int32;
+    typedef int intn;
+    int32 Hopen(const char *path, intn acc_mode, int16 ndds);
+    intn Hclose(int32 file_id);
+    intn SDattrinfo(int obj_id, int32 idx, char *name, int32 *dtype,
+                    int32 *count);
+    intn SDendaccess(int32 sds_id);
+    int32 SDfindattr(int32 obj_id, char *attr_name);
+    intn SDgetinfo(int32 sdsid, char *name, int32 *rank,
+                   int32 dimsizes[], int32 *datatype, int32 *nattrs);
+    int32 SDnametoindex(int32 sdid, char *sds_name);
+    int32 SDreftoindex(int32 sd_id, int32 sds_ref);
+    int32 SDselect(int32 sdid, int32 idx);
+    intn SDreadattr(int32 obj_id, int32 idx, void *buffer);
+    intn SDend(int32 fid);
+    int32 SDstart(char *filename, int32 access_mode);
+    int32 Vattach(int32 fid, int32 vgroup_ref, char *access);
+    int32 Vdetach(int32 vgroup_id);
+    intn Vend(int32 fid);
+    int32 Vfind(int32 fid, char *vgroup_name);
+    int32 Vgetname(int32 vgroup_id, char *vgroup_name);
+    int32 Vgetnamelen(int32 vgroup_id, uint16 *namelen);
+    int32 Vgettagrefs(int32 vgroup_id, int32 tags[], int32 refs[],
+                      int32 npairs);
+    int32 Vntagrefs(int32 vgroup_id);
+    intn Vstart(int32 fid);
+"""
+
+HDF_SOURCE = """
+    #include "hdf.h"
+    #include "mfhdf.h"
+"""
+
+
+def _builder(name, cdef, source, libraries):
+    """
+    Set up the out-of-line build of one extension module.
+
+    Parameters
+    ----------
+    name : str
+        extension module within pyhdfeos.lib
+    cdef, source : str
+        declarations and C source of the module
+    libraries : list
+        libraries to link against
+
+    Returns
+    -------
+    ffi : FFI
+    """
+    ffi = FFI()
+    ffi.cdef(cdef)
+    ffi.set_source('pyhdfeos.lib.' + name, source,
+                   libraries=libraries,
+                   include_dirs=config.include_dirs,
+                   library_dirs=config.library_config(libraries))
+    return ffi
+
+
+he4_ffi = _builder('_he4', HE4_CDEF, HE4_SOURCE,
+                   config.hdfeos_libs + config.hdf4_libs)
+he5_ffi = _builder('_he5', HE5_CDEF, HE5_SOURCE, config.hdfeos5_libs)
+hdf_ffi = _builder('_hdf', HDF_CDEF, HDF_SOURCE, config.hdf4_libs)
+
+
+if __name__ == '__main__':
+    topdir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, os.pardir)
+    for ffi in (he4_ffi, he5_ffi, hdf_ffi):
+        ffi.compile(tmpdir=topdir, verbose=True)
@@ -0,0 +1,36 @@
+"""
+Helpers shared by the library interfaces and the readers built on them.
+"""
+import numpy as np
+
+
+def output_buffer(out, shape, dtype):
+    """
+    Validate a caller-supplied output buffer, return it as an ndarray view.
+
+    Parameters
+    ----------
+    out : ndarray or buffer
+        writable, C-contiguous buffer to read into
+    shape : tuple
+        shape the data being read has
+    dtype : dtype
+        datatype the data being read has
+
+    Raises
+    ------
+    ValueError
+        If the output buffer is not compatible with the data.
+    """
+    buffer = np.asarray(out)
+    if buffer.dtype != dtype:
+        msg = "Output buffer has datatype {0}, but the field is {1}."
+        raise ValueError(msg.format(buffer.dtype, np.dtype(dtype)))
+    if buffer.shape != shape:
+        msg = "Output buffer has shape {0}, but {1} is required."
+        raise ValueError(msg.format(buffer.shape, shape))
+    if not buffer.flags.c_contiguous:
+        raise ValueError("Output buffer must be C-contiguous.")
+    if not buffer.flags.writeable:
+        raise ValueError("Output buffer must be writable.")
+    return buffer
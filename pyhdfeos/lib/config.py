@@ -1,4 +1,3 @@
-import binascii
 import os
 
 # HDFEOS relies on GCTP, but sometimes this library is called "Gctp" and
@@ -76,19 +75,3 @@ hdfeos_libs = ['hdfeos', true_gctp_lib]
 
 hdfeos5_libs = ['he5_hdfeos', true_gctp_lib]
 hdfeos5_libs.extend(['hdf5_hl', 'hdf5', 'z'])
-
-def _create_modulename(tag, cdef_sources, source, sys_version):
-    """
-    This is the same as CFFI's create modulename except we don't include the
-    CFFI version.
-
-    See https://caremad.io/2014/11/distributing-a-cffi-project/
-    """
-    key = '\x00'.join([sys_version[:3], source, cdef_sources])
-    key = key.encode('utf-8')
-    k1 = hex(binascii.crc32(key[0::2]) & 0xffffffff)
-    k1 = k1.lstrip('0x').rstrip('L')
-    k2 = hex(binascii.crc32(key[1::2]) & 0xffffffff)
-    k2 = k2.lstrip('0').rstrip('L')
-    return '_{0}_cffi_{1}{2}'.format(tag,k1, k2)
-
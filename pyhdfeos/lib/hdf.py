@@ -2,12 +2,9 @@
 Interface for HDF4 library.  Need this in order to access HDF-EOS2 field 
 attributes.
 """
-import sys
-
 import numpy as np
-from cffi import FFI
 
-from . import config
+from ._hdf import ffi, lib as _lib
 
 DFACC_READ = 1
 
@@ -24,54 +21,6 @@ DFNT_UINT32 = 25
 DFTAG_NDG = 720
 DFTAG_VG = 1965
 
-CDEF = """
-    typedef short int int16;
-    typedef unsigned short int uint16;
-    typedef int int32;
-    typedef int intn;
-    int32 Hopen(const char *path, intn acc_mode, int16 ndds);
-    intn Hclose(int32 file_id);
-    intn SDattrinfo(int obj_id, int32 idx, char *name, int32 *dtype,
-                    int32 *count);
-    intn SDendaccess(int32 sds_id);
-    intn SDgetinfo(int32 sdsid, char *name, int32 *rank,
-                   int32 dimsizes[], int32 *datatype, int32 *nattrs);
-    int32 SDnametoindex(int32 sdid, char *sds_name);
-    int32 SDreftoindex(int32 sd_id, int32 sds_ref);
-    int32 SDselect(int32 sdid, int32 idx);
-    intn SDreadattr(int32 obj_id, int32 idx, void *buffer);
-    intn SDend(int32 fid);
-    int32 SDstart(char *filename, int32 access_mode);
-    int32 Vattach(int32 fid, int32 vgroup_ref, char *access);
-    int32 Vdetach(int32 vgroup_id);
-    intn Vend(int32 fid);
-    int32 Vfind(int32 fid, char *vgroup_name);
-    int32 Vgetname(int32 vgroup_id, char *vgroup_name);
-    int32 Vgetnamelen(int32 vgroup_id, uint16 *namelen);
-    int32 Vgettagrefs(int32 vgroup_id, int32 tags[], int32 refs[],
-                      int32 npairs);
-    int32 Vntagrefs(int32 vgroup_id);
-    intn Vstart(int32 fid);
-"""
-
-SOURCE = """
-    #include "hdf.h"
-    #include "mfhdf.h"
-"""
-
-ffi = FFI()
-ffi.cdef(CDEF)
-
-libraries = config.hdf4_libs
-_lib = ffi.verify(SOURCE,
-                  libraries=libraries,
-                  include_dirs=config.include_dirs,
-                  library_dirs=config.library_config(libraries),
-                  modulename=config._create_modulename("_hdf4",
-                                                       CDEF,
-                                                       SOURCE,
-                                                       sys.version))
-
 
 def _handle_error(status):
     if status < 0:
@@ -115,6 +64,30 @@ def sdendaccess(sds_id):
     status = _lib.SDendaccess(sds_id)
     _handle_error(status)
 
+def sdfindattr(obj_id, attrname):
+    """Determine the index of an attribute given its name.
+
+    Parameters
+    ----------
+    obj_id : int
+        identifier of the object the attribute is attached to
+    attrname : str
+        name of the attribute
+
+    Returns
+    -------
+    idx : int
+        index of the attribute
+
+    Raises
+    ------
+    IOError
+        If the attribute does not exist.
+    """
+    idx = _lib.SDfindattr(obj_id, attrname.encode())
+    _handle_error(idx)
+    return idx
+
 def nametoindex(sdid, name):
     """Determine the index of a data set given its name.
 
@@ -3,70 +3,9 @@ import platform
 import sys
 
 import numpy as np
-from cffi import FFI
-
-from . import config 
-
-CDEF = """
-    typedef float float32;
-    typedef int int32;
-    typedef int intn;
-    typedef double float64;
-
-    intn  EHidinfo(int32 fid, int32 *hdfid, int32 *sdid);
-    int32 GDattach(int32 gdfid, char *grid);
-    intn  GDattrinfo(int32 gdfid, char *attrname, int32 *nbyte, int32
-                     *count);
-    intn  GDblkSOMoffset(int32 fid, float32 [], int32 count, char *code);
-    intn  GDdetach(int32 gid);
-    intn  GDclose(int32 fid);
-    intn  GDfieldinfo(int32 gridid, char *fieldname, int32 *rank,
-                      int32 dims[], int32 *numbertype, char *dimlist);
-    int32 GDij2ll(int32 projcode, int32 zonecode,
-                  float64 projparm[], int32 spherecode, int32 xdimsize,
-                  int32 ydimsize, float64 upleft[], float64 lowright[],
-                  int32 npts, int32 row[], int32 col[], float64
-                  longititude[], float64 latitude[], int32 pixcen,
-                  int32 pixcnr);
-    int32 GDinqattrs(int32 gridid, char *attrlist, int32 *strbufsize);
-    int32 GDinqdims(int32 gridid, char *dimname, int32 *dims);
-    int32 GDinqfields(int32 gridid, char *fieldlist, int32 rank[],
-                      int32 numbertype[]);
-    int32 GDinqgrid(char *filename, char *gridlist, int32 *strbufsize);
-    int32 GDnentries(int32 gridid, int32 entrycode, int32 *strbufsize);
-    intn  GDgridinfo(int32 gridid, int32 *xdimsize, int32 *ydimsize,
-                     float64 upleft[2], float64 lowright[2]);
-    int32 GDopen(char *name, intn access);
-    intn  GDorigininfo(int32 gridid, int32 *origincode);
-    intn  GDpixreginfo(int32 gridid, int32 *pixregcode);
-    intn  GDprojinfo(int32 gridid, int32 *projcode, int32 *zonecode,
-                     int32 *spherecode, float64 projparm[]);
-    intn  GDreadattr(int32 gridid, char* attrname, void *buffer);
-    intn  GDreadfield(int32 gridid, char* fieldname, int32 start[],
-                      int32 stride[], int32 edge[], void *buffer);
-"""
-
-SOURCE = """
-    #include "mfhdf.h"
-    #include "HdfEosDef.h"
-"""
-
-ffi = FFI()
-ffi.cdef(CDEF)
-
-libraries = config.hdfeos_libs
-libraries.extend(config.hdf4_libs)
-library_dirs = config.library_config(libraries)
-
-_lib = ffi.verify(SOURCE,
-                  ext_package='pyhdfeos',
-                  libraries=libraries,
-                  include_dirs=config.include_dirs,
-                  library_dirs=library_dirs,
-                  modulename=config._create_modulename("_hdfeos",
-                                                       CDEF,
-                                                       SOURCE,
-                                                       sys.version))
+
+from ._he4 import ffi, lib as _lib
+from ._util import output_buffer
 
 def _handle_error(status):
     if status < 0:
@@ -84,6 +23,15 @@ HDFE_GD_UR = 1
 HDFE_GD_LL = 2
 HDFE_GD_LR = 3
 DFNT_FLOAT = 5
+HDFE_NOTILE = 0
+HDFE_TILE = 1
+
+compression_dict = {0: None,
+                    1: 'rle',
+                    2: 'nbit',
+                    3: 'skphuff',
+                    4: 'deflate',
+                    5: 'szip'}
 
 number_type_dict = {
                     3: np.uint16,
@@ -241,6 +189,32 @@ def gdclose(gdfid):
     status = _lib.GDclose(gdfid)
     _handle_error(status)
 
+def gdcompinfo(grid_id, fieldname):
+    """Return compression information for a field.
+
+    This function wraps the HDF-EOS GDcompinfo library function.
+
+    Parameters
+    ----------
+    grid_id : int
+        grid identifier
+    fieldname : str
+        field name
+
+    Returns
+    -------
+    compcode : int
+        compression method, see compression_dict
+    compparm : tuple
+        compression parameters
+    """
+    compcodep = ffi.new("int32 *")
+    compparmp = ffi.new("intn []", 5)
+    status = _lib.GDcompinfo(grid_id, fieldname.encode(), compcodep,
+                             compparmp)
+    _handle_error(status)
+    return compcodep[0], tuple(compparmp)
+
 def gddetach(grid_id):
     """Detach from grid structure.
 
@@ -710,7 +684,8 @@ def gdreadattr(gridid, attrname):
     _handle_error(status)
     return buffer
 
-def gdreadfield(gridid, fieldname, start, stride, edge):
+def gdreadfield(gridid, fieldname, start, stride, edge, out=None,
+                ntype=None):
     """read data from grid field
 
     This function wraps the HDF-EOS library GDreadfield function.
@@ -727,6 +702,13 @@ def gdreadfield(gridid, fieldname, start, stride, edge):
         specifies number of values to skip along each dimension
     edge : array-like
         specifies number of values to read along each dimension
+    out : ndarray or memoryview, optional
+        writable, C-contiguous buffer with the shape given by edge and the
+        datatype of the field.  If provided, the data is read directly into
+        it rather than into a newly allocated array.
+    ntype : int, optional
+        number type of the field.  If not provided, it is looked up with an
+        extra call to gdfieldinfo.
 
     Returns
     -------
@@ -737,10 +719,18 @@ def gdreadfield(gridid, fieldname, start, stride, edge):
     ------
     IOError
         If associated library routine fails.
+    ValueError
+        If the output buffer is not compatible with the requested data.
     """
-    _, ntype, _  = gdfieldinfo(gridid, fieldname)
+    if ntype is None:
+        ntype = gdfieldinfo(gridid, fieldname)[1]
+    if not isinstance(fieldname, bytes):
+        fieldname = fieldname.encode()
     shape = tuple([int(x) for x in edge])
-    buffer = np.zeros(shape, dtype=number_type_dict[ntype])
+    if out is None:
+        buffer = np.empty(shape, dtype=number_type_dict[ntype])
+    else:
+        buffer = output_buffer(out, shape, number_type_dict[ntype])
     pbuffer = ffi.cast(cast_string_dict[ntype], buffer.ctypes.data)
 
     startp = ffi.new("int32 []", len(shape))
@@ -752,10 +742,40 @@ def gdreadfield(gridid, fieldname, start, stride, edge):
         stridep[j] = int(stride[j])
         edgep[j] = int(edge[j])
 
-    status = _lib.GDreadfield(gridid, fieldname.encode(), startp, stridep,
+    status = _lib.GDreadfield(gridid, fieldname, startp, stridep,
                               edgep, pbuffer)
     _handle_error(status)
     return buffer
 
+def gdtileinfo(grid_id, fieldname):
+    """Return tiling information for a field.
+
+    This function wraps the HDF-EOS GDtileinfo library function.
+
+    Parameters
+    ----------
+    grid_id : int
+        grid identifier
+    fieldname : str
+        field name
 
+    Returns
+    -------
+    tilecode : int
+        HDFE_TILE if the field is tiled, HDFE_NOTILE otherwise
+    tiledims : tuple
+        dimensions of a tile, empty if the field is not tiled
+    """
+    tilecodep = ffi.new("int32 *")
+    tilerankp = ffi.new("int32 *")
+
+    # Same assumption as in gdfieldinfo, no more than 8 dimensions.
+    tiledims = np.zeros(8, dtype=np.int32)
+    tiledimsp = ffi.cast("int32 *", tiledims.ctypes.data)
+    status = _lib.GDtileinfo(grid_id, fieldname.encode(), tilecodep,
+                             tilerankp, tiledimsp)
+    _handle_error(status)
 
+    if tilecodep[0] == HDFE_NOTILE:
+        return HDFE_NOTILE, ()
+    return tilecodep[0], tuple(int(x) for x in tiledims[:tilerankp[0]])
@@ -2,84 +2,38 @@ import os
 import platform
 import sys
 
-from cffi import FFI
 import numpy as np
 
-from . import config
-
-CDEF = """
-    typedef unsigned uintn;
-    typedef unsigned long long hsize_t;
-    typedef int hid_t;
-    typedef int herr_t;
-
-    hid_t  HE5_GDattach(hid_t fid, char *gridname);
-    long   HE5_GDattrinfo(hid_t gridID, const char *attrname,
-                             hid_t *ntype, hsize_t *count);
-    herr_t HE5_GDclose(hid_t fid);
-    herr_t HE5_GDdetach(hid_t gridid);
-    herr_t HE5_GDfieldinfo(hid_t gridID, const char *fieldname, int *rank,
-                           hsize_t dims[], hid_t *ntype, char *dimlist,
-                           char *maxdimlist);
-    herr_t HE5_GDgridinfo(hid_t gridID, long *xdimsize, long *ydimsize,
-                          double upleftpt[], double lowrightpt[]);
-    herr_t HE5_GDij2ll(int projcode, int zonecode,
-                       double projparm[], int spherecode, long xdimsize,
-                       long ydimsize, double upleft[], double lowright[],
-                       long npts, long row[], long col[],
-                       double longititude[], double latitude[],
-                       int pixcen, int pixcnr);
-    long   HE5_GDinqattrs(hid_t gridID, char *attrnames, long *strbufsize);
-    int    HE5_GDinqdims(hid_t gridid, char *dims, hsize_t *dims);
-    int    HE5_GDinqfields(hid_t gridID, char *fieldlist, int rank[],
-                           hid_t ntype[]);
-    long   HE5_GDinqgrid(const char *filename, char *gridlist,
-                         long *strbufsize);
-    long   HE5_GDinqlocattrs(hid_t gridID, char *fieldname, char *attrnames,
-                             long *strbufsize);
-    long   HE5_GDlocattrinfo(hid_t gridID, char *fieldname, char *attrname,
-                             hid_t *ntype, hsize_t *count);
-    long   HE5_GDnentries(hid_t gridID, int entrycode, long *strbufsize);
-    hid_t  HE5_GDopen(const char *filename, uintn access);
-    herr_t HE5_GDorigininfo(hid_t gridID, int *origincode);
-    herr_t HE5_GDpixreginfo(hid_t gridID, int *pixregcode);
-    herr_t HE5_GDprojinfo(hid_t gridID, int *projcode, int *zonecode,
-                          int *spherecode, double projparm[]);
-    herr_t HE5_GDreadattr(hid_t gridID, const char* attrname, void *buffer);
-    herr_t HE5_GDreadfield(hid_t gridid, const char* fieldname,
-                           const hsize_t start[],
-                           const hsize_t stride[],
-                           const hsize_t edge[],
-                           void *buffer);
-    herr_t HE5_GDreadlocattr(hid_t gridID, const char *fieldname,
-                             const char *attrname, void *databuf);
-    /*int HE5_EHHEisHE5(char *filename);*/
-"""
-
-SOURCE = """
-    #include "HE5_HdfEosDef.h"
-"""
-
-ffi = FFI()
-ffi.cdef(CDEF)
-
-libraries = config.hdfeos5_libs
-library_dirs = config.library_config(libraries)
-
-_lib = ffi.verify(SOURCE,
-                  ext_package='pyhdfeos',
-                  libraries=libraries,
-                  include_dirs=config.include_dirs,
-                  library_dirs=library_dirs,
-                  modulename=config._create_modulename("_hdfeos5",
-                                                       CDEF,
-                                                       SOURCE,
-                                                       sys.version))
+from ._he5 import ffi, lib as _lib
+from ._util import output_buffer
 
 H5F_ACC_RDONLY = 0x0000
+H5P_DEFAULT = 0
+H5S_ALL = 0
 
 HE5_HDFE_NENTDIM = 0
 HE5_HDFE_NENTDFLD = 4
+HE5_HDFE_NOTILE = 0
+HE5_HDFE_TILE = 1
+
+compression_dict = {0: None,
+                    1: 'rle',
+                    2: 'nbit',
+                    3: 'skphuff',
+                    4: 'deflate',
+                    5: 'szip_chip',
+                    6: 'szip_k13',
+                    7: 'szip_ec',
+                    8: 'szip_nn',
+                    9: 'szip_k13orec',
+                    10: 'szip_k13ornn',
+                    11: 'shuf_deflate',
+                    12: 'shuf_szip_chip',
+                    13: 'shuf_szip_k13',
+                    14: 'shuf_szip_ec',
+                    15: 'shuf_szip_nn',
+                    16: 'shuf_szip_k13orec',
+                    17: 'shuf_szip_k13ornn'}
 
 number_type_dict = {0: np.int32,
                     1: np.uint32,
@@ -113,6 +67,55 @@ def _handle_error(status):
     if status < 0:
         raise IOError("Library routine failed.")
 
+def ehreadstructmetadata(fid):
+    """Read the StructMetadata ODL text of a file.
+
+    The text is stored in the "/HDFEOS INFORMATION/StructMetadata.N"
+    datasets, which are read with the HDF5 library and concatenated.
+
+    Parameters
+    ----------
+    fid : int
+        file identifier
+
+    Returns
+    -------
+    text : str
+        structural metadata
+
+    Raises
+    ------
+    IOError
+        If associated library routine fails.
+    """
+    hdffidp = ffi.new("hid_t *")
+    gidp = ffi.new("hid_t *")
+    status = _lib.HE5_EHidinfo(fid, hdffidp, gidp)
+    _handle_error(status)
+
+    parts = []
+    while True:
+        name = "/HDFEOS INFORMATION/StructMetadata.{0}".format(len(parts))
+        name = name.encode()
+        if parts and _lib.H5Lexists(hdffidp[0], name, H5P_DEFAULT) <= 0:
+            break
+        dset_id = _lib.H5Dopen2(hdffidp[0], name, H5P_DEFAULT)
+        _handle_error(dset_id)
+        try:
+            type_id = _lib.H5Dget_type(dset_id)
+            _handle_error(type_id)
+            try:
+                buffer = ffi.new("char[]", _lib.H5Tget_size(type_id) + 1)
+                status = _lib.H5Dread(dset_id, type_id, H5S_ALL, H5S_ALL,
+                                      H5P_DEFAULT, buffer)
+                _handle_error(status)
+            finally:
+                _lib.H5Tclose(type_id)
+        finally:
+            _lib.H5Dclose(dset_id)
+        parts.append(ffi.string(buffer).decode('ascii'))
+    return ''.join(parts)
+
 def gdattach(gdfid, gridname):
     """Attach to an existing grid within the file.
 
@@ -170,6 +173,32 @@ def gdclose(fid):
     status = _lib.HE5_GDclose(fid)
     _handle_error(status)
 
+def gdcompinfo(grid_id, fieldname):
+    """Return compression information for a field.
+
+    This function wraps the HDF-EOS5 HE5_GDcompinfo library function.
+
+    Parameters
+    ----------
+    grid_id : int
+        grid identifier
+    fieldname : str
+        field name
+
+    Returns
+    -------
+    compcode : int
+        compression method, see compression_dict
+    compparm : tuple
+        compression parameters
+    """
+    compcodep = ffi.new("int *")
+    compparmp = ffi.new("int []", 5)
+    status = _lib.HE5_GDcompinfo(grid_id, fieldname.encode(), compcodep,
+                                 compparmp)
+    _handle_error(status)
+    return compcodep[0], tuple(compparmp)
+
 def gddetach(grid_id):
     """Detach from grid structure.
 
@@ -698,7 +727,8 @@ def gdreadlocattr(gridid, fieldname, attrname):
     return buffer
 
 
-def gdreadfield(gridid, fieldname, start, stride, edge):
+def gdreadfield(gridid, fieldname, start, stride, edge, out=None,
+                ntype=None):
     """read data from grid field
 
     This function wraps the HDF-EOS5 library HE5_GDreadfield function.
@@ -715,15 +745,35 @@ def gdreadfield(gridid, fieldname, start, stride, edge):
         specifies number of values to skip along each dimension
     edge : array-like
         specifies number of values to read along each dimension
+    out : ndarray or memoryview, optional
+        writable, C-contiguous buffer with the shape given by edge and the
+        datatype of the field.  If provided, the data is read directly into
+        it rather than into a newly allocated array.
+    ntype : int, optional
+        number type of the field.  If not provided, it is looked up with an
+        extra call to gdfieldinfo.
 
     Returns
     -------
     data : ndarray
         data read from field
+
+    Raises
+    ------
+    IOError
+        If associated library routine fails.
+    ValueError
+        If the output buffer is not compatible with the requested data.
     """
-    _, ntype, _, _  = gdfieldinfo(gridid, fieldname)
+    if ntype is None:
+        ntype = gdfieldinfo(gridid, fieldname)[1]
+    if not isinstance(fieldname, bytes):
+        fieldname = fieldname.encode()
     shape = tuple([int(x) for x in edge])
-    buffer = np.zeros(shape, dtype=number_type_dict[ntype])
+    if out is None:
+        buffer = np.empty(shape, dtype=number_type_dict[ntype])
+    else:
+        buffer = output_buffer(out, shape, number_type_dict[ntype])
     pbuffer = ffi.cast(cast_string_dict[ntype], buffer.ctypes.data)
 
     startp = ffi.new("const hsize_t []", len(shape))
@@ -735,8 +785,38 @@ def gdreadfield(gridid, fieldname, start, stride, edge):
         stridep[j] = np.uint64(stride[j])
         edgep[j] = np.uint64(edge[j])
 
-    status = _lib.HE5_GDreadfield(gridid, fieldname.encode(), startp, stridep,
+    status = _lib.HE5_GDreadfield(gridid, fieldname, startp, stridep,
                                   edgep, pbuffer)
     _handle_error(status)
     return buffer
 
+def gdtileinfo(grid_id, fieldname):
+    """Return tiling (chunking) information for a field.
+
+    This function wraps the HDF-EOS5 HE5_GDtileinfo library function.
+
+    Parameters
+    ----------
+    grid_id : int
+        grid identifier
+    fieldname : str
+        field name
+
+    Returns
+    -------
+    tilecode : int
+        HE5_HDFE_TILE if the field is tiled, HE5_HDFE_NOTILE otherwise
+    tiledims : tuple
+        dimensions of a tile, empty if the field is not tiled
+    """
+    tilecodep = ffi.new("int *")
+    tilerankp = ffi.new("int *")
+    tiledimsp = ffi.new("hsize_t []", 8)
+    status = _lib.HE5_GDtileinfo(grid_id, fieldname.encode(), tilecodep,
+                                 tilerankp, tiledimsp)
+    _handle_error(status)
+
+    if tilecodep[0] == HE5_HDFE_NOTILE:
+        return HE5_HDFE_NOTILE, ()
+    return tilecodep[0], tuple(int(tiledimsp[j])
+                               for j in range(tilerankp[0]))
@@ -4,16 +4,19 @@ import re
 import sys
 
 from Cython.Build import cythonize
-import cffi
 import numpy
 
-import pyhdfeos
-include_dirs = pyhdfeos.lib.config.include_dirs
-library_dirs = pyhdfeos.lib.config.library_dir_candidates
+# The package itself cannot be imported before its extension modules are
+# built, so the library search paths are taken from its config module alone.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'pyhdfeos', 'lib'))
+import config
+include_dirs = config.include_dirs
+library_dirs = config.library_dir_candidates
 
 # We need to locate libGctp (libgctp if on a debian variant) in order to 
 # compile the som grid extension module.
-true_gctp_lib = pyhdfeos.lib.config.locate_gctp(library_dirs)
+true_gctp_lib = config.locate_gctp(library_dirs)
 if true_gctp_lib is None:
     msg = "Could not locate the gctp library.  Please specify a location with "
     msg += "the INCLUDE_DIRS and LIBRARY_DIRS environment variables as "
@@ -21,20 +24,22 @@ if true_gctp_lib is None:
     raise RuntimeError(msg)
 
 # Three CFFI extension modules, one for HDF-EOS, one for HDF-EOS5, and one
-# for augmenting HDF-EOS with HDF4.
-ext_modules = [pyhdfeos.lib.he4.ffi.verifier.get_extension(),
-               pyhdfeos.lib.he5.ffi.verifier.get_extension(),
-               pyhdfeos.lib.hdf.ffi.verifier.get_extension()]
+# for augmenting HDF-EOS with HDF4.  They are compiled out-of-line from the
+# builders in pyhdfeos/lib/_build.py.
+cffi_modules = ['pyhdfeos/lib/_build.py:he4_ffi',
+                'pyhdfeos/lib/_build.py:he5_ffi',
+                'pyhdfeos/lib/_build.py:hdf_ffi']
 
+ext_modules = []
 from distutils.extension import Extension
 cythonize("pyhdfeos/_som.pyx")
-e = Extension("pyhdfeos/_som", ["pyhdfeos/_som.c"],
+e = Extension("pyhdfeos._som", ["pyhdfeos/_som.c"],
         include_dirs = include_dirs,
         libraries    = [true_gctp_lib],
         library_dirs = library_dirs)
 ext_modules.append(e)
 
-install_requires = ['numpy>=1.8.0', 'cffi>=0.8.2', 'cython>=0.20']
+install_requires = ['numpy>=1.8.0', 'cffi>=1.0.0', 'cython>=0.20']
 if sys.hexversion < 0x03000000:
     install_requires.append('mock>=1.0.1')
 
@@ -62,8 +67,9 @@ setup(name             = 'pyhdfeos',
       packages         = ['pyhdfeos', 'pyhdfeos.lib'],
       version          = '0.1.1',
       zip_safe         =  False,
-      ext_package      = 'pyhdfeos',
       ext_modules      = ext_modules,
+      cffi_modules     = cffi_modules,
+      setup_requires   = ['cffi>=1.0.0'],
       include_dirs     = [numpy.get_include()],
       entry_points     = entry_points,
       install_requires = install_requires,
@@ -0,0 +1,65 @@
+import gc
+import unittest
+
+import numpy as np
+
+from pyhdfeos._buffers import BufferPool
+
+
+class TestBufferPool(unittest.TestCase):
+
+    def test_reuse(self):
+        """
+        a buffer is handed out again once nothing refers to it
+        """
+        pool = BufferPool()
+        buffer = pool.get((4, 5), np.float32)
+        address = buffer.ctypes.data
+        del buffer
+        gc.collect()
+        buffer = pool.get((4, 5), np.float32)
+        self.assertEqual(buffer.ctypes.data, address)
+        self.assertEqual(buffer.shape, (4, 5))
+        self.assertEqual(buffer.dtype, np.float32)
+        self.assertTrue(buffer.flags.c_contiguous)
+        self.assertTrue(buffer.flags.writeable)
+
+    def test_views_keep_buffer(self):
+        """
+        a buffer is not reused while a view of it is alive
+        """
+        pool = BufferPool()
+        buffer = pool.get((4, 5), np.float32)
+        buffer[...] = 1
+        view = np.moveaxis(buffer[1:, ::2], 0, 1)
+        del buffer
+        gc.collect()
+        other = pool.get((4, 5), np.float32)
+        other[...] = 2
+        np.testing.assert_array_equal(view, 1)
+
+    def test_keys(self):
+        """
+        buffers are only reused for the same shape and datatype
+        """
+        pool = BufferPool()
+        address = pool.get((4, 5), np.float32).ctypes.data
+        gc.collect()
+        for shape, dtype in (((5, 4), np.float32), ((4, 5), np.int32)):
+            buffer = pool.get(shape, dtype)
+            self.assertEqual(buffer.shape, shape)
+            self.assertEqual(buffer.dtype, dtype)
+            self.assertNotEqual(buffer.ctypes.data, address)
+
+    def test_limits(self):
+        """
+        large buffers and those beyond per_key are not pooled
+        """
+        pool = BufferPool(maxbytes=1000, per_key=2)
+        self.assertEqual(pool.get((1000,), np.float64).shape, (1000,))
+        self.assertEqual(pool._nbytes, 0)
+        held = [pool.get((10,), np.float64) for _ in range(3)]
+        self.assertEqual(pool._nbytes, 160)
+        del held
+        pool.clear()
+        self.assertEqual(pool._nbytes, 0)
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from pyhdfeos._coordcache import CoordinateCache, grid_key
+
+
+def _definition(**kwargs):
+    args = dict(projcode=1, zonecode=40, spherecode=0,
+                projparms=np.zeros(13), xdimsize=120, ydimsize=200,
+                upleft=np.array([210584.50041, 3322395.95445]),
+                lowright=np.array([813931.10959, 2214162.53278]),
+                pixregcode=0, origincode=0)
+    args.update(kwargs)
+    return grid_key(**args)
+
+
+class TestGridKey(unittest.TestCase):
+
+    def test_stable(self):
+        """
+        equal definitions hash alike, whatever their array types
+        """
+        self.assertEqual(_definition(), _definition())
+        self.assertEqual(_definition(projparms=[0] * 13), _definition())
+
+    def test_sensitive(self):
+        key = _definition()
+        self.assertNotEqual(_definition(zonecode=41), key)
+        self.assertNotEqual(_definition(xdimsize=200, ydimsize=120), key)
+        self.assertNotEqual(_definition(pixregcode=1), key)
+        self.assertNotEqual(_definition(offsets=np.zeros(179)), key)
+        parms = np.zeros(13)
+        parms[4] = 1.0
+        self.assertNotEqual(_definition(projparms=parms), key)
+
+
+class TestCoordinateCache(unittest.TestCase):
+
+    def arrays(self, n):
+        return (np.zeros(n), np.ones(n))
+
+    def test_get_put(self):
+        cache = CoordinateCache()
+        self.assertIsNone(cache.get('a'))
+        arrays = cache.put('a', self.arrays(10))
+        self.assertIs(cache.get('a'), arrays)
+        self.assertFalse(arrays[0].flags.writeable)
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses, info.currbytes),
+                         (1, 1, 160))
+
+    def test_lru_eviction(self):
+        """
+        the least recently used entries go once the cache is full
+        """
+        cache = CoordinateCache(maxbytes=480)
+        for key in 'abc':
+            cache.put(key, self.arrays(10))
+        cache.get('a')
+        cache.put('d', self.arrays(10))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.info().evictions, 1)
+        self.assertEqual(len(cache), 3)
+
+    def test_too_large(self):
+        cache = CoordinateCache(maxbytes=100)
+        arrays = cache.put('a', self.arrays(10))
+        self.assertTrue(arrays[0].flags.writeable)
+        self.assertEqual(len(cache), 0)
+
+    def test_shrink_and_clear(self):
+        cache = CoordinateCache()
+        cache.put('a', self.arrays(10))
+        cache.put('b', self.arrays(10))
+        cache.maxbytes = 200
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.currbytes, 160)
+        cache.clear()
+        self.assertEqual((len(cache), cache.currbytes), (0, 0))
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from pyhdfeos._decode import decode, decode_params
+
+
+class TestDecode(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = np.arange(-3, 17, dtype=np.int16).reshape(4, 5)
+
+    def test_conventions(self):
+        """
+        scale and offset are applied the HDF4 or the CF way
+        """
+        hdf4 = decode(self.raw, scale=0.5, offset=4.0, convention='hdf4')
+        cf = decode(self.raw, scale=0.5, offset=4.0, convention='cf')
+        np.testing.assert_allclose(hdf4, 0.5 * (self.raw - 4.0))
+        np.testing.assert_allclose(cf, self.raw * 0.5 + 4.0)
+        self.assertEqual(hdf4.dtype, np.float32)
+
+    def test_fill_value(self):
+        """
+        fill values become NaN, or are masked
+        """
+        nans = decode(self.raw, fill=7, scale=2.0, dtype=np.float64)
+        masked = decode(self.raw, fill=7, scale=2.0, masked=True)
+        isfill = self.raw == 7
+        np.testing.assert_array_equal(np.isnan(nans), isfill)
+        np.testing.assert_array_equal(nans[~isfill], 2.0 * self.raw[~isfill])
+        np.testing.assert_array_equal(np.ma.getmaskarray(masked), isfill)
+
+    def test_blocks(self):
+        """
+        the result does not depend on the block size
+        """
+        expected = decode(self.raw, fill=0, scale=3.0, offset=1.0)
+        for block in (1, 3, 7, 1000):
+            actual = decode(self.raw, fill=0, scale=3.0, offset=1.0,
+                            block=block)
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_non_contiguous(self):
+        actual = decode(self.raw.T, offset=1.0)
+        np.testing.assert_array_equal(actual, self.raw.T + 1.0)
+
+    def test_in_place(self):
+        """
+        data of the target datatype is decoded in place
+        """
+        raw = self.raw.astype(np.float32)
+        actual = decode(raw, fill=-3, scale=2.0)
+        self.assertIs(actual, raw)
+        self.assertTrue(np.isnan(actual[0, 0]))
+        self.assertEqual(actual[0, 1], -4.0)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            decode(self.raw, dtype=np.int32)
+        with self.assertRaises(ValueError):
+            decode(self.raw, convention='netcdf')
+
+    def test_decode_params(self):
+        attrs = {'_FillValue': np.array([-9999], dtype=np.int16),
+                 'scale_factor': np.array([0.01]),
+                 'units': 'K'}
+        fill, scale, offset = decode_params(attrs)
+        self.assertEqual(fill, -9999)
+        self.assertEqual(scale, 0.01)
+        self.assertIsNone(offset)
+        self.assertEqual(decode_params({'scale_factor': 'none'}),
+                         (None, None, None))
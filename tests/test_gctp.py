@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from pyhdfeos import _gctp
+
+
+def _inverse(projcode, zonecode, projparms, spherecode, x, y):
+    """
+    Longitude and latitude of a single point given in projected meters.
+
+    The point is the center of the only pixel of a 1x1 grid.
+    """
+    parms = np.zeros(13)
+    parms[:len(projparms)] = projparms
+    upleft = np.array([x - 1.0, y + 1.0])
+    lowright = np.array([x + 1.0, y - 1.0])
+    return _gctp.ij2ll(projcode, zonecode, parms, spherecode, 1, 1, upleft,
+                       lowright, 0, 0, 0, 0)
+
+
+class TestInverse(unittest.TestCase):
+    """
+    Inverse projections against published values.
+
+    Unless noted otherwise, the expected values are the worked examples of
+    Snyder, Map Projections: A Working Manual (USGS Professional Paper
+    1395), which GCTP implements.
+    """
+    def check(self, coords, lon, lat, atol=1e-6):
+        self.assertIsNotNone(coords)
+        np.testing.assert_allclose(coords[0], lon, rtol=0, atol=atol)
+        np.testing.assert_allclose(coords[1], lat, rtol=0, atol=atol)
+
+    def test_utm(self):
+        # Transverse Mercator on Clarke 1866, zone 18 (central meridian
+        # 75W).
+        coords = _inverse(1, 18, [], 0, 627106.5, 4484124.4)
+        self.check(coords, -73.5, 40.5)
+
+    def test_albers(self):
+        # Clarke 1866, standard parallels 29.5N and 45.5N, origin 23N 96W.
+        parms = [0, 0, 29030000.0, 45030000.0, -96000000.0, 23000000.0]
+        coords = _inverse(3, 0, parms, 0, 1885472.7, 1535925.0)
+        self.check(coords, -75.0, 35.0)
+
+    def test_polar_stereographic(self):
+        # International 1909, true scale at 71S, central meridian 100W.
+        parms = [0, 0, 0, 0, -100000000.0, -71000000.0]
+        coords = _inverse(6, 0, parms, 4, -1540033.6, -560526.4)
+        self.check(coords, 150.0, -75.0)
+
+    def test_sinusoidal(self):
+        # Upper left corner of MODIS tile h08v05.
+        coords = _inverse(16, 0, [6371007.181], -1, -11119505.196667,
+                          4447802.078667)
+        self.check(coords, -100.0 / np.cos(np.radians(40.0)), 40.0)
+
+    def test_cea(self):
+        # Northern edge of the global EASE-Grid 2.0 (WGS 84, true scale at
+        # 30 degrees).
+        parms = [0, 0, 0, 0, 0, 30000000.0]
+        coords = _inverse(97, 0, parms, 12, 0.0, 7314540.83)
+        self.check(coords, 0.0, 85.0445664)
+
+    def test_geographic(self):
+        upleft = np.array([-10000000.0, 30030000.0])
+        lowright = np.array([20000000.0, 20000000.0])
+        lon, lat = _gctp.ij2ll(0, 0, np.zeros(13), -1, 60, 42, upleft,
+                               lowright, np.arange(3)[:, np.newaxis],
+                               np.arange(2), 1, 0)
+        self.assertEqual(lon.shape, (3, 2))
+        np.testing.assert_allclose(lon[0], [-10.0, -9.5])
+        np.testing.assert_allclose(lat[:, 0], [30.5, 30.25, 30.0])
+
+    def test_unsupported(self):
+        self.assertIsNone(_inverse(9, 0, [], 0, 0.0, 0.0))
+        self.assertFalse(_gctp.supports(9, 0, np.zeros(13)))
+        self.assertTrue(_gctp.supports(0, -1, np.zeros(13)))
+        self.assertTrue(_gctp.supports(1, 0, np.zeros(13)))
+        # A user-defined spheroid needs its semi-major axis.
+        self.assertFalse(_gctp.supports(1, -1, np.zeros(13)))
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_dms2deg(self):
+        self.assertAlmostEqual(_gctp.dms2deg(123030045.0), 123.5125)
+        self.assertAlmostEqual(_gctp.dms2deg(-71000000.0), -71.0)
+
+    def test_pixel_adjustment(self):
+        self.assertEqual(_gctp.pixel_adjustment(0, 3), (0.5, 0.5))
+        self.assertEqual(_gctp.pixel_adjustment(1, 3), (1.0, 1.0))
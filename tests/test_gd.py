@@ -1,12 +1,26 @@
+import gc
 import os
+import pickle
 import pkg_resources as pkg
+import shutil
+import subprocess
+import sys
 import tempfile
+import textwrap
+import threading
 import unittest
 
 import numpy as np
+try:
+    import dask
+    _HAVE_DASK = True
+except ImportError:
+    _HAVE_DASK = False
 
-from pyhdfeos.lib import he4
-from pyhdfeos import GridFile
+from pyhdfeos.lib import he4, he5
+from pyhdfeos import GridFile, ReaderPool, coordinate_cache
+from pyhdfeos import _gctp, _parallel, _structmetadata
+from pyhdfeos._handles import handle_pool, sniff_format
 
 from . import fixtures
 
@@ -37,6 +51,259 @@ class TestReadGridCoords(unittest.TestCase):
         np.testing.assert_array_equal(lon4, lon5)
         np.testing.assert_array_equal(lat4, lat5)
 
+    def test_vectorized_file_grids(self):
+        """
+        NumPy inverse projections agree with GDij2ll on the test grids
+        """
+        for filename in (self.test_driver_gridfile4,
+                         self.test_driver_gridfile5):
+            with GridFile(filename) as gdf:
+                for grid in gdf.grids.values():
+                    self.assertIn(grid.projcode, _gctp.PROJECTIONS)
+                    lat, lon = grid[:]
+                    cols, rows = np.meshgrid(np.arange(grid.xdimsize),
+                                             np.arange(grid.ydimsize))
+                    elon, elat = grid._he.gdij2ll(grid.projcode,
+                                                  grid.zonecode,
+                                                  grid.projparms,
+                                                  grid.spherecode,
+                                                  grid.xdimsize,
+                                                  grid.ydimsize,
+                                                  grid.upleft,
+                                                  grid.lowright,
+                                                  rows.astype(np.int32),
+                                                  cols.astype(np.int32),
+                                                  grid.pixregcode,
+                                                  grid.origincode)
+                    np.testing.assert_allclose(lat, elat, rtol=0, atol=1e-9)
+                    np.testing.assert_allclose(lon, elon, rtol=0, atol=1e-9)
+
+    def test_vectorized_projections(self):
+        """
+        NumPy inverse projections agree with GDij2ll for each projection
+        """
+        def parms(**kwargs):
+            projparms = np.zeros(13, dtype=np.float64)
+            for idx, value in kwargs.items():
+                projparms[int(idx[1:])] = value
+            return projparms
+
+        # projcode, zonecode, spherecode, projparms, upleft, lowright
+        cases = [(0, 0, 0, parms(),
+                  (-180000000.0, 90000000.0), (180000000.0, -90000000.0)),
+                 (1, 12, 0, parms(),
+                  (210584.50041, 3322395.95445),
+                  (813931.10959, 2214162.53278)),
+                 (3, 0, 8, parms(p2=29030000.0, p3=45030000.0,
+                                 p4=-96000000.0, p5=23000000.0),
+                  (-2361915.0, 3177716.0), (2263815.0, 259416.0)),
+                 (6, 0, 12, parms(p4=-45000000.0, p5=70000000.0),
+                  (-3850000.0, 5850000.0), (3750000.0, -5350000.0)),
+                 (11, 0, -1, parms(p0=6371228.0, p5=90000000.0),
+                  (-6000000.0, 6000000.0), (6000000.0, -6000000.0)),
+                 (16, 0, -1, parms(p0=6371007.181),
+                  (-11119505.196667, 4447802.078667),
+                  (-10007554.677, 3335851.559)),
+                 (97, 0, -1, parms(p0=6371228.0, p1=6371228.0,
+                                   p5=30000000.0),
+                  (-17334193.94, 7338939.46), (17334193.94, -7338939.46))]
+        xdimsize, ydimsize = 40, 30
+        cols, rows = np.meshgrid(np.arange(xdimsize), np.arange(ydimsize))
+        rows = rows.astype(np.int32)
+        cols = cols.astype(np.int32)
+        for projcode, zonecode, spherecode, projparms, ul, lr in cases:
+            upleft = np.array(ul)
+            lowright = np.array(lr)
+            for pixregcode, origincode in [(0, 0), (1, 0), (1, 1), (1, 2),
+                                           (1, 3)]:
+                args = (projcode, zonecode, projparms, spherecode,
+                        xdimsize, ydimsize, upleft, lowright)
+                coords = _gctp.ij2ll(*(args + (rows, cols, pixregcode,
+                                               origincode)))
+                self.assertIsNotNone(coords)
+                elon, elat = he4.gdij2ll(*(args + (rows, cols, pixregcode,
+                                                   origincode)))
+                np.testing.assert_allclose(coords[0], elon, rtol=0,
+                                           atol=1e-9)
+                np.testing.assert_allclose(coords[1], elat, rtol=0,
+                                           atol=1e-9)
+
+    def test_sparse_coords(self):
+        """
+        geographic coordinates as a latitude column and a longitude row
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            grid = gdf.grids['GEOGrid']
+            lat, lon = grid.coords(sparse=True)
+            self.assertEqual(lat.shape, (grid.ydimsize, 1))
+            self.assertEqual(lon.shape, (1, grid.xdimsize))
+            elat, elon = grid[:]
+            np.testing.assert_array_equal(np.broadcast_arrays(lat, lon)[0],
+                                          elat)
+            np.testing.assert_array_equal(np.broadcast_arrays(lat, lon)[1],
+                                          elon)
+
+            lat, lon = grid.coords((2, slice(1, 5)), sparse=True)
+            elat, elon = grid[2, 1:5]
+            np.testing.assert_array_equal(lat + np.zeros_like(lon), elat)
+            np.testing.assert_array_equal(lon + np.zeros_like(lat), elon)
+
+            with self.assertRaises(ValueError):
+                gdf.grids['UTMGrid'].coords(sparse=True)
+
+    def test_transform_and_xy(self):
+        """
+        projected coordinates from the affine transform of the grid
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            grid = gdf.grids['UTMGrid']
+            a, b, c, d, e, f = grid.transform
+            self.assertEqual((b, d), (0.0, 0.0))
+            self.assertAlmostEqual(a, (grid.lowright[0] - grid.upleft[0]) /
+                                   grid.xdimsize)
+            self.assertAlmostEqual(e, (grid.lowright[1] - grid.upleft[1]) /
+                                   grid.ydimsize)
+
+            x, y = grid.xy()
+            self.assertEqual(x.shape, (grid.xdimsize,))
+            self.assertEqual(y.shape, (grid.ydimsize,))
+            np.testing.assert_allclose(x, a * np.arange(grid.xdimsize) + c)
+            np.testing.assert_allclose(y, e * np.arange(grid.ydimsize) + f)
+
+            x, y = grid.xy((slice(10, 20, 2), 7))
+            np.testing.assert_allclose(x, [a * 7 + c])
+            np.testing.assert_allclose(y, e * np.arange(10, 20, 2) + f)
+
+            # Geographic x and y are longitude and latitude.
+            grid = gdf.grids['GEOGrid']
+            lat, lon = grid[:]
+            x, y = grid.xy()
+            np.testing.assert_allclose(x, lon[0], rtol=0, atol=1e-9)
+            np.testing.assert_allclose(y, lat[:, 0], rtol=0, atol=1e-9)
+
+    def test_coordinate_cache(self):
+        """
+        coordinates are shared by grids with the same definition
+        """
+        maxbytes = coordinate_cache.maxbytes
+        coordinate_cache.clear()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with GridFile(self.test_driver_gridfile4) as gdf:
+                info = coordinate_cache.info()
+                lat, lon = gdf.grids['UTMGrid'][:]
+                self.assertEqual(coordinate_cache.info().misses,
+                                 info.misses + 1)
+                self.assertFalse(lat.flags.writeable)
+                self.assertFalse(lon.flags.writeable)
+                with self.assertRaises(ValueError):
+                    lat[0, 0] = 0
+
+            # The same grid of another file is found in the cache.
+            other = os.path.join(tmpdir, 'copy.hdf')
+            shutil.copy(self.test_driver_gridfile4, other)
+            with GridFile(other) as gdf:
+                info = coordinate_cache.info()
+                lat2, lon2 = gdf.grids['UTMGrid'][:]
+                self.assertEqual(coordinate_cache.info().hits, info.hits + 1)
+                self.assertIs(lat2, lat)
+                self.assertIs(lon2, lon)
+
+                # Other pixels are a different entry.
+                lat2, lon2 = gdf.grids['UTMGrid'][1:3, 2:4]
+                np.testing.assert_array_equal(lat2, lat[1:3, 2:4])
+                self.assertEqual(len(coordinate_cache), 2)
+
+                # Shrinking the budget evicts the least recently used entry.
+                info = coordinate_cache.info()
+                coordinate_cache.maxbytes = lat2.nbytes + lon2.nbytes
+                self.assertEqual(len(coordinate_cache), 1)
+                self.assertEqual(coordinate_cache.info().evictions,
+                                 info.evictions + 1)
+                self.assertEqual(coordinate_cache.currbytes,
+                                 lat2.nbytes + lon2.nbytes)
+        finally:
+            coordinate_cache.maxbytes = maxbytes
+            coordinate_cache.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_coordinate_store(self):
+        """
+        coordinates are memory-mapped from the coordinate store
+        """
+        coords_dir = tempfile.mkdtemp()
+        try:
+            with GridFile(self.test_driver_gridfile4) as gdf:
+                grid = gdf.grids['GEOGrid']
+                elat, elon = grid[:]
+                erow = grid[2, 1:5]
+                esparse = grid.coords((slice(3, 7), Ellipsis), sparse=True)
+
+            # The second time around the stored coordinates are reused.
+            stored = []
+            for _ in range(2):
+                with GridFile(self.test_driver_gridfile4,
+                              coords_dir=coords_dir) as gdf:
+                    grid = gdf.grids['GEOGrid']
+                    lat, lon = grid[:]
+                    self.assertIsInstance(lat, np.memmap)
+                    self.assertIsInstance(lon, np.memmap)
+                    self.assertFalse(lat.flags.writeable)
+                    np.testing.assert_array_equal(lat, elat)
+                    np.testing.assert_array_equal(lon, elon)
+                    for actual, expected in zip(grid[2, 1:5], erow):
+                        np.testing.assert_array_equal(actual, expected)
+                    sparse = grid.coords((slice(3, 7), Ellipsis),
+                                         sparse=True)
+                    for actual, expected in zip(sparse, esparse):
+                        self.assertEqual(actual.shape, expected.shape)
+                        np.testing.assert_array_equal(actual, expected)
+
+                stored.append([(path,
+                                os.path.getmtime(os.path.join(coords_dir,
+                                                              path)))
+                               for path in sorted(os.listdir(coords_dir))])
+            self.assertEqual(len(stored[0]), 2)
+            self.assertEqual(stored[1], stored[0])
+        finally:
+            shutil.rmtree(coords_dir)
+
+    def test_coords_out_and_strips(self):
+        """
+        coordinates written into output arrays and iterated over in strips
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            for gridname in ('UTMGrid', 'GEOGrid'):
+                grid = gdf.grids[gridname]
+                elat, elon = grid[:]
+
+                lat = np.empty(elat.shape, dtype=np.float32)
+                lon = np.empty(elon.shape, dtype=np.float32)
+                actual = grid.coords(out=(lat, lon))
+                self.assertIs(actual[0], lat)
+                self.assertIs(actual[1], lon)
+                np.testing.assert_array_equal(lat, elat.astype(np.float32))
+                np.testing.assert_array_equal(lon, elon.astype(np.float32))
+
+                lat, lon = np.empty(4), np.empty(4)
+                grid.coords((3, slice(2, 6)), out=(lat, lon))
+                np.testing.assert_array_equal(lat, elat[3, 2:6])
+                np.testing.assert_array_equal(lon, elon[3, 2:6])
+
+                lat, lon = np.zeros(elat.shape), np.zeros(elon.shape)
+                for window, slat, slon in grid.iter_coords(strip_rows=7):
+                    self.assertLessEqual(slat.shape[0], 7)
+                    lat[window] = slat
+                    lon[window] = slon
+                np.testing.assert_array_equal(lat, elat)
+                np.testing.assert_array_equal(lon, elon)
+
+            with self.assertRaises(ValueError):
+                grid.coords(out=(np.empty(elat.shape, dtype=np.int32),
+                                 np.empty(elon.shape)))
+            with self.assertRaises(ValueError):
+                grid.coords(out=(np.empty((1, 1)), np.empty((1, 1))))
+
 class TestRead(unittest.TestCase):
 
     @classmethod
@@ -230,6 +497,419 @@ class TestRead(unittest.TestCase):
         expected = 13
         np.testing.assert_array_equal(actual, expected)
 
+    def test_read_into_he4(self):
+        """
+        read into a preallocated buffer
+        """
+        out = np.zeros((2, 3), dtype=np.float32)
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            actual = field.read_into(out, (slice(3, 5), slice(4, 7)))
+
+        self.assertIs(actual, out)
+        expected = np.zeros((2,3), dtype=np.float32)
+        for j in range(2):
+            expected[j] = j + 13
+        np.testing.assert_array_equal(out, expected)
+
+    def test_read_into_he5_row_memoryview(self):
+        """
+        read a row into a memoryview
+        """
+        buffer = np.zeros(180, dtype=np.float32)
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            field.read_into(memoryview(buffer), 1)
+
+        expected = np.ones(180, dtype=np.float32) * 11
+        expected[120:180] = 0
+        np.testing.assert_array_equal(buffer, expected)
+
+    def test_read_into_bad_buffer(self):
+        """
+        buffers with the wrong shape or datatype are rejected
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            with self.assertRaises(ValueError):
+                field.read_into(np.zeros((3, 3), dtype=np.float32),
+                                (slice(3, 5), slice(4, 7)))
+            with self.assertRaises(ValueError):
+                field.read_into(np.zeros((2, 3), dtype=np.float64),
+                                (slice(3, 5), slice(4, 7)))
+            with self.assertRaises(ValueError):
+                field.read_into(np.zeros((3, 2), dtype=np.float32).T,
+                                (slice(3, 5), slice(4, 7)))
+
+    def test_read_into_non_adjacent_array(self):
+        """
+        array dimensions moved to the front by numpy are read into place
+        """
+        index = (0, slice(None), [1, 5, 2])
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Pollution']
+            expected = field[:][index]
+            out = np.zeros(expected.shape, dtype=field.dtype)
+            actual = field.read_into(out, index)
+            with self.assertRaises(ValueError):
+                field.read_into(np.zeros(expected.shape[::-1],
+                                         dtype=field.dtype), index)
+
+        self.assertEqual(out.shape, (3, 200))
+        self.assertIs(actual, out)
+        np.testing.assert_array_equal(out, expected)
+
+    def test_repeated_reads_are_independent(self):
+        """
+        pooled read buffers must not be shared between live results
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            rows = [field[j] for j in range(5)]
+
+        for j, row in enumerate(rows):
+            np.testing.assert_array_equal(row, np.ones(120) * (j + 10))
+
+    def test_read_he4_2d_single_slice(self):
+        """
+        array-style indexing case of [r1:r2]
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            actual = gdf.grids['UTMGrid'].fields['Vegetation'][3:5]
+
+        expected = np.zeros((2, 120), dtype=np.float32)
+        for j in range(2):
+            expected[j] = j + 13
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_read_he4_2d_partial_stride(self):
+        """
+        number of elements is rounded up when the stride does not divide
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            actual = gdf.grids['UTMGrid'].fields['Vegetation'][0:10:3, 0]
+
+        expected = np.array([10, 13, 16, 19], dtype=np.float32)
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_read_he4_2d_negative(self):
+        """
+        negative indices and negative steps
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            last = field[-1]
+            reversed_rows = field[::-50, -1]
+
+        np.testing.assert_array_equal(last, np.ones(120) * 209)
+        expected = np.array([209, 159, 109, 59], dtype=np.float32)
+        np.testing.assert_array_equal(reversed_rows, expected)
+
+    def test_read_he4_2d_newaxis(self):
+        """
+        None inserts a new axis, just like numpy
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            actual = gdf.grids['UTMGrid'].fields['Vegetation'][None, 3, :4]
+
+        self.assertEqual(actual.shape, (1, 4))
+        np.testing.assert_array_equal(actual, np.ones((1, 4)) * 13)
+
+    def test_read_he4_3d_middle_ellipsis(self):
+        """
+        an ellipsis between integers selects the middle dimension
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Pollution']
+            actual = field[0, ..., 5]
+            expected = field[:][0, :, 5]
+
+        self.assertEqual(actual.shape, (200,))
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_read_he4_2d_integer_array(self):
+        """
+        array-style indexing case of [[r1, r2, ...], :]
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            actual = field[[3, 17, 18, 19, 150], :]
+            unsorted = field[[19, 3, 3], 0]
+
+        expected = np.zeros((5, 120), dtype=np.float32)
+        for j, row in enumerate([3, 17, 18, 19, 150]):
+            expected[j] = row + 10
+        np.testing.assert_array_equal(actual, expected)
+        np.testing.assert_array_equal(unsorted, np.array([29, 13, 13]))
+
+    def test_read_he5_2d_boolean_mask(self):
+        """
+        array-style indexing case of [row_mask, c1:c2]
+        """
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            mask = np.zeros(field.shape[0], dtype=np.bool_)
+            mask[[1, 2, 100]] = True
+            actual = field[mask, 0:4]
+            expected = field[:][mask, 0:4]
+
+        self.assertEqual(actual.shape, (3, 4))
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_read_he4_coalesced_gap_threshold(self):
+        """
+        same result no matter how the indices are coalesced
+        """
+        rows = [0, 5, 6, 7, 60, 199]
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            results = []
+            for max_gap in (0, 4, 1000):
+                field.max_gap = max_gap
+                results.append(field[rows, 2:4])
+
+        for actual in results:
+            np.testing.assert_array_equal(actual[:, 0],
+                                          np.array(rows) + 10)
+
+    def test_read_he5_tiled_integer_array(self):
+        """
+        nearby indices sharing a tile are read together regardless of max_gap
+        """
+        rows = [0, 5, 12, 99, 100, 250]
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            field.max_gap = 0
+            actual = field[rows, 10:70]
+            expected = field[:][rows, 10:70]
+
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_slice_read_skips_tileinfo(self):
+        """
+        the tile shape is only looked up for integer array indices
+        """
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            field[10:20, 5]
+            field.read_into(np.empty((10, 120), dtype=field.dtype),
+                            np.s_[:10])
+            self.assertIsNone(field._tiledims)
+            field[[0, 150], 5]
+            self.assertEqual(field._tiledims, (100, 60))
+
+    def test_iter_blocks_he4(self):
+        """
+        row blocks of an untiled field cover it exactly once
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            actual = np.zeros(field.shape, dtype=field.dtype)
+            windows = []
+            for window, block in field.iter_blocks((64, None)):
+                actual[window] += block
+                windows.append(window)
+            expected = field[:]
+
+        self.assertEqual(len(windows), 4)
+        self.assertEqual(windows[-1], (slice(192, 200), slice(0, 120)))
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_iter_blocks_he5_tiles_readahead(self):
+        """
+        tiled field iterated in its native tiles, reading ahead
+        """
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            actual = np.zeros(field.shape, dtype=field.dtype)
+            for window, block in field.iter_blocks(order='F', readahead=2):
+                self.assertEqual(window[0].start % 100, 0)
+                self.assertEqual(window[1].start % 60, 0)
+                actual[window] += block
+            expected = field[:]
+
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_iter_blocks_readahead_attaches_first(self):
+        """
+        the grid is attached on the calling thread, not the read-ahead one
+        """
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            gridid = field._gridid
+            threads = []
+
+            def attach():
+                threads.append(threading.current_thread())
+                return gridid() if callable(gridid) else gridid
+
+            field._gridid = attach
+            nblocks = len(list(field.iter_blocks(readahead=2)))
+
+        self.assertGreater(nblocks, 1)
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_iter_blocks_bad_block_shape(self):
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            with self.assertRaises(ValueError):
+                next(field.iter_blocks((10,)))
+            with self.assertRaises(ValueError):
+                next(field.iter_blocks(order='K'))
+
+    @unittest.skipIf(not _HAVE_DASK, 'dask not available')
+    def test_to_dask_he5(self):
+        """
+        lazy dask view survives pickling and matches an eager read
+        """
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            arr = field.to_dask(chunks=(100, 60))
+            expected = field[:]
+
+        arr = pickle.loads(pickle.dumps(arr))
+        self.assertEqual(arr.shape, expected.shape)
+        self.assertEqual(arr.dtype, expected.dtype)
+        np.testing.assert_array_equal(arr.compute(scheduler='sync'),
+                                      expected)
+        np.testing.assert_array_equal(arr[5:150:7, 3].compute(),
+                                      expected[5:150:7, 3])
+
+    @unittest.skipIf(not _HAVE_DASK, 'dask not available')
+    def test_to_dask_auto_chunks_follow_tiles(self):
+        with GridFile(self.test_driver_gridfile5) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            arr = field.to_dask()
+
+        for dim_chunks, tile in zip(arr.chunks, (100, 60)):
+            for n in dim_chunks[:-1]:
+                self.assertEqual(n % tile, 0)
+
+    @unittest.skipIf(_parallel.shared_memory is None,
+                     'shared memory not available')
+    def test_read_parallel(self):
+        """
+        reads split across worker processes match serial reads
+        """
+        with ReaderPool(2) as pool:
+            for filename in (self.test_driver_gridfile4,
+                             self.test_driver_gridfile5):
+                with GridFile(filename) as gdf:
+                    field = gdf.grids['UTMGrid'].fields['Vegetation']
+                    for index in (Ellipsis, (slice(3, 190, 2), 5)):
+                        actual = field.read(index, parallel=pool)
+                        np.testing.assert_array_equal(actual, field[index])
+
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Pollution']
+            np.testing.assert_array_equal(field.read(parallel=2), field[:])
+
+    def test_read_fields_he4(self):
+        """
+        several fields over one window, as a dict and stacked
+        """
+        names = ['Temperature', 'Pressure', 'Soil Dryness']
+        index = (slice(10, 60, 5), slice(None, 20))
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            grid = gdf.grids['PolarGrid']
+            data = grid.read_fields(names, index)
+            stacked = grid.read_fields(names, index, stack=True)
+            expected = [grid.fields[name][index] for name in names]
+
+        self.assertEqual(list(data.keys()), names)
+        self.assertEqual(stacked.shape, (3, 10, 20))
+        for k, name in enumerate(names):
+            np.testing.assert_array_equal(data[name], expected[k])
+            np.testing.assert_array_equal(stacked[k], expected[k])
+
+    def test_read_fields_stacked_non_adjacent_array(self):
+        """
+        stacked results take the shape numpy gives non-adjacent indices
+        """
+        names = ['Temperature', 'Pressure']
+        index = (0, None, [1, 5, 2])
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            grid = gdf.grids['PolarGrid']
+            stacked = grid.read_fields(names, index, stack=True)
+            out = np.zeros((2, 3, 1), dtype=stacked.dtype)
+            actual = grid.read_fields(names, index, out=out, stack=True)
+            expected = [grid.fields[name][:][index] for name in names]
+
+        self.assertEqual(stacked.shape, (2, 3, 1))
+        self.assertIs(actual, out)
+        for k in range(len(names)):
+            np.testing.assert_array_equal(stacked[k], expected[k])
+            np.testing.assert_array_equal(out[k], expected[k])
+
+    def test_read_fields_he4_out(self):
+        names = ['Temperature', 'Pressure']
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            grid = gdf.grids['PolarGrid']
+            out = {'Pressure': np.zeros((100,), dtype=np.float32)}
+            data = grid.read_fields(names, 7, out=out)
+            expected = grid.fields['Pressure'][7]
+
+        self.assertIs(data['Pressure'], out['Pressure'])
+        np.testing.assert_array_equal(out['Pressure'], expected)
+
+    def test_read_fields_incompatible(self):
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            grid = gdf.grids['PolarGrid']
+            with self.assertRaises(ValueError):
+                grid.read_fields(['Temperature', 'Spectra'], 0)
+            with self.assertRaises(KeyError):
+                grid.read_fields(['Temperature', 'Humidity'], 0)
+
+            # Same shape, but different dimensions.
+            grid.fields['Pressure'].dimlist = ['XDim', 'YDim']
+            with self.assertRaises(ValueError):
+                grid.read_fields(['Temperature', 'Pressure'], 0, stack=True)
+
+    def test_read_decode_fill_value(self):
+        """
+        fill values become NaN or masked elements
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['GEOGrid'].fields['GeoSpectra']
+            fill = np.asarray(field.attrs['_FillValue']).ravel()[0]
+            raw = field[:]
+            nans = field.read(decode=True)
+            masked = field.read(decode=True, dtype=np.float64, masked=True)
+
+        isfill = raw == fill
+        self.assertEqual(nans.dtype, np.float32)
+        np.testing.assert_array_equal(np.isnan(nans), isfill)
+        np.testing.assert_array_equal(np.ma.getmaskarray(masked), isfill)
+        np.testing.assert_array_equal(masked.compressed(), raw[~isfill])
+
+    def test_read_decode_scale_offset(self):
+        """
+        scale_factor and add_offset applied by either convention
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            field.attrs['scale_factor'] = np.array([0.5])
+            field.attrs['add_offset'] = np.array([4.0])
+            hdf4 = field.read(np.s_[10:20, 3], decode=True)
+            cf = field.read(np.s_[10:20, 3], decode=True, convention='cf')
+
+        rows = np.arange(10, 20) + 10
+        np.testing.assert_allclose(hdf4, 0.5 * (rows - 4.0))
+        np.testing.assert_allclose(cf, rows * 0.5 + 4.0)
+
+    def test_read_he4_bad_index(self):
+        """
+        out of range integers and too many indices are rejected
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            field = gdf.grids['UTMGrid'].fields['Vegetation']
+            with self.assertRaises(IndexError):
+                field[200]
+            with self.assertRaises(IndexError):
+                field[0, 0, 0]
+            with self.assertRaises(IndexError):
+                field[[0, 1], [0, 1]]
+
 class TestClass(unittest.TestCase):
 
     @classmethod
@@ -501,6 +1181,350 @@ class TestMetadata(unittest.TestCase):
         self.assertEqual(list(gdf.grids['GEOGrid'].fields['GeoSpectra'].attrs.keys()),
                          ['_FillValue'])
 
+    def test_fieldattrs_4_single_index(self):
+        """
+        all HDF-EOS2 grids of a file share one SD attribute index
+        """
+        gdf = GridFile(self.test_driver_gridfile4)
+        geo = gdf.grids['GEOGrid']
+        utm = gdf.grids['UTMGrid']
+        self.assertIs(geo._field_attrs, utm._field_attrs)
+        attrs = geo.fields['GeoSpectra'].attrs
+        self.assertEqual(np.asarray(attrs['_FillValue']).size, 1)
+        self.assertEqual(list(utm.fields['Vegetation'].attrs.keys()), [])
+
+    def test_fieldattrs_4_after_close(self):
+        """
+        unread HDF-EOS2 field attributes cannot be read once the file closes
+        """
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            attrs = gdf.grids['GEOGrid'].fields['GeoSpectra'].attrs
+            self.assertEqual(list(attrs.keys()), ['_FillValue'])
+        handle_pool.clear()
+        with self.assertRaises(RuntimeError):
+            attrs['_FillValue']
+
+    def test_shared_file_handle(self):
+        """
+        grids attach through the file handle of their GridFile
+        """
+        for filename in (self.test_driver_gridfile4,
+                         self.test_driver_gridfile5):
+            gdf = GridFile(filename)
+            handle = gdf._handle
+            gridnames = list(gdf.grids.keys())
+            grids = [gdf.grids[name] for name in gridnames]
+            for grid in grids:
+                self.assertIs(grid._handle, handle)
+                self.assertEqual(grid.gdfid, gdf.gdfid)
+
+            # The grids hold on to the file after the GridFile is gone.
+            del gdf
+            gc.collect()
+            self.assertEqual(handle.refcount, 1 + len(grids))
+            fieldname = list(grids[0].fields.keys())[0]
+            self.assertTrue(grids[0].fields[fieldname][0].size > 0)
+            del grid, grids
+            gc.collect()
+            self.assertEqual(handle.refcount, 1)
+
+    def test_handle_pool(self):
+        """
+        reopening a file reuses its pooled handle
+        """
+        handle_pool.clear()
+        before = handle_pool.info()
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            handle = gdf._handle
+            gdf.grids['UTMGrid'].fields['Vegetation'][0]
+        self.assertTrue(gdf.closed)
+        self.assertFalse(handle.closed)
+        with GridFile(self.test_driver_gridfile4) as gdf:
+            self.assertIs(gdf._handle, handle)
+            gdf.grids['UTMGrid'].fields['Vegetation'][0]
+        after = handle_pool.info()
+        self.assertEqual(after.misses - before.misses, 1)
+        self.assertEqual(after.hits - before.hits, 1)
+
+    def test_handle_pool_eviction(self):
+        """
+        least recently used handles are closed beyond the pool size
+        """
+        handle_pool.clear()
+        maxsize = handle_pool.maxsize
+        try:
+            handle_pool.maxsize = 1
+            evictions = handle_pool.info().evictions
+            with GridFile(self.test_driver_gridfile4) as gdf:
+                handle4 = gdf._handle
+            with GridFile(self.test_driver_gridfile5) as gdf:
+                handle5 = gdf._handle
+            self.assertTrue(handle4.closed)
+            self.assertFalse(handle5.closed)
+            self.assertEqual(len(handle_pool), 1)
+            self.assertEqual(handle_pool.info().evictions, evictions + 1)
+        finally:
+            handle_pool.maxsize = maxsize
+
+    def test_metadata_cache(self):
+        """
+        a cached file is described without opening it until data is read
+        """
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for filename in (self.test_driver_gridfile4,
+                             self.test_driver_gridfile5):
+                with GridFile(filename, cache_dir=cache_dir) as gdf:
+                    expected = str(gdf)
+                    field = gdf.grids['UTMGrid'].fields['Vegetation']
+                    expected_data = field[:]
+                    expected_chunks = field.chunks
+
+                handle_pool.clear()
+                with GridFile(filename, cache_dir=cache_dir) as gdf:
+                    self.assertEqual(str(gdf), expected)
+                    field = gdf.grids['UTMGrid'].fields['Vegetation']
+                    self.assertEqual(field.chunks, expected_chunks)
+                    self.assertFalse(gdf._handle.opened)
+                    actual = field[:]
+                    self.assertTrue(gdf._handle.opened)
+                np.testing.assert_array_equal(actual, expected_data)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_structmetadata_unlimited_dimension(self):
+        """
+        unlimited dimensions are told by their size, not their name
+        """
+        text = textwrap.dedent("""\
+            GROUP=GridStructure
+            \tGROUP=GRID_1
+            \t\tGridName="Appendable"
+            \t\tXDim=120
+            \t\tYDim=200
+            \t\tUpperLeftPointMtrs=(0.000000,30000000.000000)
+            \t\tLowerRightMtrs=(15000000.000000,20000000.000000)
+            \t\tProjection=HE5_GCTP_GEO
+            \t\tGROUP=Dimension
+            \t\t\tOBJECT=Dimension_1
+            \t\t\t\tDimensionName="Growing"
+            \t\t\t\tSize=-1
+            \t\t\tEND_OBJECT=Dimension_1
+            \t\tEND_GROUP=Dimension
+            \t\tGROUP=DataField
+            \t\t\tOBJECT=DataField_1
+            \t\t\t\tDataFieldName="Appended"
+            \t\t\t\tDataType=H5T_NATIVE_FLOAT
+            \t\t\t\tDimList=("YDim","XDim")
+            \t\t\t\tMaxdimList=("Growing","XDim")
+            \t\t\tEND_OBJECT=DataField_1
+            \t\t\tOBJECT=DataField_2
+            \t\t\t\tDataFieldName="Fixed"
+            \t\t\t\tDataType=H5T_NATIVE_FLOAT
+            \t\t\t\tDimList=("YDim","XDim")
+            \t\t\t\tMaxdimList=("YDim","XDim")
+            \t\t\tEND_OBJECT=DataField_2
+            \t\tEND_GROUP=DataField
+            \tEND_GROUP=GRID_1
+            END_GROUP=GridStructure
+            END
+            """)
+        inventory = _structmetadata.inventories(text, he5)['Appendable']
+        fields = dict((entry['name'], entry)
+                      for entry in inventory['fields'])
+        self.assertIsNone(fields['Appended']['shape'])
+        self.assertEqual(fields['Fixed']['shape'], (200, 120))
+
+    def test_structmetadata_native_long(self):
+        """
+        fields of a platform-dependent type are left to the library
+        """
+        text = textwrap.dedent("""\
+            GROUP=GridStructure
+            \tGROUP=GRID_1
+            \t\tGridName="Longs"
+            \t\tXDim=120
+            \t\tYDim=200
+            \t\tUpperLeftPointMtrs=(0.000000,30000000.000000)
+            \t\tLowerRightMtrs=(15000000.000000,20000000.000000)
+            \t\tProjection=HE5_GCTP_GEO
+            \t\tGROUP=Dimension
+            \t\tEND_GROUP=Dimension
+            \t\tGROUP=DataField
+            \t\t\tOBJECT=DataField_1
+            \t\t\t\tDataFieldName="Signed"
+            \t\t\t\tDataType=H5T_NATIVE_LONG
+            \t\t\t\tDimList=("YDim","XDim")
+            \t\t\t\tMaxdimList=("YDim","XDim")
+            \t\t\tEND_OBJECT=DataField_1
+            \t\t\tOBJECT=DataField_2
+            \t\t\t\tDataFieldName="Unsigned"
+            \t\t\t\tDataType=H5T_NATIVE_ULONG
+            \t\t\t\tDimList=("YDim","XDim")
+            \t\t\t\tMaxdimList=("YDim","XDim")
+            \t\t\tEND_OBJECT=DataField_2
+            \t\tEND_GROUP=DataField
+            \tEND_GROUP=GRID_1
+            END_GROUP=GridStructure
+            END
+            """)
+        inventory = _structmetadata.inventories(text, he5)['Longs']
+        for entry in inventory['fields']:
+            self.assertIsNone(entry['ntype'])
+            self.assertEqual(entry['shape'], (200, 120))
+
+    def test_structmetadata_matches_api(self):
+        """
+        grids described from the StructMetadata match the library calls
+        """
+        for filename in (self.test_driver_gridfile4,
+                         self.test_driver_gridfile5):
+            handle_pool.clear()
+            fast = GridFile(filename)
+            self.assertIsNotNone(fast._handle.cache['structure'])
+            handle_pool.clear()
+            slow = GridFile(filename, structmetadata=False)
+
+            self.assertEqual(list(fast.grids.keys()),
+                             list(fast._he.gdinqgrid(filename)))
+            for gridname in slow.grids:
+                expected = slow.grids[gridname]
+                actual = fast.grids[gridname]
+                self.assertEqual(list(actual.dims.items()),
+                                 list(expected.dims.items()))
+                self.assertEqual(actual.xdimsize, expected.xdimsize)
+                self.assertEqual(actual.ydimsize, expected.ydimsize)
+                np.testing.assert_array_equal(actual.upleft, expected.upleft)
+                np.testing.assert_array_equal(actual.lowright,
+                                              expected.lowright)
+                self.assertEqual(actual.projcode, expected.projcode)
+                self.assertEqual(actual.zonecode, expected.zonecode)
+                self.assertEqual(actual.spherecode, expected.spherecode)
+                np.testing.assert_array_equal(actual.projparms,
+                                              expected.projparms)
+                self.assertEqual(actual.origincode, expected.origincode)
+                self.assertEqual(actual.pixregcode, expected.pixregcode)
+                self.assertEqual(list(actual.fields.keys()),
+                                 list(expected.fields.keys()))
+                for fieldname in expected.fields:
+                    f_actual = actual.fields[fieldname]
+                    f_expected = expected.fields[fieldname]
+                    self.assertEqual(f_actual.shape, f_expected.shape)
+                    self.assertEqual(f_actual.ntype, f_expected.ntype)
+                    self.assertEqual(f_actual.dtype, f_expected.dtype)
+                    self.assertEqual(f_actual.dimlist, f_expected.dimlist)
+                    self.assertEqual(f_actual.chunks, f_expected.chunks)
+                    self.assertEqual(f_actual.compression,
+                                     f_expected.compression)
+                    self.assertEqual(f_actual.compression_opts,
+                                     f_expected.compression_opts)
+            self.assertEqual(str(fast), str(slow))
+
+    def test_sniff_format(self):
+        """
+        the backend is picked from the file signature
+        """
+        self.assertEqual(sniff_format(self.test_driver_gridfile4), 'he4')
+        self.assertEqual(sniff_format(self.test_driver_gridfile5), 'he5')
+        with tempfile.NamedTemporaryFile(suffix='.h5') as tfile:
+            # HDF5 superblock after a 512 byte user block
+            tfile.write(b'\0' * 512 + b'\x89HDF\r\n\x1a\n' + b'\0' * 64)
+            tfile.flush()
+            self.assertEqual(sniff_format(tfile.name), 'he5')
+        with tempfile.NamedTemporaryFile(suffix='.txt') as tfile:
+            tfile.write(b'not an HDF file')
+            tfile.flush()
+            self.assertIsNone(sniff_format(tfile.name))
+
+    def test_backend_override(self):
+        """
+        the backend can be forced
+        """
+        handle_pool.clear()
+        gdf = GridFile(self.test_driver_gridfile5, backend='he5')
+        self.assertIs(gdf._he, he5)
+        with self.assertRaises(ValueError):
+            GridFile(self.test_driver_gridfile5, backend='netcdf')
+
+    def test_backend_override_skips_pool(self):
+        """
+        a pooled handle is not reused for a different forced backend
+        """
+        handle_pool.clear()
+        gdf = GridFile(self.test_driver_gridfile5)
+        self.assertIs(gdf._he, he5)
+        with self.assertRaises(IOError):
+            GridFile(self.test_driver_gridfile5, backend='he4')
+        self.assertIs(GridFile(self.test_driver_gridfile5)._handle,
+                      gdf._handle)
+
+    @unittest.skipIf(sys.hexversion < 0x03070000,
+                     "module __getattr__ requires Python 3.7")
+    def test_lazy_backend_import(self):
+        """
+        only the backends a file needs are imported
+        """
+        code = ("import sys, pyhdfeos; "
+                "pyhdfeos.GridFile({0!r}).close(); "
+                "print(' '.join(sorted(m for m in sys.modules "
+                "if m.startswith('pyhdfeos.lib.'))))")
+        output = subprocess.check_output([sys.executable, '-c',
+                                          code.format(
+                                              self.test_driver_gridfile5)],
+                                         universal_newlines=True)
+        modules = output.split()
+        self.assertIn('pyhdfeos.lib.he5', modules)
+        self.assertNotIn('pyhdfeos.lib.he4', modules)
+        self.assertNotIn('pyhdfeos.lib.hdf', modules)
+
+    @unittest.skipIf(sys.hexversion < 0x03070000,
+                     "module __getattr__ requires Python 3.7")
+    def test_decode_does_not_import_he5(self):
+        """
+        decoding HDF-EOS2 data leaves the HDF-EOS5 backend alone
+        """
+        code = ("import sys, pyhdfeos; "
+                "gdf = pyhdfeos.GridFile({0!r}); "
+                "gdf.grids['GEOGrid'].fields['GeoSpectra'].read(decode=True); "
+                "gdf.close(); "
+                "print('pyhdfeos.lib.he5' in sys.modules)")
+        output = subprocess.check_output([sys.executable, '-c',
+                                          code.format(
+                                              self.test_driver_gridfile4)],
+                                         universal_newlines=True)
+        self.assertEqual(output.strip(), 'False')
+
+    def test_concurrent_cold_start(self):
+        """
+        processes starting together import the prebuilt extension modules
+        """
+        from pyhdfeos.lib import hdf
+        extensions = [sys.modules['pyhdfeos.lib.' + name]
+                      for name in ('_he4', '_he5', '_hdf')]
+        mtimes = [os.stat(ext.__file__).st_mtime for ext in extensions]
+
+        code = ("import sys; "
+                "from pyhdfeos.lib import he4, he5, hdf; "
+                "print('cffi.verifier' in sys.modules); "
+                "print(' '.join(sys.modules['pyhdfeos.lib.' + name].__file__ "
+                "for name in ('_he4', '_he5', '_hdf')))")
+        procs = [subprocess.Popen([sys.executable, '-c', code],
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  universal_newlines=True)
+                 for _ in range(8)]
+        for proc in procs:
+            stdout, stderr = proc.communicate()
+            self.assertEqual(proc.returncode, 0, stderr)
+            verifier, files = stdout.splitlines()
+            self.assertEqual(verifier, 'False')
+            self.assertEqual(files.split(),
+                             [ext.__file__ for ext in extensions])
+
+        # Nothing was rebuilt.
+        self.assertEqual([os.stat(ext.__file__).st_mtime
+                          for ext in extensions], mtimes)
+
     def test_gridinfo(self):
         gdf = GridFile(self.test_driver_gridfile4)
         self.assertEqual(gdf.grids['UTMGrid'].xdimsize, 120)
@@ -514,6 +1538,35 @@ class TestMetadata(unittest.TestCase):
         np.testing.assert_array_equal(lowright,
                                       np.array([813931.10959, 2214162.53278]))
 
+    def test_lazy_grids_and_fields(self):
+        """
+        grids and fields are only built when first accessed
+        """
+        gdf = GridFile(self.test_driver_gridfile4)
+        self.assertFalse(gdf.grids.is_loaded('UTMGrid'))
+        grid = gdf.grids['UTMGrid']
+        self.assertTrue(gdf.grids.is_loaded('UTMGrid'))
+        self.assertFalse(gdf.grids.is_loaded('PolarGrid'))
+        self.assertFalse(grid.fields.is_loaded('Pollution'))
+        self.assertEqual(grid.fields['Vegetation'].shape, (200, 120))
+        self.assertFalse(grid.fields.is_loaded('Pollution'))
+        self.assertIn('Pollution', grid.fields)
+        with self.assertRaises(KeyError):
+            grid.fields['Humidity']
+
+    def test_tileinfo_4(self):
+        gdf = GridFile(self.test_driver_gridfile4)
+        field = gdf.grids['UTMGrid'].fields['Vegetation']
+        self.assertIsNone(field.chunks)
+        self.assertIsNone(field.compression)
+
+    def test_tileinfo_5(self):
+        gdf = GridFile(self.test_driver_gridfile5)
+        field = gdf.grids['UTMGrid'].fields['Vegetation']
+        self.assertEqual(field.chunks, (100, 60))
+        self.assertEqual(field.compression, 'deflate')
+        self.assertEqual(field.compression_opts[0], 6)
+
     def test_origininfo(self):
         gdf = GridFile(self.test_driver_gridfile4)
         origincode = gdf.grids['UTMGrid'].origincode
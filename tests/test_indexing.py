@@ -0,0 +1,152 @@
+import unittest
+
+import numpy as np
+
+from pyhdfeos._indexing import (coalesce, compile_index, block_windows,
+                                split_hyperslab)
+
+
+def _execute(plan, data):
+    """
+    Carry out a read plan against an in-memory array, as a field would.
+    """
+    def hyperslab(start, stride, edge):
+        return data[tuple(slice(s, s + st * e, st)
+                          for s, st, e in zip(start, stride, edge))]
+
+    buffer = np.empty(plan.edge, dtype=data.dtype)
+    for start, stride, edge, segment in plan.hyperslabs():
+        if segment is None:
+            buffer[...] = hyperslab(start, stride, edge)
+            continue
+        slab = hyperslab(start, stride, edge)
+        if segment.picks is not None:
+            slab = np.take(slab, segment.picks, axis=plan.axis)
+        count = slab.shape[plan.axis]
+        dest = [slice(None)] * len(edge)
+        dest[plan.axis] = slice(segment.dest, segment.dest + count)
+        buffer[tuple(dest)] = slab
+    return plan.finish(buffer)
+
+
+class TestCompileIndex(unittest.TestCase):
+    """
+    Read plans give the same result as indexing a numpy array.
+    """
+    def setUp(self):
+        self.data = np.arange(6 * 7 * 8).reshape(6, 7, 8)
+
+    def check(self, index, **kwargs):
+        plan = compile_index(index, self.data.shape, **kwargs)
+        actual = _execute(plan, self.data)
+        expected = self.data[index]
+        self.assertEqual(plan.shape, expected.shape)
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_basic(self):
+        for index in [Ellipsis, 2, -1, (1, 2, 3), (slice(1, 5), 3),
+                      (Ellipsis, 4), (slice(None, None, 2), Ellipsis, 1),
+                      (slice(5, 0, -2), slice(None), slice(-3, None)),
+                      (None, 1, None, slice(2, 4)), (slice(3, 3),),
+                      (1, Ellipsis, None)]:
+            self.check(index)
+
+    def test_integer_array(self):
+        for index in [[0, 2, 3], (slice(None), [6, 0, 3, 3]),
+                      (Ellipsis, np.array([[1, 7], [0, 2]])),
+                      (1, slice(None), [5, 1]), ([4, 4], 2, slice(1, 3)),
+                      (slice(None), [-1, 0]), (Ellipsis, [])]:
+            for max_gap in (0, 2, 100):
+                self.check(index, max_gap=max_gap)
+
+    def test_boolean_mask(self):
+        mask = np.array([True, False, False, True, True, False, True])
+        self.check((slice(None), mask, 2), max_gap=1)
+        self.check((0, mask))
+
+    def test_non_adjacent_advanced(self):
+        """
+        array dimensions go first when separated from an integer index
+        """
+        self.check((2, slice(None), [1, 3, 5]))
+        self.check(([0, 5], slice(1, 4), 7))
+
+    def test_chunks(self):
+        self.check((slice(None), [0, 1, 5, 6]), chunks=(3, 4, 4), max_gap=0)
+        self.check((slice(None), [0, 1, 5, 6]), chunks=lambda: (3, 4, 4),
+                   max_gap=0)
+
+    def test_bad_index(self):
+        for index in [6, (0, 0, 0, 0), (Ellipsis, Ellipsis),
+                      ([0, 1], [0, 1]), (slice(None), [7]), 'a']:
+            with self.assertRaises(IndexError):
+                compile_index(index, self.data.shape)
+
+
+class TestBlocks(unittest.TestCase):
+
+    def test_block_windows_cover(self):
+        """
+        block windows cover an array exactly once
+        """
+        count = np.zeros((10, 7), dtype=int)
+        for window in block_windows(count.shape, (3, 4)):
+            count[window] += 1
+        np.testing.assert_array_equal(count, 1)
+
+    def test_split_hyperslab(self):
+        """
+        parts of a split hyperslab cover it exactly once
+        """
+        start, stride, edge = (2, 0), (3, 1), (11, 5)
+        axis, parts = split_hyperslab(start, stride, edge, 4)
+        rows = []
+        for part_start, part_stride, part_edge, offset in parts:
+            self.assertEqual(part_stride, stride)
+            rows.extend(range(part_start[axis],
+                              part_start[axis] + part_stride[axis] *
+                              part_edge[axis], part_stride[axis]))
+        self.assertEqual(rows, list(range(2, 2 + 3 * 11, 3)))
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def test_max_gap(self):
+        """
+        indices are read together when at most max_gap elements apart
+        """
+        segments = coalesce(np.array([0, 3, 4, 30]), max_gap=2)
+        self.assertEqual([(s.start, s.count, s.dest) for s in segments],
+                         [(0, 5, 0), (30, 1, 3)])
+
+    def test_strided_run(self):
+        """
+        evenly spaced indices are read with a stride
+        """
+        segments = coalesce(np.array([2, 5, 8, 11]), max_gap=16)
+        self.assertEqual(len(segments), 1)
+        self.assertEqual((segments[0].start, segments[0].stride,
+                          segments[0].count), (2, 3, 4))
+
+    def test_same_tile_near(self):
+        """
+        nearby indices sharing a tile are read together whatever max_gap
+        """
+        segments = coalesce(np.array([0, 40, 60]), max_gap=0, chunk=512)
+        self.assertEqual(len(segments), 1)
+
+    def test_same_tile_far(self):
+        """
+        distant indices are not read together just because they share a tile
+        """
+        segments = coalesce(np.array([3, 17, 18, 19, 400]), max_gap=16,
+                            chunk=512)
+        self.assertEqual([(s.start, s.count, s.dest) for s in segments],
+                         [(3, 17, 0), (400, 1, 4)])
+
+    def test_different_tiles(self):
+        """
+        indices in different tiles are only merged within max_gap
+        """
+        segments = coalesce(np.array([98, 102]), max_gap=0, chunk=100)
+        self.assertEqual(len(segments), 2)
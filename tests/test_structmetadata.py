@@ -0,0 +1,49 @@
+import textwrap
+import unittest
+
+from pyhdfeos._structmetadata import parse
+
+
+class TestParse(unittest.TestCase):
+
+    def test_nested_groups(self):
+        text = textwrap.dedent("""\
+            GROUP=SwathStructure
+            END_GROUP=SwathStructure
+            GROUP=GridStructure
+            \tGROUP=GRID_1
+            \t\tGridName="UTMGrid"
+            \t\tXDim=120
+            \t\tUpperLeftPointMtrs=(210584.500410,3322395.954450)
+            \t\tLowerRightMtrs=(DEFAULT)
+            \t\tProjection=GCTP_UTM
+            \t\tGROUP=DataField
+            \t\t\tOBJECT=DataField_1
+            \t\t\t\tDataFieldName="Pollution"
+            \t\t\t\tDimList=("Time","YDim","XDim")
+            \t\t\tEND_OBJECT=DataField_1
+            \t\tEND_GROUP=DataField
+            \tEND_GROUP=GRID_1
+            END_GROUP=GridStructure
+            END
+            """) + '\0\0'
+        tree = parse(text)
+        self.assertEqual(list(tree), ['SwathStructure', 'GridStructure'])
+        self.assertEqual(tree['SwathStructure'], {})
+        grid = tree['GridStructure']['GRID_1']
+        self.assertEqual(grid['GridName'], 'UTMGrid')
+        self.assertEqual(grid['XDim'], 120)
+        self.assertIsInstance(grid['XDim'], int)
+        self.assertEqual(grid['UpperLeftPointMtrs'],
+                         (210584.500410, 3322395.954450))
+        self.assertEqual(grid['LowerRightMtrs'], ('DEFAULT',))
+        self.assertEqual(grid['Projection'], 'GCTP_UTM')
+        field = grid['DataField']['DataField_1']
+        self.assertEqual(field['DataFieldName'], 'Pollution')
+        self.assertEqual(field['DimList'], ('Time', 'YDim', 'XDim'))
+
+    def test_invalid(self):
+        for text in ['GROUP=A\n', 'END_GROUP=A\n', 'XDim\n', 'XDim=(1,2\n',
+                     'XDim=(1 2)\n', 'XDim=)\n']:
+            with self.assertRaises(ValueError):
+                parse(text)